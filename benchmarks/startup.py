@@ -0,0 +1,344 @@
+"""Startup benchmarks
+
+Measure the time from process start to command dispatch
+on synthetic plugin packages.
+
+The packages are generated in a temporary directory,
+together with :code:`.dist-info` metadata declaring their
+:code:`gather` entry points,
+and the directory is put on :code:`PYTHONPATH`.
+Nothing is downloaded,
+so the benchmarks run offline.
+
+Every sample runs in a fresh interpreter:
+
+* ``cold``: no bytecode cache
+* ``warm``: the bytecode cache is populated
+* ``dispatch``: :code:`python -m <app> <command>`, end to end
+
+Run:
+
+.. code::
+
+    $ python benchmarks/startup.py --modules 50 --commands 200 --collectors 3
+
+or
+
+.. code::
+
+    $ nox -e benchmark -- --output results.json
+"""
+
+from __future__ import annotations
+import argparse
+import importlib
+import json
+import os
+import pathlib
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+APP = "bench_app"
+
+CHILD_ENVIRONMENT_VARIABLE = "GATHER_BENCHMARK_CHILD"
+
+
+def _write(path, content, *extra_lines):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join([textwrap.dedent(content).lstrip(), *extra_lines]))
+
+
+def _dist_info(site, package, entry_point):
+    dist_info = site / f"{package}-1.0.dist-info"
+    _write(
+        dist_info / "METADATA",
+        f"""
+        Metadata-Version: 2.1
+        Name: {package.replace("_", "-")}
+        Version: 1.0
+        """,
+    )
+    _write(
+        dist_info / "entry_points.txt",
+        f"""
+        [gather]
+        {entry_point} = {package}
+        """,
+    )
+
+
+def _app(site, *, collectors, discovery, index):
+    index_argument = "None" if index is None else repr(str(index))
+    extra = [
+        f"COLLECTOR_{number} = gather.Collector(\n"
+        f"    discovery={discovery!r}, only=gather.api.Only(entry_points=[{APP!r}])\n"
+        ")\n"
+        for number in range(1, collectors)
+    ]
+    _write(
+        site / APP / "__init__.py",
+        f'''
+        """Synthetic application"""
+        import gather
+        from gather import entry
+
+        ENTRY_DATA = entry.EntryData.create(
+            __name__, index={index_argument}, discovery={discovery!r}
+        )
+        ''',
+        *extra,
+    )
+    _write(
+        site / APP / "__main__.py",
+        f"""
+        from gather import entry
+        from {APP} import ENTRY_DATA
+
+        entry.dunder_main(globals_dct=globals(), command_data=ENTRY_DATA)
+        """,
+    )
+    _dist_info(site, APP, APP)
+
+
+def _plugin_module(*, commands, collectors):
+    lines = [
+        '"""Synthetic plugins"""',
+        "from gather.commands import add_argument",
+        f"import {APP}",
+        "",
+    ]
+    for command in commands:
+        lines += [
+            "",
+            f"@{APP}.ENTRY_DATA.register("
+            f'add_argument("--value-{command}"), name="command-{command}")',
+            f"def command_{command}(args):",
+            "    pass",
+            "",
+        ]
+        for number in range(1, collectors):
+            lines += [
+                "",
+                f"@{APP}.COLLECTOR_{number}.register()",
+                f"def plugin_{command}_{number}():",
+                "    pass",
+                "",
+            ]
+    return "\n".join(lines)
+
+
+def generate(site, *, packages, modules, commands, collectors, discovery, index):
+    """
+    Generate the application and its plugins.
+
+    Args:
+        site: directory to generate into
+        packages: number of plugin distributions
+        modules: number of plugin modules, spread over the packages
+        commands: number of commands, spread over the modules
+        collectors: number of collectors, including the commands' one
+        discovery: the collectors' discovery
+        index: the application's index path, or :code:`None`
+    """
+    _app(site, collectors=collectors, discovery=discovery, index=index)
+    by_module = [list(range(commands))[number::modules] for number in range(modules)]
+    for number in range(packages):
+        package = f"bench_plugin_{number}"
+        _write(site / package / "__init__.py", '"""Synthetic plugins"""\n')
+        _dist_info(site, package, APP)
+    for number, module_commands in enumerate(by_module):
+        package = f"bench_plugin_{number % packages}"
+        _write(
+            site / package / f"mod_{number}.py",
+            _plugin_module(commands=module_commands, collectors=collectors),
+        )
+
+
+def _child():
+    """Measure one process's startup, and print the results"""
+    start = time.perf_counter()
+    app = importlib.import_module(APP)
+    imported = time.perf_counter()
+    data = app.ENTRY_DATA
+    lazy = data.index is not None or data.collector.discovery == "static"
+    collected = data.collector.collect(index=data.index, lazy=lazy)
+    collected_at = time.perf_counter()
+    commands = importlib.import_module("gather.commands")
+    commands.set_parser(collected=collected)
+    parser_at = time.perf_counter()
+    others = [getattr(app, name) for name in dir(app) if name.startswith("COLLECTOR_")]
+    for collector in others:
+        collector.collect(index=data.index, lazy=lazy)
+    others_at = time.perf_counter()
+    data.collector.collect(index=data.index, lazy=lazy)
+    again_at = time.perf_counter()
+    json.dump(
+        dict(
+            import_app=imported - start,
+            collect=collected_at - imported,
+            set_parser=parser_at - collected_at,
+            collect_others=others_at - parser_at,
+            collect_again=again_at - others_at,
+            peak_rss_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        ),
+        sys.stdout,
+    )
+
+
+def _environment(site):
+    env = dict(os.environ)
+    path = [str(site), *sys.path[1:]]
+    env.update(
+        PYTHONPATH=os.pathsep.join(path),
+        PYTHONHASHSEED="0",
+    )
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env.pop("GATHER_ENTRY_POINTS", None)
+    return env
+
+
+def _clear_bytecode(site):
+    for pycache in site.rglob("__pycache__"):
+        shutil.rmtree(pycache)
+
+
+def _measure(site, env):
+    output = subprocess.run(
+        [sys.executable, __file__],
+        env=dict(env, **{CHILD_ENVIRONMENT_VARIABLE: "1"}),
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def _dispatch(site, env):
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", APP, "command-0"],
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return dict(dispatch=time.perf_counter() - start)
+
+
+def _interpreter(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+    return dict(interpreter=time.perf_counter() - start)
+
+
+def _summary(samples):
+    keys = sorted({key for sample in samples for key in sample})
+    ret = {}
+    for key in keys:
+        values = [sample[key] for sample in samples if key in sample]
+        ret[key] = dict(
+            min=min(values),
+            median=statistics.median(values),
+            max=max(values),
+        )
+    return ret
+
+
+def run(*, repeat, **parameters):
+    """
+    Run the benchmarks.
+
+    Args:
+        repeat: number of samples of each measurement
+        parameters: passed to :code:`generate`
+
+    Returns:
+        The parameters, the environment, and a summary of the samples
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        site = pathlib.Path(tmp_dir) / "site"
+        index = parameters.pop("index")
+        index_path = None if not index else pathlib.Path(tmp_dir) / "index.json"
+        generate(site, index=index_path, **parameters)
+        env = _environment(site)
+        results = {}
+        cold = []
+        for _ in range(repeat):
+            _clear_bytecode(site)
+            if index_path is not None:
+                index_path.unlink(missing_ok=True)
+            cold.append(_measure(site, env))
+        results["cold"] = _summary(cold)
+        results["warm"] = _summary([_measure(site, env) for _ in range(repeat)])
+        results["dispatch"] = _summary(
+            [{**_interpreter(env), **_dispatch(site, env)} for _ in range(repeat)]
+        )
+    gather = importlib.import_module("gather")
+    return dict(
+        parameters=dict(parameters, index=index, repeat=repeat),
+        environment=dict(
+            python=sys.version,
+            implementation=platform.python_implementation(),
+            machine=platform.machine(),
+            gather=gather.__version__,
+        ),
+        results=results,
+    )
+
+
+def _report(result):
+    lines = []
+    for phase, summary in result["results"].items():
+        for key, value in summary.items():
+            unit = "KiB" if key.endswith("_kib") else "ms"
+            scale = 1 if unit == "KiB" else 1000
+            lines.append(
+                f"{phase:10} {key:16} "
+                f"min={value['min'] * scale:10.2f} "
+                f"median={value['median'] * scale:10.2f} "
+                f"max={value['max'] * scale:10.2f} {unit}"
+            )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Parse the command line, run the benchmarks, and report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--packages", type=int, default=4)
+    parser.add_argument("--modules", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--collectors", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--discovery", choices=["venusian", "static"], default="venusian"
+    )
+    parser.add_argument("--index", action="store_true")
+    parser.add_argument("--output", type=pathlib.Path)
+    args = parser.parse_args(argv)
+    if args.packages < 1 or args.modules < 1 or args.collectors < 1:
+        parser.error("packages, modules and collectors must be positive")
+    result = run(
+        repeat=args.repeat,
+        packages=args.packages,
+        modules=args.modules,
+        commands=args.commands,
+        collectors=args.collectors,
+        discovery=args.discovery,
+        index=args.index,
+    )
+    print(_report(result))
+    if args.output is not None:
+        args.output.write_text(json.dumps(result, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    if os.environ.get(CHILD_ENVIRONMENT_VARIABLE):
+        _child()
+    else:
+        main()
@@ -44,12 +44,12 @@ def build(session):
 
 @nox.session(python=VERSIONS[-1])
 def lint(session):
-    files = ["src/", "noxfile.py"]
+    files = ["src/", "benchmarks/", "noxfile.py"]
     session.install("-r", "requirements-lint.txt")
     session.install("-e", ".")
     session.run("black", "--check", "--diff", *files)
     black_compat = ["--max-line-length=88", "--ignore=E203,E501"]
-    session.run("flake8", *black_compat, "src/")
+    session.run("flake8", *black_compat, "src/", "benchmarks/")
     session.run(
         "pylint",
         "--disable=all",
@@ -61,6 +61,13 @@ def lint(session):
     )
 
 
+@nox.session(python=VERSIONS[-1])
+def benchmark(session):
+    """Measure startup time on synthetic plugins"""
+    session.install("-e", ".")
+    session.run("python", "benchmarks/startup.py", *session.posargs)
+
+
 @nox.session(python=VERSIONS[-1])
 def mypy(session):
     session.install("-r", "requirements-mypy.txt")
@@ -1,8 +1,15 @@
 """Gather: The Plugin Gatherer"""
-import importlib.metadata
+from gather.api import Collector, Wrapper, invalidate_cache, unique
 
-from gather.api import Collector, Wrapper, unique
 
-__version__ = importlib.metadata.version(__name__)
+def __getattr__(name):
+    # Looking up the version reads the installed distributions' metadata:
+    # only pay for it when it is used.
+    if name == "__version__":
+        import importlib.metadata  # pylint: disable=import-outside-toplevel
 
-__all__ = ["Collector", "Wrapper", "unique", "__version__"]
+        return importlib.metadata.version(__name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["Collector", "Wrapper", "invalidate_cache", "unique", "__version__"]
@@ -0,0 +1,30 @@
+"""Gather's own commands
+
+.. code::
+
+    python -m gather build-index PATH
+
+saves a precompiled registry
+(see :code:`gather.api.build_registry`).
+"""
+import argparse
+import sys
+
+from gather import api
+
+
+def main(argv):
+    """Run gather's own commands"""
+    parser = argparse.ArgumentParser(prog="python -m gather")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_index = subparsers.add_parser(
+        "build-index",
+        help="save every registration, to load instead of scanning",
+    )
+    build_index.add_argument("path", help="where to save the registry")
+    args = parser.parse_args(argv[1:])
+    api.build_registry(args.path)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
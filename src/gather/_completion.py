@@ -0,0 +1,360 @@
+"""Shell completion
+
+Completing a word has to be fast,
+so it does not collect the commands,
+or build the parser.
+Instead,
+the sub-command names,
+and every sub-command's arguments,
+are saved in a cache the first time,
+and read from it afterwards.
+The cache is keyed by the directories that hold distributions
+(installing or removing one changes them),
+and by the files of the modules the commands are collected from:
+checking it neither looks up the entry points,
+nor looks at other plugins' files.
+
+Choices that are plain strings or numbers are saved.
+Other choices
+(for example, a container that looks things up when iterated)
+are dynamic:
+completing them imports only the module of their command.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import pathlib
+import re
+import shlex
+from typing import Callable, Mapping, Optional, Sequence, Tuple
+
+import attrs
+
+from ._index import checked, write_atomically
+
+FORMAT = 2
+
+SHELLS = ("bash", "zsh", "fish")
+
+_STATIC_CHOICES = (list, tuple, set, frozenset, range)
+
+_PLAIN = (str, int, float)
+
+
+@attrs.frozen
+class Argument:
+    """
+    An argument of a sub-command.
+
+    ``options`` is empty for positional arguments.
+    ``choices`` is :code:`None` for arguments without choices,
+    and for dynamic ones.
+    """
+
+    options: Tuple[str, ...]
+    takes_value: bool
+    choices: Optional[Tuple[str, ...]] = None
+    dynamic: bool = False
+
+
+@attrs.frozen
+class Command:
+    """
+    A sub-command,
+    and where it is registered.
+    """
+
+    name: str
+    module: str
+    attribute: str
+    arguments: Tuple[Argument, ...]
+
+
+def _argument(action):
+    choices = action.choices
+    dynamic = False
+    if choices is not None:
+        if isinstance(choices, _STATIC_CHOICES) and all(
+            isinstance(choice, _PLAIN) for choice in choices
+        ):
+            choices = tuple(str(choice) for choice in choices)
+        else:
+            choices, dynamic = None, True
+    return Argument(
+        options=tuple(action.option_strings),
+        takes_value=action.nargs != 0,
+        choices=choices,
+        dynamic=dynamic,
+    )
+
+
+def describe(
+    name: str, parser: argparse.ArgumentParser, *, module: str, attribute: str
+) -> Command:
+    """
+    Describe a sub-command.
+
+    Args:
+        name: the sub-command name
+        parser: the sub-command's parser
+        module: the module the sub-command is registered in
+        attribute: the module attribute the registered object is found under
+
+    Returns:
+        The sub-command's description
+    """
+    return Command(
+        name=name,
+        module=module,
+        attribute=attribute,
+        arguments=tuple(
+            _argument(action)
+            for action in parser._actions  # pylint: disable=protected-access
+        ),
+    )
+
+
+def choices(parser: argparse.ArgumentParser, options: Sequence[str]) -> Sequence[str]:
+    """
+    Find the current choices of an argument.
+
+    Args:
+        parser: the sub-command's parser
+        options: the argument's option strings
+                 (empty for positional arguments with choices)
+
+    Returns:
+        The choices, as strings
+    """
+    for action in parser._actions:  # pylint: disable=protected-access
+        if tuple(action.option_strings) == tuple(options) and action.choices:
+            return [str(choice) for choice in action.choices]
+    return []
+
+
+def default_path(prefix: str) -> pathlib.Path:
+    """
+    Where the cache is saved, when no path is given.
+
+    Args:
+        prefix: the entry point's prefix
+
+    Returns:
+        A path in the user's cache directory
+    """
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return pathlib.Path(cache) / "gather" / f"{prefix}-completion.json"
+
+
+def load(
+    path: os.PathLike | str,
+    site: object,
+    fingerprint: Callable[[Sequence[str]], str],
+) -> Optional[Mapping[str, Command]]:
+    """
+    Load the cache.
+
+    Args:
+        path: cache file
+        site: the current fingerprint of the directories holding distributions
+        fingerprint: fingerprints the files of the saved roots
+
+    Returns:
+        The sub-commands, by name,
+        or :code:`None` if the cache is missing, unreadable or stale.
+    """
+    try:
+        with open(path, encoding="utf-8") as fpin:
+            content = checked(json.load(fpin), FORMAT, None)
+    except (OSError, ValueError):
+        return None
+    if content is None or content["site"] != site:
+        return None
+    if content["fingerprint"] != fingerprint(content["roots"]):
+        return None
+    ret = {}
+    for name, module, attribute, arguments in content["commands"]:
+        ret[name] = Command(
+            name=name,
+            module=module,
+            attribute=attribute,
+            arguments=tuple(
+                Argument(
+                    options=tuple(options),
+                    takes_value=takes_value,
+                    choices=None if choices is None else tuple(choices),
+                    dynamic=dynamic,
+                )
+                for options, takes_value, choices, dynamic in arguments
+            ),
+        )
+    return ret
+
+
+def save(
+    path: os.PathLike | str,
+    commands: Sequence[Command],
+    *,
+    site: object,
+    roots: Sequence[str],
+    fingerprint: str,
+) -> None:
+    """
+    Atomically write the cache.
+
+    Args:
+        path: cache file
+        commands: the sub-commands
+        site: the fingerprint of the directories holding distributions
+        roots: the modules the commands are collected from
+        fingerprint: the fingerprint of the roots' files
+    """
+    content = dict(
+        format=FORMAT,
+        site=site,
+        roots=list(roots),
+        fingerprint=fingerprint,
+        commands=[
+            [
+                command.name,
+                command.module,
+                command.attribute,
+                [
+                    [
+                        list(argument.options),
+                        argument.takes_value,
+                        None if argument.choices is None else list(argument.choices),
+                        argument.dynamic,
+                    ]
+                    for argument in command.arguments
+                ],
+            ]
+            for command in commands
+        ],
+    )
+    write_atomically(path, content)
+
+
+def _values(command, argument, resolve):
+    if argument.dynamic:
+        return resolve(command, argument.options)
+    return argument.choices or []
+
+
+def complete(
+    commands: Mapping[str, Command],
+    words: Sequence[str],
+    resolve: Callable[[Command, Sequence[str]], Sequence[str]],
+) -> Sequence[str]:
+    """
+    Complete the last word of a command line.
+
+    Args:
+        commands: the sub-commands, by name
+        words: the command line, up to the word being completed
+               (which may be empty)
+        resolve: called with a sub-command,
+                 and an argument's option strings,
+                 to find dynamic choices
+
+    Returns:
+        The candidates
+    """
+    current = words[-1]
+    if len(words) <= 2:
+        return sorted(name for name in commands if name.startswith(current))
+    command = commands.get(words[1])
+    if command is None:
+        return []
+    by_option = {
+        option: argument
+        for argument in command.arguments
+        for option in argument.options
+    }
+    previous = by_option.get(words[-2]) if len(words) > 3 else None
+    if previous is not None and previous.takes_value:
+        candidates = _values(command, previous, resolve)
+        return [value for value in candidates if value.startswith(current)]
+    if current.startswith("-"):
+        option, equals, value = current.partition("=")
+        argument = by_option.get(option)
+        if equals and argument is not None and argument.takes_value:
+            candidates = _values(command, argument, resolve)
+            return [
+                f"{option}={candidate}"
+                for candidate in candidates
+                if candidate.startswith(value)
+            ]
+        return sorted(option for option in by_option if option.startswith(current))
+    return [
+        value
+        for argument in command.arguments
+        if len(argument.options) == 0
+        for value in _values(command, argument, resolve)
+        if value.startswith(current)
+    ]
+
+
+_BASH = """\
+_gather_complete_{function}() {{
+    local IFS=$'\\n'
+    COMPREPLY=($({program} words {flags}-- "${{COMP_WORDS[@]:0:COMP_CWORD+1}}" \\
+        2>/dev/null))
+}}
+complete -o default -F _gather_complete_{function} {name}
+"""
+
+_ZSH = """\
+_gather_complete_{function}() {{
+    local -a candidates
+    candidates=(${{(f)"$({program} words {flags}-- "${{(@)words[1,CURRENT]}}" \\
+        2>/dev/null)"}})
+    compadd -- $candidates
+}}
+compdef _gather_complete_{function} {name}
+"""
+
+_FISH = """\
+function __gather_complete_{function}
+    {program} words {flags}-- (commandline -opc) (commandline -ct) 2>/dev/null
+end
+complete -c {name} -a '(__gather_complete_{function})'
+"""
+
+_TEMPLATES = dict(bash=_BASH, zsh=_ZSH, fish=_FISH)
+
+
+def script(
+    shell: str,
+    *,
+    program: str,
+    commands: Sequence[str] = (),
+    subcommands: Sequence[str] = (),
+) -> str:
+    """
+    Write the script that sets up completion in a shell.
+
+    Args:
+        shell: one of :code:`SHELLS`
+        program: the completion console script
+        commands: console scripts taking a sub-command
+        subcommands: console scripts that are a sub-command
+
+    Returns:
+        The script, to be sourced by the shell
+    """
+    template = _TEMPLATES[shell]
+    parts = []
+    for names, flags in [(commands, ""), (subcommands, "--subcommand ")]:
+        for name in names:
+            parts.append(
+                template.format(
+                    function=re.sub(r"\W", "_", name),
+                    program=shlex.quote(program),
+                    flags=flags,
+                    name=shlex.quote(name),
+                )
+            )
+    return "".join(parts)
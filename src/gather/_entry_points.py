@@ -0,0 +1,239 @@
+"""Cached lookup of the :code:`gather` entry points
+
+Looking up entry points reads the metadata of every distribution
+on :code:`sys.path`.
+The result is cached,
+keyed by the modification times of the :code:`sys.path` directories
+that hold distributions:
+installing or removing a distribution changes them.
+The script's directory and the current directory are left out,
+so saved entry points work from any script.
+
+The entry points can also be computed ahead of time
+(for example, when building a container image),
+and saved to a file named by the :code:`GATHER_ENTRY_POINTS`
+environment variable.
+
+A distribution can also declare entry points in
+the :code:`gather.include` and :code:`gather.exclude` groups:
+their values are patterns of the modules to scan, or not,
+under the distribution's :code:`gather` entry points.
+"""
+
+from __future__ import annotations
+import collections
+import json
+import math
+import os
+import site
+import sys
+import time
+from typing import Iterable, Optional, Sequence, Tuple
+
+import attrs
+
+from ._index import checked, write_atomically
+
+ENVIRONMENT_VARIABLE = "GATHER_ENTRY_POINTS"
+
+FORMAT = 1
+
+
+@attrs.frozen
+class Distribution:
+    """The distribution that declared an entry point"""
+
+    name: Optional[str]
+    version: Optional[str]
+
+
+def _strings(values: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(values)
+
+
+@attrs.frozen
+class EntryPoint:
+    """
+    A :code:`gather` entry point.
+
+    ``include`` and ``exclude`` are the module patterns
+    its distribution declares.
+    """
+
+    name: str
+    value: str
+    dist: Optional[Distribution]
+    include: Tuple[str, ...] = attrs.field(default=(), converter=_strings)
+    exclude: Tuple[str, ...] = attrs.field(default=(), converter=_strings)
+
+
+_PATTERN_GROUPS = dict(include="gather.include", exclude="gather.exclude")
+
+
+def _site_directories():
+    try:
+        return {*site.getsitepackages(), site.getusersitepackages()}
+    except AttributeError:  # pragma: no cover
+        # Some virtual environments ship an older site module
+        return set()
+
+
+def _holds_distributions(path, site_directories):
+    if path in site_directories:
+        return True
+    try:
+        with os.scandir(path) as entries:
+            return any(
+                entry.name.endswith((".dist-info", ".egg-info")) for entry in entries
+            )
+    except OSError:
+        return False
+
+
+def site_fingerprint():
+    """
+    Fingerprint the directories that hold distributions.
+
+    The script's directory (:code:`sys.path[0]`) and the current directory
+    are left out:
+    they change between building and running,
+    but do not hold installed distributions.
+    """
+    ignored = {"", os.getcwd(), *sys.path[:1]}
+    site_directories = _site_directories()
+    parts = []
+    for path in sys.path:
+        if path in ignored:
+            continue
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            parts.append([path, None])
+            continue
+        if _holds_distributions(path, site_directories):
+            parts.append([path, mtime])
+    return parts
+
+
+def _from_metadata() -> Tuple[EntryPoint, ...]:
+    # Importing importlib.metadata is slow: only do it when looking up
+    import importlib.metadata  # pylint: disable=import-outside-toplevel
+
+    patterns = collections.defaultdict(list)
+    for kind, group in _PATTERN_GROUPS.items():
+        for entry_point in importlib.metadata.entry_points(group=group):
+            dist_name = getattr(entry_point.dist, "name", None)
+            patterns[kind, dist_name].append(entry_point.value)
+    return tuple(
+        EntryPoint(
+            name=entry_point.name,
+            value=entry_point.value,
+            dist=(
+                None
+                if entry_point.dist is None
+                else Distribution(
+                    name=entry_point.dist.name, version=entry_point.dist.version
+                )
+            ),
+            include=sorted(
+                patterns["include", getattr(entry_point.dist, "name", None)]
+            ),
+            exclude=sorted(
+                patterns["exclude", getattr(entry_point.dist, "name", None)]
+            ),
+        )
+        for entry_point in importlib.metadata.entry_points(group="gather")
+    )
+
+
+def _load(path, fingerprint) -> Optional[Tuple[EntryPoint, ...]]:
+    try:
+        with open(path, encoding="utf-8") as fpin:
+            content = checked(json.load(fpin), FORMAT, fingerprint)
+        if content is None:
+            return None
+        return tuple(
+            EntryPoint(
+                name=name,
+                value=value,
+                dist=None if dist is None else Distribution(*dist),
+                include=include,
+                exclude=exclude,
+            )
+            for (name, value, dist), (include, exclude) in zip(
+                content["entry_points"], content["patterns"], strict=True
+            )
+        )
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def save(path: os.PathLike | str) -> None:
+    """
+    Save the current entry points.
+
+    Args:
+        path: where to save them
+    """
+    entry_points = _from_metadata()
+    content = dict(
+        format=FORMAT,
+        fingerprint=site_fingerprint(),
+        entry_points=[
+            [
+                entry_point.name,
+                entry_point.value,
+                None if entry_point.dist is None else attrs.astuple(entry_point.dist),
+            ]
+            for entry_point in entry_points
+        ],
+        patterns=[
+            [list(entry_point.include), list(entry_point.exclude)]
+            for entry_point in entry_points
+        ],
+    )
+    write_atomically(path, content)
+
+
+@attrs.define
+class Cache:
+    """
+    A cache of the entry points.
+
+    ``max_age`` is how long, in seconds,
+    the entry points are used without checking the fingerprint.
+    With :code:`0`, the fingerprint is checked every time.
+    With :code:`None`, it is never checked again,
+    until the cache is cleared.
+    """
+
+    max_age: Optional[float] = 0
+    _checked: float = attrs.field(default=-math.inf, init=False)
+    _fingerprint: object = attrs.field(default=None, init=False)
+    _entry_points: Optional[Sequence[EntryPoint]] = attrs.field(
+        default=None, init=False
+    )
+
+    def get(self) -> Sequence[EntryPoint]:
+        """Return the entry points, looking them up if needed"""
+        now = time.monotonic()
+        entry_points = self._entry_points
+        if entry_points is not None:
+            if self.max_age is None or now - self._checked < self.max_age:
+                return entry_points
+        fingerprint = site_fingerprint()
+        self._checked = now
+        if entry_points is None or fingerprint != self._fingerprint:
+            precomputed = os.environ.get(ENVIRONMENT_VARIABLE)
+            entry_points = (
+                None if precomputed is None else _load(precomputed, fingerprint)
+            )
+            if entry_points is None:
+                entry_points = _from_metadata()
+            self._fingerprint, self._entry_points = fingerprint, entry_points
+        return entry_points
+
+    def clear(self) -> None:
+        """Forget the entry points"""
+        self._checked = -math.inf
+        self._fingerprint = self._entry_points = None
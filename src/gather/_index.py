@@ -0,0 +1,313 @@
+"""On-disk index of registrations
+
+The index records, for every module under a :code:`gather` entry point,
+which names it registers, and under which collector,
+and which packages were under the entry points.
+It is keyed by a fingerprint of the installed distributions
+and of the modules' files,
+and is rebuilt whenever the fingerprint changes.
+"""
+
+from __future__ import annotations
+import hashlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import pathlib
+import tempfile
+from typing import (
+    IO,
+    Any,
+    Callable,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import attrs
+
+FORMAT = 2
+
+
+@attrs.frozen
+class Location:
+    """
+    Where a registration was made.
+
+    ``collector`` holds the ``module:attribute`` references
+    through which the collector could be found when the index was built.
+    An empty tuple means the collector could not be found:
+    the module should be scanned for every collector.
+    """
+
+    collector: Tuple[str, ...]
+    name: str
+    module: str
+    attribute: str
+
+
+def _package_files(package, root, suffixes):
+    # Packages inside zip files have no directory to list
+    filenames = sorted(os.listdir(root)) if os.path.isdir(root) else []
+    for filename in filenames:
+        path = os.path.join(root, filename)
+        if os.path.isfile(os.path.join(path, "__init__.py")):
+            if filename.isidentifier():
+                yield from _package_files(f"{package}.{filename}", path, suffixes)
+            continue
+        modname = filename.split(".", 1)[0]
+        if not filename.endswith(suffixes) or not modname.isidentifier():
+            continue
+        if modname == "__init__":
+            yield package, path
+        else:
+            yield f"{package}.{modname}", path
+
+
+def module_files(module_name: str) -> Iterable[Tuple[str, str]]:
+    """
+    Find the files of a module, and of all its submodules.
+
+    The files are found without importing anything
+    (except for parent packages of a dotted name).
+
+    Args:
+        module_name: the name of a module or a package
+
+    Returns:
+        Pairs of module names and file paths
+    """
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        return
+    roots = spec.submodule_search_locations
+    if roots is None:
+        roots = []
+        if spec.origin is not None and os.path.exists(spec.origin):
+            yield module_name, spec.origin
+    suffixes = tuple(importlib.machinery.all_suffixes())
+    for root in roots:
+        yield from _package_files(module_name, root, suffixes)
+
+
+def packages(roots: Iterable[str]) -> FrozenSet[str]:
+    """
+    Find the packages under the roots, without importing them.
+
+    Args:
+        roots: names of modules or packages
+
+    Returns:
+        The names of the packages (including the roots that are packages)
+    """
+    return frozenset(
+        module_name
+        for root in roots
+        for module_name, path in module_files(root)
+        if os.path.basename(path).startswith("__init__.")
+    )
+
+
+def fingerprint(entry_points: Iterable) -> str:
+    """
+    Fingerprint the entry points, their distributions, and their files.
+
+    Only :code:`stat` is called on the files:
+    no module is imported.
+
+    Args:
+        entry_points: :code:`gather` entry points
+
+    Returns:
+        A string that changes whenever a distribution,
+        or a module file, changes.
+    """
+    parts: List[Any] = []
+    for entry_point in entry_points:
+        dist = entry_point.dist
+        parts.append(
+            [
+                entry_point.name,
+                entry_point.value,
+                getattr(dist, "name", None),
+                getattr(dist, "version", None),
+                list(getattr(entry_point, "include", ())),
+                list(getattr(entry_point, "exclude", ())),
+            ]
+        )
+        parts.extend(_file_parts(entry_point.value))
+    return _digest(parts)
+
+
+def files_fingerprint(module_names: Iterable[str]) -> str:
+    """
+    Fingerprint the files of modules, and of their submodules.
+
+    Only :code:`stat` is called on the files:
+    no module is imported.
+
+    Args:
+        module_names: names of modules or packages
+
+    Returns:
+        A string that changes whenever a module file changes,
+        appears or disappears.
+    """
+    return _digest(
+        [part for module_name in module_names for part in _file_parts(module_name)]
+    )
+
+
+def _file_parts(module_name):
+    for _module_name, path in module_files(module_name):
+        stat = os.stat(path)
+        yield [path, stat.st_mtime_ns, stat.st_size]
+
+
+def _digest(parts):
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def checked(content: Any, fmt: int, expected: Optional[object]) -> Optional[dict]:
+    """
+    Check that a loaded cache file is current.
+
+    Args:
+        content: the file's content
+        fmt: the format the reader understands
+        expected: the current fingerprint,
+                  or :code:`None` to accept a stale file too
+
+    Returns:
+        The content, or :code:`None` if it is not a dictionary,
+        or it has another format or fingerprint.
+    """
+    if not isinstance(content, dict):
+        return None
+    if content.get("format") != fmt:
+        return None
+    if expected is not None and content.get("fingerprint") != expected:
+        return None
+    return content
+
+
+def write_atomically(
+    path: os.PathLike | str,
+    content: Any,
+    dump: Callable[[Any, IO], None] = json.dump,
+    *,
+    binary: bool = False,
+) -> None:
+    """
+    Write a cache file atomically.
+
+    The content is written to a temporary file in the same directory,
+    which then replaces the file:
+    readers see either the old content or the new one.
+
+    Args:
+        path: the file
+        content: what to write
+        dump: writes the content to an open file
+              (by default, as JSON)
+        binary: whether the file is opened in binary mode
+    """
+    target = pathlib.Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "wb" if binary else "w",
+        encoding=None if binary else "utf-8",
+        dir=target.parent,
+        delete=False,
+        suffix=".tmp",
+    ) as fpout:
+        dump(content, fpout)
+    os.replace(fpout.name, target)
+
+
+def _read(path, expected):
+    try:
+        with open(path, encoding="utf-8") as fpin:
+            return checked(json.load(fpin), FORMAT, expected)
+    except (OSError, ValueError):
+        return None
+
+
+def load(
+    path: os.PathLike | str, expected: Optional[str]
+) -> Optional[Sequence[Location]]:
+    """
+    Load the index.
+
+    Args:
+        path: index file
+        expected: the current fingerprint,
+                  or :code:`None` to load a stale index too
+
+    Returns:
+        The locations, or :code:`None` if the index is missing,
+        unreadable or stale.
+    """
+    content = _read(path, expected)
+    if content is None:
+        return None
+    return [
+        Location(
+            collector=tuple(collector),
+            name=name,
+            module=module,
+            attribute=attribute,
+        )
+        for collector, name, module, attribute in content["locations"]
+    ]
+
+
+def load_packages(path: os.PathLike | str) -> FrozenSet[str]:
+    """
+    Load the packages that were under the entry points, even from a stale index.
+
+    Args:
+        path: index file
+
+    Returns:
+        The package names
+        (none, if the index is missing or unreadable)
+    """
+    content = _read(path, None)
+    if content is None:
+        return frozenset()
+    return frozenset(content["packages"])
+
+
+def save(
+    path: os.PathLike | str,
+    current: str,
+    locations: Iterable[Location],
+    packages: Iterable[str] = (),
+) -> None:
+    """
+    Atomically write the index.
+
+    Args:
+        path: index file
+        current: the current fingerprint
+        locations: the locations to record
+        packages: the packages under the entry points
+    """
+    content = dict(
+        format=FORMAT,
+        fingerprint=current,
+        locations=[
+            [list(loc.collector), loc.name, loc.module, loc.attribute]
+            for loc in locations
+        ],
+        packages=sorted(packages),
+    )
+    write_atomically(path, content)
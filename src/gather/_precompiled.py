@@ -0,0 +1,131 @@
+"""Precompiled registry
+
+The registry is built once,
+for example when building a container image,
+by scanning every module under every :code:`gather` entry point.
+It records every registration, for every collector,
+with the registered value pickled when possible:
+functions and classes are pickled as references to their module and name,
+and transforms' extra data by value.
+
+At runtime,
+collecting loads the registry,
+if the :code:`GATHER_REGISTRY` environment variable names it,
+instead of scanning.
+Like the registration index,
+it is keyed by a fingerprint of the distributions and the modules' files,
+and ignored when stale.
+
+The registry is a pickle:
+only load registries built by a trusted process.
+"""
+
+from __future__ import annotations
+import os
+import pickle
+from typing import Any, Iterable, Optional, Sequence
+
+import attrs
+
+from ._index import Location, checked, write_atomically
+
+ENVIRONMENT_VARIABLE = "GATHER_REGISTRY"
+
+FORMAT = 1
+
+
+@attrs.frozen
+class Entry:
+    """
+    A registration.
+
+    ``pickled`` is the pickled registered value,
+    or :code:`None` if it could not be pickled:
+    its module has to be scanned.
+    """
+
+    location: Location
+    pickled: Optional[bytes]
+
+
+def dumps(value: Any) -> Optional[bytes]:
+    """
+    Pickle a registered value.
+
+    Args:
+        value: the value
+
+    Returns:
+        The pickle,
+        or :code:`None` if the value cannot be pickled
+        (or unpickled: for example, a function that is not
+        reachable by its name)
+    """
+    try:
+        pickled = pickle.dumps(value)
+        pickle.loads(pickled)
+    except Exception:  # pylint: disable=broad-except
+        return None
+    return pickled
+
+
+def load(path: os.PathLike | str, expected: str) -> Optional[Sequence[Entry]]:
+    """
+    Load the registry.
+
+    Values are not unpickled:
+    loading imports no plugin module.
+
+    Args:
+        path: registry file
+        expected: the current fingerprint
+
+    Returns:
+        The entries, or :code:`None` if the registry is missing,
+        unreadable or stale.
+    """
+    try:
+        with open(path, "rb") as fpin:
+            content = checked(pickle.load(fpin), FORMAT, expected)
+    except Exception:  # pylint: disable=broad-except
+        return None
+    if content is None:
+        return None
+    return [
+        Entry(
+            location=Location(
+                collector=tuple(collector),
+                name=name,
+                module=module,
+                attribute=attribute,
+            ),
+            pickled=pickled,
+        )
+        for collector, name, module, attribute, pickled in content["entries"]
+    ]
+
+
+def save(path: os.PathLike | str, current: str, entries: Iterable[Entry]) -> None:
+    """
+    Atomically write the registry.
+
+    Args:
+        path: registry file
+        current: the current fingerprint
+        entries: the registrations
+    """
+    content = dict(
+        format=FORMAT,
+        fingerprint=current,
+        entries=[
+            (
+                entry.location.collector,
+                entry.location.name,
+                entry.location.module,
+                entry.location.attribute,
+                entry.pickled,
+            )
+            for entry in entries
+        ],
+    )
+    write_atomically(path, content, pickle.dump, binary=True)
@@ -0,0 +1,167 @@
+"""Running subprocesses from commands
+
+These complement :code:`commander_data.run.Runner`,
+which commands get as :code:`args.run` and :code:`args.safe_run`.
+"""
+
+from __future__ import annotations
+import argparse
+import concurrent.futures
+import logging
+import subprocess
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import attrs
+
+LOGGER = logging.getLogger(__name__)
+
+_RUNNER_LOGGER = logging.getLogger("commander_data.run")
+
+
+async def _really_run(
+    create_subprocess_exec: Optional[Callable],
+    cmdargs: Sequence[str],
+    *,
+    check: bool = True,
+    capture_output: bool = True,
+    text: bool = True,
+    input: Optional[Any] = None,  # pylint: disable=redefined-builtin
+    **kwargs: Any,
+) -> subprocess.CompletedProcess:
+    if create_subprocess_exec is None:
+        # Only commands that run processes asynchronously pay for asyncio
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        create_subprocess_exec = asyncio.create_subprocess_exec
+    LOGGER.info("Running %s", list(cmdargs))
+    if capture_output:
+        kwargs.update(stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if input is not None:
+        kwargs.update(stdin=subprocess.PIPE)
+        if text:
+            input = input.encode("utf-8")
+    process = await create_subprocess_exec(*cmdargs, **kwargs)
+    stdout, stderr = await process.communicate(input)
+    # The process has exited: waiting only gets its return code
+    returncode = await process.wait()
+    if text:
+        stdout, stderr = (
+            None if output is None else output.decode("utf-8")
+            for output in [stdout, stderr]
+        )
+    result = subprocess.CompletedProcess(list(cmdargs), returncode, stdout, stderr)
+    if check:
+        try:
+            result.check_returncode()
+        except subprocess.CalledProcessError as exc:
+            exc.add_note(f"STDERR: {exc.stderr}")
+            exc.add_note(f"STDOUT: {exc.stdout}")
+            raise
+    return result
+
+
+@attrs.frozen
+class AsyncRunner:
+    """
+    Run subprocesses with :code:`asyncio`.
+
+    The arguments are like :code:`subprocess.run`'s,
+    with the same defaults as :code:`args.run`:
+    the output is captured as text,
+    and failures raise :code:`subprocess.CalledProcessError`.
+    """
+
+    _create_subprocess_exec: Optional[Callable] = None
+    _no_dry_run: bool = attrs.field(default=False, kw_only=True)
+
+    async def run(
+        self, cmdargs: Sequence[str], **kwargs: Any
+    ) -> subprocess.CompletedProcess:
+        """Run, only if :code:`--no-dry-run` was passed"""
+        if not self._no_dry_run:
+            LOGGER.info("Dry run, not running %s", list(cmdargs))
+            return subprocess.CompletedProcess(list(cmdargs), 0, "", "")
+        return await _really_run(self._create_subprocess_exec, cmdargs, **kwargs)
+
+    async def safe_run(
+        self, cmdargs: Sequence[str], **kwargs: Any
+    ) -> subprocess.CompletedProcess:
+        """Run, even in a dry run"""
+        return await _really_run(self._create_subprocess_exec, cmdargs, **kwargs)
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> AsyncRunner:
+        """Create a runner from the parsed command line"""
+        return cls(no_dry_run=getattr(args, "no_dry_run", False))
+
+
+@attrs.define
+class _OrderedLogs:
+    """Hold back the records logged by each task, to emit them in order"""
+
+    _local: threading.local = attrs.field(factory=threading.local)
+    _records: Dict[int, List[logging.LogRecord]] = attrs.field(factory=dict)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Hold back records logged by tasks"""
+        index = getattr(self._local, "index", None)
+        if index is None:
+            return True
+        self._records[index].append(record)
+        return False
+
+    def run(self, index: int, run: Callable, cmdargs: Sequence[str], kwargs):
+        """Run a task, holding back its records"""
+        self._records[index] = []
+        self._local.index = index
+        try:
+            return run(cmdargs, **kwargs)
+        finally:
+            del self._local.index
+
+    def emit(self, index: int) -> None:
+        """Emit the records a task logged"""
+        for record in self._records.pop(index, []):
+            logging.getLogger(record.name).handle(record)
+
+
+def run_many(
+    run: Callable,
+    cmdargs_list: Iterable[Sequence[str]],
+    *,
+    max_workers: Optional[int] = None,
+    **kwargs: Any,
+) -> List[Any]:
+    """
+    Run processes concurrently.
+
+    The runner's log messages are emitted in submission order,
+    as if the processes ran one after the other.
+
+    Args:
+        run: runs one process (:code:`args.run` or :code:`args.safe_run`)
+        cmdargs_list: the processes' command lines
+        max_workers: how many processes to run at once
+        kwargs: passed to :code:`run`
+
+    Returns:
+        The results, in submission order.
+        If any process fails,
+        the first failure is raised
+        after all processes are done.
+    """
+    logs = _OrderedLogs()
+    _RUNNER_LOGGER.addFilter(logs)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(logs.run, index, run, cmdargs, kwargs)
+                for index, cmdargs in enumerate(cmdargs_list)
+            ]
+            for index, future in enumerate(futures):
+                concurrent.futures.wait([future])
+                logs.emit(index)
+    finally:
+        _RUNNER_LOGGER.removeFilter(logs)
+    return [future.result() for future in futures]
@@ -0,0 +1,280 @@
+"""Resident command server
+
+The server collects once,
+builds the parser once,
+and then runs commands sent to it on a Unix socket.
+
+With :code:`fork=True`,
+every command runs in a child process forked from the server,
+so commands are isolated from each other,
+and can run concurrently,
+without paying for imports.
+
+The client sends its standard input, output and error
+file descriptors,
+so commands (and the processes they run)
+read and write the client's terminal directly.
+It also sends its command line, environment and working directory,
+and receives the exit code.
+Commands run without :code:`GATHER_SOCKET` in their environment,
+so that the gather commands they run start on their own,
+rather than waiting for the server that is running them.
+"""
+
+from __future__ import annotations
+import argparse
+import contextlib
+import json
+import os
+import socket
+import struct
+import sys
+from typing import Any, Mapping, Optional, Sequence, Set
+
+import attrs
+
+from . import commands as commandslib
+
+ENVIRONMENT_VARIABLE = "GATHER_SOCKET"
+
+_MARKER = b"G"
+
+
+def _read_exactly(connection, size):
+    chunks = []
+    while size > 0:
+        chunk = connection.recv(size)
+        if len(chunk) == 0:
+            raise ConnectionError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _send(connection, content):
+    data = json.dumps(content).encode("utf-8")
+    connection.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _receive(connection):
+    [length] = struct.unpack("!I", _read_exactly(connection, 4))
+    return json.loads(_read_exactly(connection, length))
+
+
+def forward(
+    path: os.PathLike | str,
+    *,
+    argv: Sequence[str],
+    env: Mapping[str, str],
+    cwd: str,
+    is_subcommand: bool = False,
+    fds: Sequence[int] = (0, 1, 2),
+) -> Optional[int]:
+    """
+    Run a command on the server.
+
+    Args:
+        path: the server's socket
+        argv: the command line
+        env: the environment
+        cwd: the working directory
+        is_subcommand: whether running as a sub-command script
+        fds: the standard input, output and error file descriptors
+
+    Returns:
+        The exit code,
+        or :code:`None` if no server (owned by this user) is listening.
+        If the command's process dies without reporting its exit code,
+        the exit code is 1.
+    """
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except OSError:
+        return None
+    with connection:
+        try:
+            connection.connect(os.fspath(path))
+        except OSError:
+            return None
+        socket.send_fds(connection, [_MARKER], list(fds))
+        _send(
+            connection,
+            dict(
+                argv=list(argv),
+                env=dict(env),
+                cwd=cwd,
+                is_subcommand=is_subcommand,
+            ),
+        )
+        try:
+            return _receive(connection)["exit"]
+        except ConnectionError:
+            return 1
+
+
+@contextlib.contextmanager
+def _redirected(fds):
+    for stream in [sys.stdout, sys.stderr]:
+        stream.flush()
+    saved = [os.dup(number) for number in range(len(fds))]
+    try:
+        for number, fd in enumerate(fds):
+            os.dup2(fd, number)
+        yield
+    finally:
+        for stream in [sys.stdout, sys.stderr]:
+            stream.flush()
+        for number, fd in enumerate(saved):
+            os.dup2(fd, number)
+            os.close(fd)
+
+
+@contextlib.contextmanager
+def _environment(env):
+    saved = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+
+
+@contextlib.contextmanager
+def _working_directory(cwd):
+    saved = os.getcwd()
+    os.chdir(cwd)
+    try:
+        yield
+    finally:
+        os.chdir(saved)
+
+
+@attrs.define
+class Server:
+    """
+    Run commands sent on a Unix socket.
+
+    Commands run with the client's file descriptors,
+    environment and working directory.
+    By default,
+    they run one at a time,
+    in the server's process.
+    With :code:`fork=True`,
+    each runs in a forked child process,
+    which reports the exit code to the client.
+    """
+
+    parser: argparse.ArgumentParser
+    prefix: Optional[str] = None
+    fork: bool = False
+    _children: Set[int] = attrs.field(factory=set, init=False)
+
+    def run(self, request: Mapping[str, Any]) -> int:
+        """
+        Run a command.
+
+        Args:
+            request: the command line, environment and working directory
+
+        Returns:
+            The exit code
+        """
+        env = {
+            name: value
+            for name, value in request["env"].items()
+            if name != ENVIRONMENT_VARIABLE
+        }
+        with _environment(env), _working_directory(request["cwd"]):
+            return commandslib.exit_code(
+                lambda: commandslib.run_maybe_dry(
+                    parser=self.parser,
+                    argv=request["argv"],
+                    env=os.environ,
+                    is_subcommand=request["is_subcommand"],
+                    prefix=self.prefix,
+                )
+            )
+
+    def handle(self, connection: socket.socket) -> None:
+        """
+        Handle one client.
+
+        Args:
+            connection: connected to the client
+        """
+        _marker, fds, _flags, _address = socket.recv_fds(connection, 1, 3)
+        try:
+            request = _receive(connection)
+            if self.fork:
+                pid = os.fork()
+                if pid == 0:  # pragma: no cover
+                    self._child(connection, request, fds)
+                self._children.add(pid)
+                return
+            with _redirected(fds):
+                code = self.run(request)
+        finally:
+            for fd in fds:
+                os.close(fd)
+        _send(connection, dict(exit=code))
+
+    def _reap(self):
+        """Wait for the children that exited"""
+        for pid in list(self._children):
+            if os.waitpid(pid, os.WNOHANG)[0] != 0:
+                self._children.remove(pid)
+
+    def _child(self, connection, request, fds):  # pragma: no cover
+        """Run the command, report the exit code, and exit"""
+        code = 1
+        try:
+            for number, fd in enumerate(fds):
+                os.dup2(fd, number)
+            code = self.run(request)
+            for stream in [sys.stdout, sys.stderr]:
+                stream.flush()
+            _send(connection, dict(exit=code))
+        finally:
+            os._exit(code)  # pylint: disable=protected-access
+
+    def serve(self, path: os.PathLike | str, *, requests: Optional[int] = None):
+        """
+        Listen on a Unix socket, and handle clients.
+
+        Only the user running the server can connect.
+
+        Args:
+            path: the socket
+            requests: how many clients to handle before returning
+                      (by default, forever)
+        """
+        path = os.fspath(path)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            listener.bind(path)
+        finally:
+            os.umask(umask)
+        listener.listen()
+        handled = 0
+        try:
+            while requests is None or handled < requests:
+                connection, _address = listener.accept()
+                self._reap()
+                handled += 1
+                with connection:
+                    try:
+                        self.handle(connection)
+                    except (OSError, ValueError):
+                        # The client went away, or sent garbage
+                        continue
+        finally:
+            listener.close()
+            os.unlink(path)
+            self._reap()
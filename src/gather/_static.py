@@ -0,0 +1,212 @@
+"""Static discovery of registrations
+
+Registrations are found by parsing the modules' source,
+without importing them.
+Only top-level functions and classes decorated with
+:code:`<REFERENCE>.register(...)`,
+with a literal :code:`name=` (or no name),
+and only :code:`add_argument(...)` calls as positional arguments,
+are understood.
+Modules with anything else that might register
+(other decorators, or :code:`.register` calls elsewhere)
+are reported as unresolved,
+so that they can be scanned by importing them.
+"""
+
+from __future__ import annotations
+import ast
+import os
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+from . import _index
+
+# What EntryData.register takes positionally
+_ADD_ARGUMENT = "gather.commands.add_argument"
+
+# Decorators that are known not to register anything
+_HARMLESS = frozenset(
+    [
+        "property",
+        "staticmethod",
+        "classmethod",
+        "abc.abstractmethod",
+        "attr.s",
+        "attr.attrs",
+        "attr.define",
+        "attr.frozen",
+        "attr.mutable",
+        "attrs.define",
+        "attrs.frozen",
+        "attrs.mutable",
+        "contextlib.contextmanager",
+        "contextlib.asynccontextmanager",
+        "dataclasses.dataclass",
+        "functools.cache",
+        "functools.cached_property",
+        "functools.lru_cache",
+        "functools.singledispatch",
+        "functools.total_ordering",
+        "functools.wraps",
+        "typing.final",
+        "typing.overload",
+    ]
+)
+
+
+class _Unresolved(Exception):
+    """The module cannot be understood statically"""
+
+
+def _package(module_name, path):
+    if os.path.basename(path).startswith("__init__."):
+        return module_name
+    return module_name.rpartition(".")[0]
+
+
+def _bindings(tree, module_name, package):
+    """Map top-level names to the dotted names they refer to"""
+    bindings = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname is None:
+                    top = alias.name.split(".", 1)[0]
+                    bindings[top] = top
+                else:
+                    bindings[alias.asname] = alias.name
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level > 0:
+                parent = package.rsplit(".", node.level - 1)[0]
+                base = ".".join(part for part in [parent, base] if part)
+            for alias in node.names:
+                bindings[alias.asname or alias.name] = f"{base}.{alias.name}"
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    bindings[target.id] = f"{module_name}.{target.id}"
+    return bindings
+
+
+def _dotted(node, bindings):
+    """Resolve a name, or attribute access, to a dotted name"""
+    if isinstance(node, ast.Name):
+        return bindings.get(node.id, node.id)
+    if isinstance(node, ast.Attribute):
+        return f"{_dotted(node.value, bindings)}.{node.attr}"
+    raise _Unresolved(node)
+
+
+def _registered_name(call, default, bindings):
+    for arg in call.args:
+        # Collector.register takes the name positionally,
+        # EntryData.register takes add_argument(...) calls
+        if not isinstance(arg, ast.Call):
+            raise _Unresolved(call)
+        if _dotted(arg.func, bindings) != _ADD_ARGUMENT:
+            raise _Unresolved(call)
+    name = default
+    for keyword in call.keywords:
+        if keyword.arg == "name":
+            if not isinstance(keyword.value, ast.Constant):
+                raise _Unresolved(call)
+            name = keyword.value.value
+        elif keyword.arg is None:
+            raise _Unresolved(call)
+    if name is None:
+        name = default
+    return name
+
+
+def _is_register(node):
+    if not isinstance(node, ast.Call):
+        return False
+    return isinstance(node.func, ast.Attribute) and node.func.attr == "register"
+
+
+def _decorated(tree, module_name, bindings):
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        wrapped = False
+        for decorator in node.decorator_list:
+            if _is_register(decorator):
+                if wrapped:
+                    # The registered object is not the module attribute
+                    raise _Unresolved(decorator)
+                reference = _dotted(decorator.func.value, bindings)
+                holder, _, attribute = reference.rpartition(".")
+                if holder == "":
+                    raise _Unresolved(decorator)
+                yield decorator, _index.Location(
+                    collector=(f"{holder}:{attribute}",),
+                    name=_registered_name(decorator, node.name, bindings),
+                    module=module_name,
+                    attribute=node.name,
+                )
+                continue
+            target = decorator.func if isinstance(decorator, ast.Call) else decorator
+            if _dotted(target, bindings) not in _HARMLESS:
+                raise _Unresolved(decorator)
+            wrapped = True
+
+
+def analyze(module_name: str, path: str, source: bytes) -> List[_index.Location]:
+    """
+    Find the registrations in a module's source.
+
+    Args:
+        module_name: the module's name
+        path: the module's file
+        source: the module's source
+
+    Returns:
+        The locations of the registrations
+
+    Raises:
+        ValueError: if the module cannot be understood statically
+    """
+    try:
+        tree = ast.parse(source, filename=path)
+        bindings = _bindings(tree, module_name, _package(module_name, path))
+        found = list(_decorated(tree, module_name, bindings))
+    except (SyntaxError, _Unresolved) as exc:
+        raise ValueError("cannot analyze", module_name) from exc
+    understood = {id(decorator) for decorator, _location in found}
+    for node in ast.walk(tree):
+        if _is_register(node) and id(node) not in understood:
+            raise ValueError("cannot analyze", module_name)
+    return [location for _decorator, location in found]
+
+
+def discover(
+    roots: Iterable[str],
+    module_files: Callable[[str], Iterable[Tuple[str, str]]] = _index.module_files,
+) -> Tuple[Sequence[_index.Location], Sequence[str]]:
+    """
+    Find registrations under packages without importing them.
+
+    Args:
+        roots: names of packages (or modules)
+        module_files: finds the modules under a root,
+                      and their files
+                      (by default, all of them)
+
+    Returns:
+        The locations found,
+        and the names of the modules that could not be analyzed.
+    """
+    locations = []
+    unresolved = []
+    for root in roots:
+        for module_name, path in module_files(root):
+            try:
+                if not path.endswith(".py"):
+                    raise ValueError("not a source file", path)
+                with open(path, "rb") as fpin:
+                    source = fpin.read()
+                locations.extend(analyze(module_name, path, source))
+            except (OSError, ValueError):
+                unresolved.append(module_name)
+    return locations, unresolved
@@ -0,0 +1,239 @@
+"""Tracing of collection and dispatch
+
+While tracing,
+the phases of collecting and dispatching
+(looking up the entry points,
+importing and scanning each module,
+transforming each registration,
+building the parser,
+running the command)
+are recorded as spans.
+
+The trace is saved in the Chrome trace event format,
+which :code:`chrome://tracing` and Perfetto can load.
+A :code:`summary` key adds the total time per phase,
+and the time and number of imports per module
+and per distribution.
+
+With :code:`memory=True`,
+the memory allocated while importing each module
+is measured with :code:`tracemalloc`.
+"""
+
+from __future__ import annotations
+import collections
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import attrs
+
+from . import _index
+
+ENVIRONMENT_VARIABLE = "GATHER_TRACE"
+
+BUDGET_ENVIRONMENT_VARIABLE = "GATHER_IMPORT_BUDGET"
+
+_NOT_TRACING: contextlib.nullcontext[Dict[str, Any]] = contextlib.nullcontext({})
+
+
+@attrs.define
+class Tracer:
+    """Record spans as Chrome trace events"""
+
+    events: List[Dict[str, Any]] = attrs.field(factory=list)
+    memory: bool = False
+    distribution_of: Optional[Callable[[str], Optional[str]]] = None
+    _start: float = attrs.field(factory=time.perf_counter, init=False)
+
+    @contextlib.contextmanager
+    def span(self, category: str, name: str, **args: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Record a span.
+
+        The number of modules imported during the span
+        is recorded as the :code:`imports` argument.
+        When measuring memory,
+        the memory allocated during the span
+        is recorded as the :code:`allocated` argument.
+
+        Args:
+            category: the phase
+            name: what the span is about
+            args: recorded with the span
+
+        Returns:
+            A context manager yielding the span's arguments,
+            which can be updated before it ends
+        """
+        modules = len(sys.modules)
+        allocated = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            args["imports"] = len(sys.modules) - modules
+            if self.memory:
+                args["allocated"] = tracemalloc.get_traced_memory()[0] - allocated
+            self.events.append(
+                dict(
+                    name=name,
+                    cat=category,
+                    ph="X",
+                    ts=(start - self._start) * 1e6,
+                    dur=(end - start) * 1e6,
+                    pid=os.getpid(),
+                    tid=threading.get_ident(),
+                    args=args,
+                )
+            )
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the spans.
+
+        Returns:
+            The count and total seconds of each phase
+            (spans of a phase can include other phases),
+            and, for each module,
+            the seconds spent importing and scanning it,
+            the number of modules its import imported,
+            the memory its import allocated (when measured),
+            and the number of registrations transformed.
+            The import costs are also totalled by distribution,
+            when :code:`distribution_of` is set.
+        """
+        phases: Dict[str, Dict[str, Any]] = collections.defaultdict(
+            lambda: dict(count=0, seconds=0.0)
+        )
+        modules: Dict[str, Dict[str, Any]] = collections.defaultdict(
+            lambda: dict(
+                import_seconds=0.0,
+                imports=0,
+                allocated=0,
+                scan_seconds=0.0,
+                registrations=0,
+            )
+        )
+        for event in self.events:
+            seconds = event["dur"] / 1e6
+            phase = phases[event["cat"]]
+            phase["count"] += 1
+            phase["seconds"] += seconds
+            module_name = event["args"].get("module")
+            if module_name is None:
+                continue
+            module = modules[module_name]
+            if event["cat"] == "import":
+                module["import_seconds"] += seconds
+                module["imports"] += event["args"]["imports"]
+                module["allocated"] += event["args"].get("allocated", 0)
+            elif event["cat"] == "scan":
+                module["scan_seconds"] += seconds
+            elif event["cat"] == "transform":
+                module["registrations"] += 1
+        distributions: Dict[str, Dict[str, Any]] = collections.defaultdict(
+            lambda: dict(import_seconds=0.0, imports=0, allocated=0, modules=0)
+        )
+        distribution_of = self.distribution_of or (lambda _module_name: None)
+        for module_name, module in modules.items():
+            distribution_name = distribution_of(module_name)
+            if distribution_name is None:
+                continue
+            distribution = distributions[distribution_name]
+            for key in ["import_seconds", "imports", "allocated"]:
+                distribution[key] += module[key]
+            distribution["modules"] += 1
+        return dict(
+            phases=dict(phases),
+            modules=dict(modules),
+            distributions=dict(distributions),
+        )
+
+    def save(self, path: os.PathLike | str) -> None:
+        """
+        Atomically write the trace.
+
+        Args:
+            path: trace file
+        """
+        content = dict(
+            traceEvents=self.events,
+            displayTimeUnit="ms",
+            summary=self.summary(),
+        )
+        _index.write_atomically(
+            path, content, functools.partial(json.dump, default=repr)
+        )
+
+
+_ACTIVE: Optional[Tracer] = None
+
+
+def span(category: str, name: str, **args: Any):
+    """
+    Record a span, if tracing.
+
+    Args:
+        category: the phase
+        name: what the span is about
+        args: recorded with the span
+
+    Returns:
+        A context manager yielding the span's arguments
+    """
+    if _ACTIVE is None:
+        return _NOT_TRACING
+    return _ACTIVE.span(category, name, **args)
+
+
+@contextlib.contextmanager
+def tracing(
+    path: Optional[os.PathLike | str],
+    *,
+    memory: bool = False,
+    distribution_of: Optional[Callable[[str], Optional[str]]] = None,
+    always: bool = False,
+) -> Iterator[Optional[Tracer]]:
+    """
+    Trace collection and dispatch.
+
+    The trace is saved when the block exits,
+    even if it raises an exception.
+
+    Args:
+        path: where to save the trace.
+              If :code:`None`,
+              the trace is not saved.
+        memory: whether to measure allocated memory
+        distribution_of: maps module names to distribution names
+        always: trace even if the trace is not saved
+
+    Returns:
+        A context manager yielding the tracer
+        (or :code:`None`, if not tracing)
+    """
+    global _ACTIVE  # pylint: disable=global-statement
+    if path is None and not always:
+        yield None
+        return
+    start_memory = memory and not tracemalloc.is_tracing()
+    if start_memory:
+        tracemalloc.start()
+    previous, _ACTIVE = _ACTIVE, Tracer(memory=memory, distribution_of=distribution_of)
+    tracer = _ACTIVE
+    try:
+        yield tracer
+    finally:
+        _ACTIVE = previous
+        if start_memory:
+            tracemalloc.stop()
+        if path is not None:
+            tracer.save(path)
@@ -0,0 +1,99 @@
+"""Waiting for files to change
+
+On Linux,
+the directories are watched with inotify,
+so waiting returns as soon as something changes in them.
+Elsewhere,
+waiting sleeps for the whole timeout.
+"""
+
+from __future__ import annotations
+import ctypes
+import functools
+import operator
+import os
+import select
+import time
+from typing import Iterable, Optional
+
+# From <sys/inotify.h>
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_MASK = functools.reduce(
+    operator.or_,
+    [
+        _IN_MODIFY,
+        _IN_ATTRIB,
+        _IN_CLOSE_WRITE,
+        _IN_MOVED_FROM,
+        _IN_MOVED_TO,
+        _IN_CREATE,
+        _IN_DELETE,
+    ],
+)
+
+
+def _libc():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1  # pylint: disable=pointless-statement
+    except (OSError, AttributeError):  # pragma: no cover
+        return None
+    return libc
+
+
+def inotify_available() -> bool:
+    """Whether waiting can use inotify"""
+    return _libc() is not None
+
+
+def wait(directories: Iterable[str], timeout: float, *, inotify: bool = True) -> bool:
+    """
+    Wait until something changes in the directories.
+
+    Args:
+        directories: the directories to watch
+        timeout: the longest to wait, in seconds
+        inotify: whether to use inotify, when available
+
+    Returns:
+        Whether a change was seen
+        (:code:`False` when timing out, or when not using inotify)
+    """
+    libc = _libc() if inotify else None
+    fd = None if libc is None else libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    if fd is None or fd < 0:
+        time.sleep(timeout)
+        return False
+    try:
+        for directory in directories:
+            # Directories that cannot be watched are still polled by the caller
+            libc.inotify_add_watch(fd, os.fsencode(directory), _MASK)
+        ready, _, _ = select.select([fd], [], [], timeout)
+        return len(ready) != 0
+    finally:
+        os.close(fd)
+
+
+def watched_directories(paths: Iterable[str], extra: Optional[Iterable[str]] = None):
+    """
+    Find the directories to watch for the given files.
+
+    Args:
+        paths: the files
+        extra: more directories (for example, :code:`sys.path`)
+
+    Returns:
+        A sorted list of existing directories
+    """
+    directories = {os.path.dirname(path) for path in paths}
+    directories.update(extra or [])
+    return sorted(directory for directory in directories if os.path.isdir(directory))
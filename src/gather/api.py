@@ -25,18 +25,800 @@ i.e., what users are expected to :code:`import` at the top-level.
 Note that while having special facilities to run functions as subcommands,
 Gather can be used to collect anything.
 """
+import bisect
 import collections
-import importlib.metadata
+import collections.abc
+import concurrent.futures
+import contextlib
+import fnmatch
+import functools
+import importlib.machinery
+import itertools
+import json
+import operator
+import os
+import pickle
+import pkgutil
+import re
 import sys
+import types
+import warnings
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
 import attr
-import venusian
+from . import (
+    _entry_points as entry_points_lib,
+    _index,
+    _precompiled,
+    _static,
+    _trace,
+)
 
+_ENTRY_POINTS = entry_points_lib.Cache()
 
-def _get_modules():
-    for entry_point in importlib.metadata.entry_points(group="gather"):
-        module = importlib.import_module(entry_point.value)
+
+def _entry_points():
+    with _trace.span("entry_points", "entry_points"):
+        return _ENTRY_POINTS.get()
+
+
+def configure_entry_points(*, max_age=0):
+    """
+    Configure how often the entry points are looked up again.
+
+    Looking up the :code:`gather` entry points reads the metadata
+    of every installed distribution.
+    The result is kept,
+    and looked up again only when a :code:`sys.path` directory changes.
+
+    Args:
+        max_age (float): How long, in seconds, to keep using the entry points
+                         without checking the :code:`sys.path` directories.
+                         :code:`0` (the default) checks every time.
+                         :code:`None` never checks
+                         (until :code:`invalidate_cache` is called).
+    """
+    _ENTRY_POINTS.max_age = max_age
+
+
+def save_entry_points(path):
+    """
+    Save the current entry points, to use instead of looking them up.
+
+    This is meant to be called when building an environment
+    (for example, a container image).
+    At runtime, setting the :code:`GATHER_ENTRY_POINTS` environment
+    variable to the path uses the saved entry points,
+    as long as the :code:`sys.path` directories did not change.
+
+    Args:
+        path: where to save the entry points
+    """
+    entry_points_lib.save(path)
+
+
+def build_registry(path):
+    """
+    Save every registration, for every collector, to use instead of scanning.
+
+    This is meant to be called when building an environment
+    (for example, a container image),
+    after installing every plugin.
+    At runtime, setting the :code:`GATHER_REGISTRY` environment
+    variable to the path makes collecting load the registry,
+    as long as the distributions and the modules' files did not change.
+
+    Registered values are pickled:
+    functions and classes as references,
+    and transforms' extra data by value.
+    Modules whose values cannot be pickled are still scanned.
+
+    Args:
+        path: where to save the registry
+    """
+    current = fingerprint()
+    scan = _scan_roots(_all_roots(), prune=_Prune.create())
+    entries = [
+        _precompiled.Entry(location=location, pickled=_precompiled.dumps(value))
+        for location, (*_found, value) in zip(scan.locations(), scan.found)
+    ]
+    _precompiled.save(path, current, entries)
+
+
+def fingerprint():
+    """
+    Fingerprint the installed plugins.
+
+    Only :code:`stat` is called on the plugins' files:
+    no module is imported.
+
+    Returns:
+        A string that changes whenever a distribution
+        with a :code:`gather` entry point,
+        or one of its modules' files,
+        changes.
+        Caches of what was collected can be keyed by it.
+    """
+    return _index.fingerprint(_entry_points())
+
+
+def _load_registry():
+    path = os.environ.get(_precompiled.ENVIRONMENT_VARIABLE)
+    if path is None:
+        return None
+    with _trace.span("precompiled", path):
+        return _precompiled.load(path, fingerprint())
+
+
+def _all_roots():
+    return [entry_point.value for entry_point in _entry_points()]
+
+
+def _import(module_name):
+    with _trace.span("import", module_name, module=module_name):
+        return importlib.import_module(module_name)
+
+
+def _get_modules(roots):
+    for root in roots:
+        module = _import(root)
+        yield module
+
+
+def _ignore_import_error(_unused):
+    """
+    Ignore ImportError during collection.
+
+    Some modules raise import errors for various reasons,
+    and should be just treated as missing.
+    """
+    if not issubclass(sys.exc_info()[0], ImportError):
+        raise  # pragma: no cover
+
+
+def _walk_modules(roots, prune=None):
+    """Import, and yield, every module under the given roots"""
+    for root in roots:
+        if prune is not None and prune.restricts(root):
+            yield from _walk_files(root, prune)
+        else:
+            yield from _walk_package(root)
+
+
+def _walk_files(root, prune):
+    """Import, and yield, the modules under the root that are not pruned"""
+    for module_name, _path in prune.module_files(root):
+        if module_name == root:
+            yield _import(root)
+            continue
+        try:
+            submodule = _import(module_name)
+        except Exception:  # pylint: disable=broad-except
+            _ignore_import_error(module_name)
+        else:
+            yield submodule
+
+
+def _walk_package(root):
+    for module in _get_modules([root]):
         yield module
+        path = getattr(module, "__path__", [])
+        for info in pkgutil.walk_packages(
+            path, module.__name__ + ".", onerror=_ignore_import_error
+        ):
+            try:
+                submodule = _import(info.name)
+            except Exception:  # pylint: disable=broad-except
+                _ignore_import_error(info.name)
+            else:
+                yield submodule
+
+
+def _compile(module_file):
+    """
+    Read, and compile, a module's source, writing the bytecode cache.
+
+    Errors are ignored here:
+    they are reported when the module is imported.
+    """
+    module_name, path = module_file
+    if not path.endswith(tuple(importlib.machinery.SOURCE_SUFFIXES)):
+        return
+    try:
+        importlib.machinery.SourceFileLoader(module_name, path).get_code(module_name)
+    except Exception:  # pylint: disable=broad-except
+        pass
+
+
+def _prefetch(workers, roots, module_names=None, prune=None):
+    """
+    Compile the modules under the roots concurrently.
+
+    This warms the bytecode and file system caches,
+    so that importing the modules (serially) waits less.
+
+    Args:
+        workers: number of threads
+        roots: the names of the packages to prefetch
+        module_names: if given, only prefetch these modules
+        prune: if given, the modules that are not scanned
+    """
+    module_files = [
+        (module_name, path)
+        for root in roots
+        for module_name, path in _module_files(root, prune)
+        if module_names is None or module_name in module_names
+    ]
+    with _trace.span("prefetch", "prefetch", workers=workers):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ignored in executor.map(_compile, module_files):
+                pass
+
+
+def _members_only(module):
+    """
+    Return a module with the same members, but without submodules.
+
+    Scanning it will not recurse into the subpackages.
+    """
+    if not hasattr(module, "__path__"):
+        return module
+    view = types.ModuleType(module.__name__)
+    vars(view).update(vars(module))
+    del view.__path__
+    return view
+
+
+_EVERY_COLLECTOR = object()
+
+
+def _as_collector(value):
+    if isinstance(value, Collector):
+        return value
+    if hasattr(type(value), "collector"):
+        value = getattr(value, "collector", None)
+    return value if isinstance(value, Collector) else None
+
+
+def _resolve(key):
+    """
+    Find the collector a :code:`module:attribute` key refers to.
+
+    Modules that have not been imported are not imported:
+    a collector that exists must already have had its module imported.
+    """
+    module_name, attribute = key.split(":", 1)
+    module = sys.modules.get(module_name)
+    return _as_collector(getattr(module, attribute, None))
+
+
+def _collector_keys(modules):
+    """
+    Find :code:`module:attribute` references to every collector.
+
+    The given modules are searched first,
+    and then every other imported module.
+    """
+    by_name = {module.__name__: module for module in modules}
+    for module_name, module in list(sys.modules.items()):
+        by_name.setdefault(module_name, module)
+    keys = collections.defaultdict(list)
+    for module in by_name.values():
+        for attribute, value in list(vars(module).items()):
+            collector = _as_collector(value)
+            if collector is not None:
+                keys[id(collector)].append(f"{module.__name__}:{attribute}")
+    return keys
+
+
+@attr.s(frozen=True)
+class _Scan(object):
+
+    """The registrations found by scanning modules for every collector"""
+
+    modules = attr.ib()
+
+    found = attr.ib()
+
+    def locations(self):
+        """Return where the registrations were made"""
+        keys = _collector_keys(self.modules)
+        return [
+            _index.Location(
+                collector=tuple(keys.get(id(collector), ())),
+                name=name,
+                module=module_name,
+                attribute=attribute,
+            )
+            for collector, name, module_name, attribute, _value in self.found
+        ]
+
+
+def _venusian():
+    """Import venusian, only when a module has to be scanned"""
+    return importlib.import_module("venusian")
+
+
+@attr.s
+class _Scanner(object):
+
+    """What registration callbacks get, scanning with venusian when needed"""
+
+    tag = attr.ib()
+
+    registry = attr.ib(default=None)
+
+    found = attr.ib(default=None)
+
+    found_in = attr.ib(default=None)
+
+    def scan(self, module):
+        """Scan a module with venusian"""
+        _venusian().Scanner(**attr.asdict(self, recurse=False)).scan(module)
+
+
+_TABLE = "__gather_registrations__"
+
+
+@attr.s
+class _Table(object):
+
+    """
+    The registrations made in a module, recorded when decorating.
+
+    Reading the table is cheaper than having venusian
+    inspect every attribute of the module.
+    Registrations made outside of the module's top level
+    (for example, in a class body)
+    are attached with venusian,
+    and make the table incomplete:
+    the module is also scanned by venusian.
+    """
+
+    records: List[Tuple[Callable[..., None], Any]] = attr.ib(factory=list)
+
+    complete = attr.ib(default=True)
+
+    @classmethod
+    def of(cls, module_globals):
+        """Return the table of a module, from its globals"""
+        table = module_globals.get(_TABLE)
+        if not isinstance(table, cls):
+            table = module_globals[_TABLE] = cls()
+        return table
+
+    def record(self, callback, objct):
+        """Record a registration"""
+        self.records.append((callback, objct))
+
+    def callbacks(self, module, attributes=None):
+        """
+        Find the callbacks of the registrations.
+
+        Like venusian,
+        each callback is called for every attribute of the module
+        that is the registered object:
+        objects that are no longer in the module
+        (for example, after reloading it)
+        are skipped.
+
+        Args:
+            module: the module the table is in
+            attributes: if given, only these attributes
+
+        Returns:
+            A list of :code:`(callback, attribute, object)`
+        """
+        registered = {id(objct) for _callback, objct in self.records}
+        names = collections.defaultdict(list)
+        for attribute, value in vars(module).items():
+            if attributes is not None and attribute not in attributes:
+                continue
+            if id(value) in registered:
+                names[id(value)].append(attribute)
+        return [
+            (callback, attribute, objct)
+            for callback, objct in self.records
+            for attribute in names[id(objct)]
+        ]
+
+
+def _callbacks(module, attributes=None):
+    table = vars(module).get(_TABLE)
+    if not isinstance(table, _Table):
+        # Nothing was registered in the module
+        return []
+    return table.callbacks(module, attributes)
+
+
+def _complete(module):
+    """Whether the module's table has all of its registrations"""
+    table = vars(module).get(_TABLE)
+    return not isinstance(table, _Table) or table.complete
+
+
+def _scan_module(scanner, module):
+    with _trace.span("scan", module.__name__, module=module.__name__):
+        if not _complete(module):
+            scanner.scan(_members_only(module))
+        for callback, attribute, objct in _callbacks(module):
+            callback(scanner, attribute, objct)
+
+
+def _scan(modules):
+    """Scan modules for every collector"""
+    scanner = _Scanner(tag=_EVERY_COLLECTOR, found=[])
+    modules = list(modules)
+    for module in modules:
+        scanner.found_in = module.__name__
+        _scan_module(scanner, module)
+    return _Scan(modules=modules, found=scanner.found)
+
+
+_CACHE = {}
+
+
+def _scan_roots(roots, workers=None, prune=None):
+    """Scan every module under the roots, once per process"""
+    key = (tuple(roots), prune)
+    if key not in _CACHE:
+        if workers is not None:
+            _prefetch(workers, roots, prune=prune)
+        _CACHE[key] = _scan(_walk_modules(roots, prune))
+    return _CACHE[key]
+
+
+def _matches(module_name, patterns):
+    """Whether the module, or a package it is in, matches one of the patterns"""
+    parts = module_name.split(".")
+    return any(
+        fnmatch.fnmatchcase(".".join(parts[:length]), pattern)
+        for length in range(1, len(parts) + 1)
+        for pattern in patterns
+    )
+
+
+def _accepted(module_name, include, exclude):
+    if _matches(module_name, exclude):
+        return False
+    return len(include) == 0 or _matches(module_name, include)
+
+
+def _packages_of(locations):
+    """The packages that the modules of the locations are in"""
+    ret = set()
+    for location in locations:
+        parts = location.module.split(".")
+        ret.update(".".join(parts[:length]) for length in range(1, len(parts) + 1))
+    return frozenset(ret)
+
+
+def _strings(values: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(values)
+
+
+@attr.s(frozen=True)
+class _Prune(object):
+
+    """
+    Which modules under the roots are not scanned.
+
+    ``metadata`` holds the patterns that distributions declare,
+    as ``(entry point value, include, exclude)``.
+    ``known``, if not :code:`None`,
+    holds the packages a recorded index found registrations in,
+    and ``seen`` the packages it found under the entry points:
+    other subpackages that it had seen are not descended into.
+    """
+
+    include: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+
+    exclude: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+
+    metadata = attr.ib(default=(), converter=tuple)
+
+    known = attr.ib(default=None)
+
+    seen: FrozenSet[str] = attr.ib(default=frozenset())
+
+    @classmethod
+    def create(cls, include=(), exclude=(), known=None, seen=frozenset()):
+        """
+        Prune with the given patterns, and the distributions' patterns.
+
+        Returns:
+            A :code:`_Prune`,
+            or :code:`None` if nothing is pruned
+        """
+        metadata = tuple(
+            (
+                entry_point.value,
+                tuple(getattr(entry_point, "include", ())),
+                tuple(getattr(entry_point, "exclude", ())),
+            )
+            for entry_point in _entry_points()
+        )
+        metadata = tuple(patterns for patterns in metadata if any(patterns[1:]))
+        if not any([include, exclude, metadata, known is not None]):
+            return None
+        return cls(
+            include=include,
+            exclude=exclude,
+            metadata=metadata,
+            known=known,
+            seen=seen,
+        )
+
+    def _patterns(self, root):
+        return [(self.include, self.exclude)] + [
+            (include, exclude)
+            for value, include, exclude in self.metadata
+            if _within(root, value) or _within(value, root)
+        ]
+
+    def restricts(self, root):
+        """Whether any module under the root might not be scanned"""
+        return self.known is not None or any(
+            any(patterns) for patterns in self._patterns(root)
+        )
+
+    def accepts(self, root, module_name, path):
+        """Whether a module under the root is scanned"""
+        if not all(
+            _accepted(module_name, include, exclude)
+            for include, exclude in self._patterns(root)
+        ):
+            return False
+        if self.known is None or module_name == root:
+            return True
+        if os.path.basename(path).startswith("__init__."):
+            package = module_name
+        else:
+            package = module_name.rpartition(".")[0]
+        return package == root or package in self.known or package not in self.seen
+
+    def module_files(self, root):
+        """Find the modules under the root that are scanned, and their files"""
+        seen = set()
+        for module_name, path in _index.module_files(root):
+            if module_name not in seen and self.accepts(root, module_name, path):
+                seen.add(module_name)
+                yield module_name, path
+
+
+def _module_files(root, prune):
+    if prune is None:
+        return _index.module_files(root)
+    return prune.module_files(root)
+
+
+def _within(module_name, package):
+    return module_name == package or module_name.startswith(package + ".")
+
+
+def _canonical(distribution_name):
+    return re.sub(r"[-_.]+", "-", distribution_name or "").lower()
+
+
+@attr.s(frozen=True)
+class Only(object):
+
+    """
+    Restrict the entry points a collector scans.
+
+    An entry point is scanned if it matches any of the criteria.
+    """
+
+    distributions: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+    """Names of distributions whose entry points are scanned"""
+
+    entry_points: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+    """Names of entry points that are scanned"""
+
+    packages: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+    """
+    Names of packages that are scanned.
+
+    Entry points inside one of the packages are scanned.
+    If the package is inside an entry point,
+    only the package is scanned.
+    """
+
+    def roots(self, entry_points):
+        """
+        Find the packages to scan.
+
+        Args:
+            entry_points: :code:`gather` entry points
+
+        Returns:
+            A list of package (or module) names
+        """
+        distributions = {_canonical(name) for name in self.distributions}
+        ret = []
+        for entry_point in entry_points:
+            dist_name = _canonical(getattr(entry_point.dist, "name", None))
+            if entry_point.name in self.entry_points or dist_name in distributions:
+                ret.append(entry_point.value)
+                continue
+            for package in self.packages:
+                if _within(entry_point.value, package):
+                    ret.append(entry_point.value)
+                elif _within(package, entry_point.value):
+                    ret.append(package)
+        return list(dict.fromkeys(ret))
+
+
+def _distribution_of(module_name):
+    """Find the distribution whose entry point a module is under"""
+    matching = [
+        entry_point
+        for entry_point in _entry_points()
+        if _within(module_name, entry_point.value)
+    ]
+    if len(matching) == 0:
+        return None
+    entry_point = max(matching, key=lambda entry_point: len(entry_point.value))
+    return getattr(entry_point.dist, "name", None) or entry_point.value
+
+
+class ImportBudgetExceeded(Exception):
+    """Importing a distribution's modules cost more than the budget"""
+
+
+class ImportBudgetWarning(UserWarning):
+    """Importing a distribution's modules cost more than the budget"""
+
+
+@attr.s(frozen=True)
+class ImportBudget(object):
+
+    """
+    Limits on the cost of importing each distribution's modules.
+
+    The cost of a distribution is the total cost
+    of importing its modules
+    (including what they import).
+    """
+
+    seconds = attr.ib(default=None)
+    """Wall time limit"""
+
+    allocated = attr.ib(default=None)
+    """Allocated memory limit, in bytes"""
+
+    action = attr.ib(default="warn", validator=attr.validators.in_(["warn", "fail"]))
+    """:code:`"warn"` to warn, or :code:`"fail"` to raise an exception"""
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parse a budget.
+
+        Args:
+            text: comma-separated :code:`key=value` pairs,
+                  for example :code:`seconds=0.5,allocated=50e6,action=fail`
+
+        Returns:
+            An :code:`ImportBudget`
+        """
+        converters = dict(seconds=float, allocated=lambda value: int(float(value)))
+        kwargs = {}
+        for part in text.split(","):
+            key, _, value = part.strip().partition("=")
+            if key not in ["seconds", "allocated", "action"]:
+                raise ValueError("unknown budget key", key)
+            kwargs[key] = converters.get(key, str)(value)
+        return cls(**kwargs)
+
+    def over(self, distributions):
+        """
+        Find the distributions over the budget.
+
+        Args:
+            distributions: the :code:`distributions` of a trace summary
+
+        Returns:
+            A list of :code:`(distribution, measure, cost, limit)` tuples
+        """
+        limits = dict(import_seconds=self.seconds, allocated=self.allocated)
+        return [
+            (name, measure, costs[measure], limit)
+            for name, costs in sorted(distributions.items())
+            for measure, limit in limits.items()
+            if limit is not None and costs[measure] > limit
+        ]
+
+    def check(self, distributions):
+        """
+        Warn, or fail, if distributions are over the budget.
+
+        Args:
+            distributions: the :code:`distributions` of a trace summary
+
+        Raises:
+            ImportBudgetExceeded: if any distribution is over the budget,
+                                  and the action is :code:`"fail"`
+        """
+        over = self.over(distributions)
+        if len(over) == 0:
+            return
+        if self.action == "fail":
+            raise ImportBudgetExceeded(over)
+        for name, measure, cost, limit in over:
+            warnings.warn(
+                f"importing {name} cost {measure}={cost} over budget {limit}",
+                ImportBudgetWarning,
+                stacklevel=2,
+            )
+
+
+@contextlib.contextmanager
+def tracing(path, *, memory=False, budget=None):
+    """
+    Trace collection and dispatch.
+
+    While in the block,
+    looking up the entry points,
+    importing and scanning each module,
+    transforming each registration,
+    collecting,
+    and building the parser and running the command
+    (see :code:`gather.commands`)
+    are timed.
+    When the block exits,
+    the trace is saved in the Chrome trace event format,
+    with an added :code:`summary` of the time per phase,
+    and the time and number of imports per module,
+    and per distribution.
+
+    .. code::
+
+        with gather.api.tracing("trace.json"):
+            THINGS.collect()
+
+    With a budget,
+    the distributions whose imports cost more
+    are reported when the block exits.
+
+    Args:
+        path: where to save the trace.
+              If :code:`None`,
+              the trace is not saved.
+        memory (bool): measure the memory allocated by imports,
+                       with :code:`tracemalloc`.
+        budget (ImportBudget): optional. The import budget of each distribution.
+
+    Returns:
+        A context manager yielding the tracer,
+        whose :code:`summary()` has the costs so far
+        (or :code:`None` if neither saving nor checking a budget)
+    """
+    with _trace.tracing(
+        path,
+        memory=memory,
+        distribution_of=_distribution_of,
+        always=budget is not None,
+    ) as tracer:
+        yield tracer
+    if budget is not None:
+        budget.check(tracer.summary()["distributions"])
+
+
+def invalidate_cache():
+    """
+    Forget the registrations collected so far.
+
+    Collecting scans the modules only once per process,
+    for all collectors.
+    Call this after installing,
+    or removing,
+    plugins at runtime:
+    the next collection will scan again.
+    """
+    _CACHE.clear()
+    _ENTRY_POINTS.clear()
+    importlib.invalidate_caches()
 
 
 @attr.s(frozen=True)
@@ -47,12 +829,51 @@ class Collector(object):
 
     A collector allows to *register* functions or classes by modules,
     and *collect*-ing them when they need to be used.
+
+    With :code:`only`
+    (an :code:`Only` instance),
+    only the matching entry points are imported and scanned.
+
+    With :code:`discovery="static"`,
+    registrations are found by parsing the modules' source.
+    Only the modules that register something for the collector,
+    or that cannot be understood statically,
+    are imported.
+
+    With :code:`include` and :code:`exclude`
+    (module name patterns, as in :code:`fnmatch`),
+    only the modules that match an :code:`include` pattern
+    (if there are any)
+    and no :code:`exclude` pattern
+    are imported and scanned.
+    A pattern matching a package matches every module in it:
+    :code:`exclude=["*.tests"]` skips every :code:`tests` package.
+    Distributions can declare patterns too,
+    as :code:`gather.include` and :code:`gather.exclude` entry points.
+
+    With :code:`descend="indexed"`,
+    rebuilding a stale index
+    (see :code:`collect`)
+    only descends into the subpackages
+    that the previous index found registrations in.
     """
 
     name = attr.ib(default=None)
 
     depth = attr.ib(default=1)
 
+    discovery = attr.ib(
+        default="venusian", validator=attr.validators.in_(["venusian", "static"])
+    )
+
+    only = attr.ib(default=None)
+
+    include: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+
+    exclude: Tuple[str, ...] = attr.ib(default=(), converter=_strings)
+
+    descend = attr.ib(default="all", validator=attr.validators.in_(["all", "indexed"]))
+
     def register(self, name=None, transform=lambda x: x):
         """
         Register a class or function
@@ -87,45 +908,564 @@ class Collector(object):
             """
             )
             tag = getattr(scanner, "tag", None)
-            if tag is not self:
-                return
             if name is None:
                 effective_name = inner_name
             else:
                 effective_name = name
-            objct = transform(objct)
-            scanner.registry[effective_name].add(objct)
+            if tag is not _EVERY_COLLECTOR and tag is not self:
+                return
+            with _trace.span(
+                "transform",
+                effective_name,
+                module=getattr(objct, "__module__", None),
+            ):
+                value = transform(objct)
+            if tag is _EVERY_COLLECTOR:
+                scanner.found.append(
+                    (self, effective_name, scanner.found_in, inner_name, value)
+                )
+                return
+            scanner.registry[effective_name].add(value)
 
         def attach(func):
             """Attach callback to be called when object is scanned"""
-            venusian.attach(func, callback, depth=self.depth)
+            frame = sys._getframe(self.depth)  # pylint: disable=protected-access
+            table = _Table.of(frame.f_globals)
+            if frame.f_locals is frame.f_globals:
+                table.record(callback, func)
+            else:
+                table.complete = False
+                _venusian().attach(func, callback, depth=self.depth)
             return func
 
         return attach
 
-    def collect(self):
+    def collect(self, *, index=None, lazy=False, workers=None, compact=False):
         """
         Collect all registered functions or classes.
 
+        Args:
+            index: optional. Path to an on-disk registration index.
+                   When given, only modules that the index records
+                   as registering for this collector are imported.
+                   The index is (re)built if it is missing or stale.
+            lazy (bool): optional. Requires an index, static discovery,
+                         or a precompiled registry.
+                         Values are :code:`LazyRegistration` proxies:
+                         their modules are only imported when they are used.
+            workers (int): optional. When given,
+                           the module files are read and compiled
+                           on a pool of that many threads
+                           before being imported, one by one.
+                           The result is the same.
+            compact (bool): optional. Return an immutable :code:`Registry`
+                            instead of a dictionary of sets.
+
+        Without an index or static discovery,
+        the modules are scanned only once per process,
+        for all collectors
+        (see :code:`invalidate_cache`).
+
+        When the :code:`GATHER_REGISTRY` environment variable
+        names an up-to-date precompiled registry
+        (see :code:`build_registry`),
+        it is used instead of scanning.
+
         Returns a dictionary mapping names to registered elements.
         """
+        with _trace.span("collect", repr(self.name), lazy=lazy):
+            pairs = self._collect(index=index, lazy=lazy, workers=workers)
+            if compact:
+                return Registry.from_pairs(pairs)
+            registry = collections.defaultdict(set)
+            for name, value in pairs:
+                registry[name].add(value)
+            return registry
 
-        def ignore_import_error(_unused):
-            """
-            Ignore ImportError during collection.
+    def _collect(self, *, index, lazy, workers):
+        """Find the :code:`(name, value)` registrations"""
+        entries = _load_registry()
+        if entries is None and index is None and self.discovery == "venusian":
+            if lazy:
+                raise ValueError("lazy collection requires an index")
+            if self.descend == "indexed":
+                raise ValueError("indexed descent requires an index")
+            found = _scan_roots(self._roots(), workers, self._prune()).found
+            return [
+                (name, value)
+                for collector, name, *_location, value in found
+                if collector is self
+            ]
+        if entries is None:
+            located = [(location, None) for location in self._locate(index)]
+        else:
+            located = self._select(entries)
+        # Modules with registrations for unknown collectors are scanned,
+        # and so are modules whose values are neither lazy nor precompiled
+        module_names = {
+            location.module
+            for location, pickled in located
+            if len(location.collector) == 0 or (pickled is None and not lazy)
+        }
+        pairs = []
+        for location, pickled in located:
+            if location.module in module_names:
+                continue
+            if lazy:
+                value = LazyRegistration(
+                    collector=self,
+                    name=location.name,
+                    module=location.module,
+                    attribute=location.attribute,
+                    pickled=pickled,
+                )
+            else:
+                value = pickle.loads(pickled)
+            pairs.append((location.name, value))
+        if workers is not None:
+            _prefetch(workers, self._roots(), module_names, self._prune())
+        registry = collections.defaultdict(set)
+        scanner = _Scanner(registry=registry, tag=self)
+        for module in _import_all(sorted(module_names)):
+            _scan_module(scanner, module)
+        pairs.extend(
+            (name, value) for name, values in registry.items() for value in values
+        )
+        return pairs
 
-            Some modules raise import errors for various reasons,
-            and should be just treated as missing.
-            """
-            if not issubclass(sys.exc_info()[0], ImportError):
-                raise  # pragma: no cover
+    def incremental(self):
+        """
+        Collect, so that collecting again only rescans what changed.
+
+        This is meant for long-lived processes
+        (for example, a development server)
+        while plugins are being edited.
+
+        Returns:
+            An :code:`Incremental` collection,
+            already collected once.
+        """
+        ret = Incremental(collector=self)
+        ret.refresh()
+        return ret
+
+    def _roots(self):
+        if self.only is None:
+            return _all_roots()
+        return self.only.roots(_entry_points())
+
+    def _prune(self):
+        return _Prune.create(include=self.include, exclude=self.exclude)
+
+    def _discover(self, roots, prune):
+        if self.discovery == "static":
+            locations, unresolved = _static.discover(
+                roots, functools.partial(_module_files, prune=prune)
+            )
+            return [*locations, *_scan(_import_all(unresolved)).locations()]
+        return _scan_roots(roots, prune=prune).locations()
+
+    def _locate(self, index):
+        roots = self._roots()
+        if index is None:
+            locations = self._discover(roots, self._prune())
+        else:
+            # The index describes every entry point, for every collector,
+            # except for the modules that the collector's patterns skip
+            current = fingerprint()
+            if self.include or self.exclude:
+                current = json.dumps([current, self.include, self.exclude])
+            locations = _index.load(index, current)
+            if locations is None:
+                all_roots = _all_roots()
+                locations = self._discover(all_roots, self._index_prune(index))
+                _index.save(index, current, locations, _index.packages(all_roots))
+        return [
+            location
+            for location in locations
+            if any(_within(location.module, root) for root in roots)
+            if _accepted(location.module, self.include, self.exclude)
+            if self._is_at(location.collector)
+        ]
+
+    def _index_prune(self, index):
+        known = None
+        seen = frozenset()
+        if self.descend == "indexed":
+            recorded = _index.load(index, None)
+            if recorded is not None:
+                known = _packages_of(recorded)
+                seen = _index.load_packages(index)
+        return _Prune.create(
+            include=self.include, exclude=self.exclude, known=known, seen=seen
+        )
+
+    def _select(self, entries):
+        roots = self._roots()
+        return [
+            (entry.location, entry.pickled)
+            for entry in entries
+            if any(_within(entry.location.module, root) for root in roots)
+            if _accepted(entry.location.module, self.include, self.exclude)
+            if self._is_at(entry.location.collector)
+        ]
+
+    def _is_at(self, keys):
+        if len(keys) == 0:
+            return True
+        return any(_resolve(key) is self for key in keys)
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _name_set(names: Iterable[str]) -> FrozenSet[str]:
+    return frozenset(names)
+
+
+@attr.s(frozen=True)
+class Changes(object):
+
+    """The names whose registrations changed when collecting again"""
+
+    added: FrozenSet[str] = attr.ib(default=frozenset(), converter=_name_set)
+    """Names that were not registered before"""
+
+    removed: FrozenSet[str] = attr.ib(default=frozenset(), converter=_name_set)
+    """Names that are no longer registered"""
+
+    changed: FrozenSet[str] = attr.ib(default=frozenset(), converter=_name_set)
+    """Names whose registered values changed"""
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+@attr.s
+class Incremental(object):
+
+    """
+    A collection that can be refreshed.
 
+    The registrations are tracked by module.
+    Refreshing looks up the entry points again,
+    and only imports (or reloads) and scans the modules
+    whose source files changed,
+    or that appeared under the entry points.
+    Registrations of modules that disappeared are dropped.
+
+    Modules are found by their files,
+    so modules that cannot be found on disk are not collected.
+    """
+
+    collector = attr.ib()
+
+    _modules: Dict[str, Dict[str, Set[Any]]] = attr.ib(
+        factory=dict, init=False, repr=False
+    )
+
+    _files: Dict[str, Tuple[str, Optional[Tuple[int, int]]]] = attr.ib(
+        factory=dict, init=False, repr=False
+    )
+
+    def collected(self):
+        """
+        Return the registrations, as of the last refresh.
+
+        Returns:
+            A dictionary mapping names to sets of registered elements,
+            like :code:`Collector.collect`
+        """
         registry = collections.defaultdict(set)
-        scanner = venusian.Scanner(registry=registry, tag=self)
-        for module in _get_modules():
-            scanner.scan(module, onerror=ignore_import_error)
+        for registrations in self._modules.values():
+            for name, values in registrations.items():
+                registry[name].update(values)
         return registry
 
+    def refresh(self):
+        """
+        Rescan the modules that changed.
+
+        Returns:
+            The :code:`Changes` since the last refresh
+        """
+        importlib.invalidate_caches()
+        before = self.collected()
+        prune = self.collector._prune()
+        files = {
+            module_name: path
+            for root in self.collector._roots()
+            for module_name, path in _module_files(root, prune)
+        }
+        for module_name in set(self._modules) - set(files):
+            del self._modules[module_name]
+            del self._files[module_name]
+            sys.modules.pop(module_name, None)
+        for module_name, path in sorted(files.items()):
+            signature = _signature(path)
+            if self._files.get(module_name, (None, None)) == (path, signature):
+                continue
+            registrations = self._scan(module_name, reload=module_name in self._files)
+            if registrations is None:
+                continue
+            self._modules[module_name] = registrations
+            self._files[module_name] = (path, signature)
+        after = self.collected()
+        _CACHE.clear()
+        return Changes(
+            added=after.keys() - before.keys(),
+            removed=before.keys() - after.keys(),
+            changed=[
+                name
+                for name in after.keys() & before.keys()
+                if after[name] != before[name]
+            ],
+        )
+
+    def _scan(self, module_name, *, reload):
+        try:
+            module = _import(module_name)
+            if reload:
+                # Reloading runs the module again in the same globals:
+                # record its registrations in a new table
+                vars(module).pop(_TABLE, None)
+                with _trace.span("import", module_name, module=module_name):
+                    module = importlib.reload(module)
+        except Exception:  # pylint: disable=broad-except
+            # A half-edited module keeps its previous registrations,
+            # and is tried again when it changes
+            return None
+        registry = collections.defaultdict(set)
+        _scan_module(_Scanner(registry=registry, tag=self.collector), module)
+        return dict(registry)
+
+    def watch(self, *, interval=1.0, inotify=True):
+        """
+        Refresh whenever something changes.
+
+        On Linux,
+        the modules' directories and :code:`sys.path` are watched with inotify.
+        Otherwise
+        (or with :code:`inotify=False`),
+        the files are checked every :code:`interval` seconds.
+
+        Args:
+            interval (float): how often to check, in seconds
+            inotify (bool): whether to use inotify, when available
+
+        Returns:
+            An iterator of the :code:`Changes`,
+            yielding only when something changed
+        """
+        # The watching machinery (ctypes) is only imported when watching
+        from . import _watch  # pylint: disable=import-outside-toplevel
+
+        while True:
+            directories = _watch.watched_directories(
+                [path for path, _signature in self._files.values()], sys.path
+            )
+            _watch.wait(directories, interval, inotify=inotify)
+            changes = self.refresh()
+            if changes:
+                yield changes
+
+
+def _import_all(module_names):
+    for module_name in module_names:
+        try:
+            module = _import(module_name)
+        except ImportError:
+            continue
+        yield module
+
+
+@attr.s(frozen=True)
+class LazyRegistration(object):
+
+    """
+    A registered object whose module has not been imported yet.
+
+    The module is imported,
+    and the registration's transform applied,
+    on first use.
+    Public attributes and calls are forwarded to the registered object.
+
+    With a precompiled registry
+    (see :code:`build_registry`),
+    :code:`pickled` is the pickled object:
+    it is unpickled instead of scanning the module.
+    """
+
+    collector = attr.ib(eq=False, repr=False)
+
+    name = attr.ib()
+
+    module = attr.ib()
+
+    attribute = attr.ib()
+
+    pickled = attr.ib(default=None, eq=False, repr=False)
+
+    _resolved: Dict[str, Any] = attr.ib(factory=dict, init=False, eq=False, repr=False)
+
+    def resolve(self):
+        """
+        Import the module, and return the collected object.
+
+        Returns:
+            The registered object, after the registration's transform.
+        """
+        if "value" not in self._resolved and self.pickled is not None:
+            with _trace.span("import", self.module, module=self.module):
+                self._resolved["value"] = pickle.loads(self.pickled)
+        if "value" not in self._resolved:
+            module = _import(self.module)
+            registry = collections.defaultdict(set)
+            scanner = _Scanner(registry=registry, tag=self.collector)
+            if not _complete(module):
+                view = types.ModuleType(self.module)
+                setattr(view, self.attribute, getattr(module, self.attribute))
+                scanner.scan(view)
+            for callback, attribute, objct in _callbacks(module, {self.attribute}):
+                callback(scanner, attribute, objct)
+            [self._resolved["value"]] = registry[self.name]
+        return self._resolved["value"]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+
+def _position(names, name):
+    """Find a name in sorted names"""
+    try:
+        position = bisect.bisect_left(names, name)
+    except TypeError:
+        raise KeyError(name) from None
+    if position == len(names) or names[position] != name:
+        raise KeyError(name)
+    return position
+
+
+@attr.s(frozen=True, eq=False, repr=False)
+class Registry(collections.abc.Mapping):
+
+    """
+    An immutable mapping of names to registered elements.
+
+    The names are kept sorted in one tuple,
+    and the values of all names, in the same order, in another,
+    with the offset in it where each name's values start:
+    looking up a name is a binary search.
+
+    Looking up a name returns a :code:`frozenset` of its values,
+    so that a registry compares equal to
+    the dictionary of sets that :code:`Collector.collect`
+    returns by default.
+    """
+
+    _names: Tuple[str, ...] = attr.ib(converter=_strings)
+
+    _values: Tuple[Any, ...] = attr.ib()
+
+    _offsets: Tuple[int, ...] = attr.ib()
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """
+        Create a registry.
+
+        Args:
+            mapping: A mapping of names to iterables of values.
+                     Names without values are left out.
+
+        Returns:
+            A :code:`Registry`
+        """
+        return cls.from_pairs(
+            (name, value) for name, values in mapping.items() for value in values
+        )
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """
+        Create a registry.
+
+        Args:
+            pairs: An iterable of :code:`(name, value)` registrations.
+
+        Returns:
+            A :code:`Registry`
+        """
+        names = []
+        values = []
+        offsets = [0]
+        by_name = operator.itemgetter(0)
+        for name, group in itertools.groupby(sorted(pairs, key=by_name), by_name):
+            names.append(name)
+            values.extend(dict.fromkeys(value for _name, value in group))
+            offsets.append(len(values))
+        return cls(names=names, values=tuple(values), offsets=tuple(offsets))
+
+    def __getitem__(self, name):
+        position = _position(self._names, name)
+        return frozenset(
+            self._values[self._offsets[position] : self._offsets[position + 1]]
+        )
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f"Registry({dict(self)!r})"
+
+    def unique(self):
+        """
+        Map names to single values, without copying.
+
+        Raises a :code:`ValueError` if any name has more than one value.
+
+        Returns:
+            A read-only mapping of names to values
+        """
+        if len(self._values) != len(self._names):
+            raise ValueError("names with more than one value", self)
+        return _UniqueView(names=self._names, values=self._values)
+
+
+@attr.s(frozen=True, eq=False, repr=False)
+class _UniqueView(collections.abc.Mapping):
+
+    """The names of a :code:`Registry` with one value each"""
+
+    _names = attr.ib()
+
+    _values = attr.ib()
+
+    def __getitem__(self, name):
+        return self._values[_position(self._names, name)]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
 def unique(mapping):
     """
@@ -134,6 +1474,11 @@ def unique(mapping):
     Raises a :code:`ValueError` if any of the values is not an iterable
     with exactly one item.
 
+    The items themselves are not touched:
+    :code:`LazyRegistration` values stay lazy.
+    For a :code:`Registry`,
+    this is a read-only view that shares its storage.
+
     Args:
         mapping: A mapping of keys to Iterables of 1
 
@@ -141,9 +1486,12 @@ def unique(mapping):
         A mapping of keys to the single value
     """
     ret = {}
-    for key, value_set in mapping.items():
-        [value] = value_set
-        ret[key] = value
+    with _trace.span("unique", "unique", count=len(mapping)):
+        if isinstance(mapping, Registry):
+            return mapping.unique()
+        for key, value_set in mapping.items():
+            [value] = value_set
+            ret[key] = value
     return ret
 
 
@@ -178,4 +1526,22 @@ class Wrapper(object):
         return ret
 
 
-__all__ = ["Collector", "unique", "Wrapper"]
+__all__ = [
+    "build_registry",
+    "Changes",
+    "Collector",
+    "configure_entry_points",
+    "fingerprint",
+    "ImportBudget",
+    "ImportBudgetExceeded",
+    "ImportBudgetWarning",
+    "Incremental",
+    "invalidate_cache",
+    "LazyRegistration",
+    "Only",
+    "Registry",
+    "save_entry_points",
+    "tracing",
+    "unique",
+    "Wrapper",
+]
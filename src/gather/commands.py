@@ -2,14 +2,17 @@
 
 from __future__ import annotations
 import argparse
+import functools
 import os
-import subprocess
+import shlex
 import sys
-from typing import Sequence, Any, Tuple
+import traceback
+import types
+from typing import Any, Sequence, Tuple
 
 import attrs
-from commander_data.run import Runner
 
+from . import _trace
 from .api import Wrapper, unique
 
 
@@ -54,6 +57,90 @@ def make_command_register(collector):
     return _register
 
 
+@attrs.frozen
+class _Deferred:
+    populate: Any
+    kwargs: Any
+
+
+class _LazyParserMap(dict):
+    """
+    Map sub-command names to sub-parsers.
+
+    Deferred sub-parsers are created on first access to their value:
+    checking for a name, or listing the names, does not create them.
+    """
+
+    def __init__(self, action):
+        super().__init__()
+        self._action = action
+
+    def __getitem__(self, name):
+        value = super().__getitem__(name)
+        if isinstance(value, _Deferred):
+            value = self._action.create_parser(name, value)
+            super().__setitem__(name, value)
+        return value
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def values(self):
+        return [self[name] for name in self]
+
+    def items(self):
+        return [(name, self[name]) for name in self]
+
+
+class _LazySubParsersAction(argparse._SubParsersAction):
+    """
+    Sub-parsers action that defers creating sub-parsers.
+
+    A deferred sub-parser is only a name
+    (and, optionally, a help string)
+    until it is selected,
+    or otherwise needed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._name_parser_map = self.choices = _LazyParserMap(self)
+
+    def add_lazy_parser(self, name, populate, **kwargs):
+        """
+        Add a sub-parser that will be created only when needed.
+
+        Args:
+            name: the sub-command name
+            populate: called with the sub-parser, once it is created
+            kwargs: passed to :code:`add_parser`
+        """
+        if name in self._name_parser_map:
+            raise argparse.ArgumentError(self, f"conflicting subparser: {name}")
+        if "help" in kwargs:
+            help = kwargs.pop("help")  # pylint: disable=redefined-builtin
+            self._choices_actions.append(self._ChoicesPseudoAction(name, (), help))
+        dict.__setitem__(self._name_parser_map, name, _Deferred(populate, kwargs))
+
+    def create_parser(self, name, deferred):
+        """Create, and populate, a deferred sub-parser"""
+        kwargs = dict(deferred.kwargs)
+        if kwargs.get("prog") is None:
+            kwargs["prog"] = f"{self._prog_prefix} {name}"
+        a_subparser = self._parser_class(**kwargs)
+        deferred.populate(a_subparser)
+        return a_subparser
+
+
+def _populate(a_subparser, *, name, details):
+    a_subparser.set_defaults(
+        __gather_name__=name,
+        __gather_command__=details.original,
+    )
+    for arg_details in details.extra:
+        a_subparser.add_argument(*arg_details.args, **dict(arg_details.kwargs))
+
+
 def set_parser(*, collected, parser=None):
     """
     Set (or create) a parser.
@@ -62,6 +149,13 @@ def set_parser(*, collected, parser=None):
     The parser will configure the argument parsing according to the
     function's :code:`add_argument` in the registration.
 
+    Sub-parsers are only created when they are needed:
+    usually,
+    when the command is selected on the command line.
+    Commands collected lazily
+    (see :code:`Collector.collect`)
+    are not imported until then.
+
     Args:
         collected: Return value from :code:`Collector.collected`
         parser: an argument parser
@@ -69,29 +163,108 @@ def set_parser(*, collected, parser=None):
     Returns:
         An argument parser
     """
-    if parser is None:
-        parser = argparse.ArgumentParser()
-    subparsers = parser.add_subparsers()
-    commands = unique(collected)
-    for name, details in commands.items():
-        original = details.original
-        args = details.extra
-        a_subparser = subparsers.add_parser(name)
-        a_subparser.set_defaults(
-            __gather_name__=name,
-            __gather_command__=original,
-        )
-        for arg_details in args:
-            a_subparser.add_argument(*arg_details.args, **dict(arg_details.kwargs))
+    with _trace.span("set_parser", "set_parser"):
+        if parser is None:
+            parser = argparse.ArgumentParser()
+        subparsers = parser.add_subparsers(action=_LazySubParsersAction)
+        commands = unique(collected)
+        for name, details in commands.items():
+            subparsers.add_lazy_parser(
+                name, functools.partial(_populate, name=name, details=details)
+            )
     return parser
 
 
+def prebuild(parser):
+    """Create every deferred sub-parser now"""
+    for action in parser._actions:  # pylint: disable=protected-access
+        if isinstance(action, argparse._SubParsersAction):
+            action.choices.values()
+
+
+def exit_code(command):
+    """
+    Run a command, and return its exit code.
+
+    The exit code is the one the interpreter would exit with:
+    :code:`SystemExit` codes are kept,
+    and other exceptions print a traceback and exit with 1.
+
+    Args:
+        command: called with no arguments
+
+    Returns:
+        The exit code
+    """
+    try:
+        command()
+    except SystemExit as exc:
+        code = exc.code
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        return 1
+    else:
+        return 0
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def effective_argv(argv, *, is_subcommand=False, prefix=None):
+    """
+    Rewrite the command line the way :code:`run_maybe_dry` parses it.
+
+    When running as a sub-command script,
+    the script's name is the sub-command name
+    (without the prefix, if there is one).
+
+    Args:
+        argv: sys.argv or something that looks like it
+        is_subcommand: whether running as a sub-command script
+        prefix: the sub-command scripts' prefix
+
+    Returns:
+        A list whose second item, if any, is the sub-command name
+    """
+    argv = list(argv)
+    if is_subcommand:
+        argv[0:0] = [prefix or "base-command"]
+        argv[1] = argv[1].rsplit("/", 1)[-1]
+        if prefix is not None:
+            argv[1] = argv[1].removeprefix(prefix + "-")
+    return argv
+
+
+# Plugins import this module to register commands:
+# what is only needed to run commands is imported when running them.
+
+
+def _subprocess_run(sp_run):
+    if sp_run is None:
+        import subprocess  # pylint: disable=import-outside-toplevel
+
+        sp_run = subprocess.run
+    return sp_run
+
+
+def _call(command, **kwargs):
+    result = command(**kwargs)
+    if isinstance(result, types.CoroutineType):
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        result = asyncio.run(result)
+    return result
+
+
 def run_maybe_dry(
     *,
     parser,
     argv=sys.argv,
     env=os.environ,
-    sp_run=subprocess.run,
+    sp_run=None,
     is_subcommand=False,
     prefix=None,
 ):
@@ -105,34 +278,119 @@ def run_maybe_dry(
     * ``run``: Run with logging, only if `--no-dry-run` is passed
     * ``safe_run``: Run with logging
     * ``orig_run``: Original function
+      (``sp_run``, by default ``subprocess.run``)
+    * ``run_many``: Run several processes concurrently with ``run``,
+      keeping the logs and results in order
+      (see ``max_workers``)
+    * ``async_run``, ``async_safe_run``: Like ``run`` and ``safe_run``,
+      but coroutines, for ``async def`` commands
+
+    Commands defined with ``async def`` run on a new event loop.
     """
 
     def error(args):
         parser.print_help()
         raise SystemExit(1)
 
-    argv = list(argv)
-    if is_subcommand:
-        argv[0:0] = [prefix or "base-command"]
-        argv[1] = argv[1].rsplit("/", 1)[-1]
-        if prefix is not None:
-            argv[1] = argv[1].removeprefix(prefix + "-")
+    argv = effective_argv(argv, is_subcommand=is_subcommand, prefix=prefix)
+    with _trace.span("parse", "parse_args"):
+        args = parser.parse_args(argv[1:])
+    # pylint: disable=import-outside-toplevel
+    from commander_data.run import Runner
+    from . import _run
 
-    args = parser.parse_args(argv[1:])
-    args.orig_run = sp_run
+    args.orig_run = _subprocess_run(sp_run)
     args.env = env
     a_runner = Runner.from_args(args)
     args.run, args.safe_run = a_runner.run, a_runner.safe_run
+    args.run_many = functools.partial(_run.run_many, args.run)
+    an_async_runner = _run.AsyncRunner.from_args(args)
+    args.async_run = an_async_runner.run
+    args.async_safe_run = an_async_runner.safe_run
     try:
         command = args.__gather_command__
     except AttributeError:
         command = error
-    return command(
-        args=args,
-    )
+    with _trace.span("command", getattr(args, "__gather_name__", "error")):
+        return _call(
+            command,
+            args=args,
+        )
+
+
+@attrs.frozen
+class BatchResult:
+    """The result of one line of a batch"""
+
+    line_number: int
+    line: str
+    exit_code: int
+
+
+def _batch_lines(lines):
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip("\n")
+        if line.strip() == "" or line.lstrip().startswith("#"):
+            continue
+        yield line_number, line
+
+
+def run_batch(
+    *,
+    parser,
+    lines,
+    prefix=None,
+    workers=None,
+    env=os.environ,
+    sp_run=None,
+):
+    """
+    Run a command for every line.
+
+    Every line is split like a shell would split it,
+    and is a command line without the command's name
+    (for example, :code:`do-something --value 5`).
+    Blank lines, and lines starting with :code:`#`, are skipped.
+
+    Args:
+        parser: a parser returned by :code:`set_parser`
+        lines: an iterable of lines (for example, a file)
+        prefix: the command's name
+        workers: if given, run the lines concurrently
+                 on a pool of that many threads.
+                 The lines must be independent of each other.
+        env: os.environ or something that looks like it
+        sp_run: subprocess.run (the default) or something that looks like it
+
+    Returns:
+        An iterable of :code:`BatchResult`, in the order of the lines
+    """
+
+    def run_line(numbered):
+        line_number, line = numbered
+        code = exit_code(
+            lambda: run_maybe_dry(
+                parser=parser,
+                argv=[prefix or "batch", *shlex.split(line)],
+                env=env,
+                sp_run=sp_run,
+            )
+        )
+        return BatchResult(line_number=line_number, line=line, exit_code=code)
+
+    numbered = _batch_lines(lines)
+    if workers is None:
+        yield from map(run_line, numbered)
+        return
+    import concurrent.futures  # pylint: disable=import-outside-toplevel
+
+    # Sub-parsers must not be created concurrently
+    prebuild(parser)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(run_line, numbered)
 
 
-def run(*, parser, argv=sys.argv, env=os.environ, sp_run=subprocess.run):
+def run(*, parser, argv=sys.argv, env=os.environ, sp_run=None):
     """
     Parse arguments and run the command.
 
@@ -141,15 +399,16 @@ def run(*, parser, argv=sys.argv, env=os.environ, sp_run=subprocess.run):
     Args:
         argv: sys.argv or something that looks like it
         env: os.environ or something that looks like it
-        sp_run: subprocess.run or something that looks like it
+        sp_run: subprocess.run (the default) or something that looks like it
 
     Returns:
         Return value from dispatched command
     """
     args = parser.parse_args(argv[1:])
     command = args.__gather_command__
-    return command(
+    return _call(
+        command,
         args=args,
         env=env,
-        run=sp_run,
+        run=_subprocess_run(sp_run),
     )
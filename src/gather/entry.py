@@ -80,19 +80,111 @@ the following will work:
 * ``awesomeawesome frobnicate``
 * ``frobincate``
 
+The console scripts run the commands directly:
+unlike ``python -m awesomeawesome``,
+they do not run ``awesomeawesome/__main__.py``,
+and reuse the modules imported to load ``ENTRY_DATA``.
+
+By default,
+every module of every plugin is imported
+in order to find the commands.
+When creating the entry data with an index path
+(see :code:`gather.api.Collector.collect`),
+or with static discovery:
+
+.. code::
+
+    ENTRY_DATA = entry.EntryData.create(__name__, discovery="static")
+
+only the module of the command selected on the command line is imported,
+and only its sub-parser is built.
+
+Only ``awesomeawesome`` itself is scanned for commands,
+and so are plugins that declare a :code:`gather` entry point
+named after it:
+
+.. code::
+
+    [project.entry-points.gather]
+    awesomeawesome = "awesomeawesome_plugin"
+
+When the command is slow,
+setting the :code:`GATHER_TRACE` environment variable to a path
+saves a trace of where the time went
+(see :code:`gather.api.tracing`).
+Setting :code:`GATHER_IMPORT_BUDGET`
+(for example, to :code:`seconds=0.2,action=fail` in CI)
+reports the plugins whose imports go over the budget.
+
+For many short commands,
+a server can keep the collected commands,
+and the parser,
+in memory.
+Add a console script for
+:code:`awesomeawesome:ENTRY_DATA.server_command`,
+and run it with the :code:`GATHER_SOCKET` environment variable
+set to a socket path.
+The commands,
+run with the same :code:`GATHER_SOCKET`,
+are sent to the server while it is running.
+Commands that the server runs do not get :code:`GATHER_SOCKET`,
+so the gather commands they run in turn are not sent to it.
+The server must be restarted after installing plugins.
+
+The server runs the commands one at a time,
+in its own process.
+A server started with
+:code:`awesomeawesome:ENTRY_DATA.fork_server_command`
+forks a child process for each command instead:
+the commands are isolated from each other,
+and can run at the same time,
+but still do not pay for importing the plugins.
+
+A console script for
+:code:`awesomeawesome:ENTRY_DATA.batch_command`
+runs many commands in one process:
+it reads command lines
+(without the :code:`awesomeawesome` at the start)
+from a file,
+or from the standard input,
+and runs each one.
+The exit code of every line is written to the standard error,
+as :code:`<line number>\t<exit code>\t<line>`,
+and the batch fails if any line failed.
+With :code:`--workers N`,
+the lines run concurrently.
+
+A console script for
+:code:`awesomeawesome:ENTRY_DATA.complete_command`
+(say, ``awesomeawesome-complete``)
+completes sub-command names and their options
+in bash, zsh and fish:
+
+.. code::
+
+    eval "$(awesomeawesome-complete script bash --command awesomeawesomectl)"
+
+Pass :code:`--subcommand frobnicate` for sub-command scripts.
+Completing does not import the plugins:
+the sub-commands, and their arguments, are read from a cache,
+rebuilt when the plugins change.
+Only choices that are not plain strings or numbers
+import the module of their sub-command.
 """
 
 from __future__ import annotations
+import argparse
+import contextlib
 import functools
 import logging
-import runpy
+import os
 import sys
-from typing import Callable
+import warnings
+from typing import Callable, Optional, Union
 
 import attrs
-import toolz
 
-from . import commands as commandslib, api
+from . import commands as commandslib, api, _entry_points, _index, _trace
 
 
 def dunder_main(globals_dct, command_data, logger=logging.getLogger()):
@@ -101,60 +193,368 @@ def dunder_main(globals_dct, command_data, logger=logging.getLogger()):
     """
     if globals_dct["__name__"] != "__main__":
         raise ImportError("module cannot be imported", globals_dct["__name__"])
+    _main(command_data, globals_dct, logger)
+
+
+def _main(command_data, options, logger=logging.getLogger()):
+    """
+    Run the entry point.
+
+    ``options`` are the ``__main__`` globals
+    (or, for console scripts, the same flags):
+    ``IS_SUBCOMMAND``, ``GATHER_SERVE``, ``GATHER_BATCH``
+    and ``GATHER_COMPLETE``.
+    """
+    if options.get("GATHER_COMPLETE", False):
+        # Completing runs on every key press: no server, no logging
+        raise SystemExit(_complete(command_data))
+    # Only imported when running, not when plugins import the entry data
+    from . import _server  # pylint: disable=import-outside-toplevel
+
+    socket_path = command_data.socket
+    if socket_path is None:
+        socket_path = os.environ.get(_server.ENVIRONMENT_VARIABLE)
+    serving = options.get("GATHER_SERVE", False)
+    batching = options.get("GATHER_BATCH", False)
+    # A batch's own command line is not a command to forward
+    if socket_path is not None and not serving and not batching:
+        code = _server.forward(
+            socket_path,
+            argv=sys.argv,
+            env=os.environ,
+            cwd=os.getcwd(),
+            is_subcommand=options.get("IS_SUBCOMMAND", False),
+        )
+        if code is not None:
+            raise SystemExit(code)
     ch = logging.StreamHandler()
     ch.setLevel(logging.INFO)
     formatter = logging.Formatter("%(asctime)s:%(levelname)s:%(name)s:%(message)s")
     ch.setFormatter(formatter)
     logger.addHandler(ch)
     logger.setLevel(logging.INFO)
+    if serving:
+        _serve(command_data, socket_path, fork=serving == "fork")
+        return
+    if batching:
+        raise SystemExit(_batch(command_data))
+    trace = command_data.trace
+    if trace is None:
+        trace = os.environ.get(_trace.ENVIRONMENT_VARIABLE)
+    budget = command_data.import_budget
+    if budget is None and _trace.BUDGET_ENVIRONMENT_VARIABLE in os.environ:
+        budget = api.ImportBudget.parse(os.environ[_trace.BUDGET_ENVIRONMENT_VARIABLE])
+    memory = budget is not None and budget.allocated is not None
+    with api.tracing(trace, memory=memory, budget=budget):
+        _dispatch(options, command_data)
+
+
+def _dispatch(options, command_data):
+    is_subcommand = options.get("IS_SUBCOMMAND", False)
+    collector = command_data.collector
+    collected = collector.collect(
+        index=command_data.index,
+        lazy=command_data.index is not None or collector.discovery == "static",
+    )
     commandslib.run_maybe_dry(
-        parser=commandslib.set_parser(collected=command_data.collector.collect()),
-        is_subcommand=globals_dct.get("IS_SUBCOMMAND", False),
+        parser=commandslib.set_parser(collected=collected),
+        is_subcommand=is_subcommand,
         prefix=command_data.prefix,
         argv=sys.argv,
     )
 
 
-def _noop(_ignored):  # pragma: no cover
-    pass
+def _serve(command_data, socket_path, *, fork):
+    """Collect, and build the parser, once: then serve commands"""
+    from . import _server  # pylint: disable=import-outside-toplevel
 
+    if socket_path is None:
+        raise ValueError("no socket path", _server.ENVIRONMENT_VARIABLE)
+    collected = command_data.collector.collect(index=command_data.index)
+    parser = commandslib.set_parser(collected=collected)
+    commandslib.prebuild(parser)
+    server = _server.Server(parser=parser, prefix=command_data.prefix, fork=fork)
+    server.serve(socket_path)
 
-@attrs.frozen
+
+def _batch(command_data):
+    """Collect, and build the parser, once: then run every line"""
+    batch_parser = argparse.ArgumentParser(
+        prog=f"{command_data.prefix}-batch",
+        description="Run a command for every line",
+    )
+    batch_parser.add_argument(
+        "file", nargs="?", default="-", help="command lines (default: stdin)"
+    )
+    batch_parser.add_argument("--workers", type=int, help="run the lines concurrently")
+    options = batch_parser.parse_args(sys.argv[1:])
+    collected = command_data.collector.collect(index=command_data.index)
+    parser = commandslib.set_parser(collected=collected)
+    with contextlib.ExitStack() as stack:
+        lines = (
+            sys.stdin
+            if options.file == "-"
+            else stack.enter_context(open(options.file, encoding="utf-8"))
+        )
+        results = commandslib.run_batch(
+            parser=parser,
+            lines=lines,
+            prefix=command_data.prefix,
+            workers=options.workers,
+        )
+        failed = 0
+        for result in results:
+            print(
+                f"{result.line_number}\t{result.exit_code}\t{result.line}",
+                file=sys.stderr,
+            )
+            failed += result.exit_code != 0
+    return 1 if failed else 0
+
+
+def _complete(command_data):
+    """Complete a command line, or write the script that sets up completion"""
+    from . import _completion  # pylint: disable=import-outside-toplevel
+
+    complete_parser = argparse.ArgumentParser(
+        prog=f"{command_data.prefix}-complete",
+        description="Shell completion",
+    )
+    actions = complete_parser.add_subparsers(dest="action", required=True)
+    script_parser = actions.add_parser(
+        "script", help="write the script that sets up completion"
+    )
+    script_parser.add_argument("shell", choices=_completion.SHELLS)
+    script_parser.add_argument(
+        "--command",
+        action="append",
+        default=[],
+        help="a console script taking a sub-command (default: the prefix)",
+    )
+    script_parser.add_argument(
+        "--subcommand",
+        action="append",
+        default=[],
+        help="a console script that is a sub-command",
+    )
+    words_parser = actions.add_parser("words", help="complete the last word")
+    words_parser.add_argument(
+        "--subcommand", action="store_true", help="the script is a sub-command"
+    )
+    words_parser.add_argument("words", nargs="*")
+    options = complete_parser.parse_args(sys.argv[1:])
+    if options.action == "script":
+        commands = options.command
+        if len(commands) == 0 and len(options.subcommand) == 0:
+            commands = [command_data.prefix]
+        sys.stdout.write(
+            _completion.script(
+                options.shell,
+                program=sys.argv[0],
+                commands=commands,
+                subcommands=options.subcommand,
+            )
+        )
+        return 0
+    words = commandslib.effective_argv(
+        options.words or [""],
+        is_subcommand=options.subcommand,
+        prefix=command_data.prefix,
+    )
+    candidates = _completion.complete(
+        _completion_commands(command_data),
+        words,
+        resolve=functools.partial(_dynamic_choices, command_data),
+    )
+    for candidate in candidates:
+        print(candidate)
+    return 0
+
+
+def _command_parser(command_data, name, details):
+    parser = argparse.ArgumentParser(prog=f"{command_data.prefix} {name}")
+    commandslib._populate(  # pylint: disable=protected-access
+        parser, name=name, details=details
+    )
+    return parser
+
+
+def _completion_commands(command_data):
+    """Load the completion cache, (re)building it if needed"""
+    from . import _completion  # pylint: disable=import-outside-toplevel
+
+    path = command_data.completion
+    if path is None:
+        path = _completion.default_path(command_data.prefix)
+    # Neither looks up the entry points:
+    # while distributions are unchanged, so are the roots saved in the cache
+    site = _entry_points.site_fingerprint()
+    commands = _completion.load(path, site, _index.files_fingerprint)
+    if commands is None:
+        collector = command_data.collector
+        roots = collector._roots()  # pylint: disable=protected-access
+        current = _index.files_fingerprint(roots)
+        collected = collector.collect(index=command_data.index)
+        # Registered objects need not have a name (for example, partials):
+        # use the attribute each registration was found under
+        locations = {
+            location.name: location
+            for location in collector._locate(  # pylint: disable=protected-access
+                command_data.index
+            )
+        }
+        commands = {
+            name: _completion.describe(
+                name,
+                _command_parser(command_data, name, details),
+                module=locations[name].module,
+                attribute=locations[name].attribute,
+            )
+            for name, details in api.unique(collected).items()
+        }
+        _completion.save(
+            path, commands.values(), site=site, roots=roots, fingerprint=current
+        )
+    return commands
+
+
+def _dynamic_choices(command_data, command, options):
+    """Import only the command's module, to find its current choices"""
+    from . import _completion  # pylint: disable=import-outside-toplevel
+
+    details = api.LazyRegistration(
+        collector=command_data.collector,
+        name=command.name,
+        module=command.module,
+        attribute=command.attribute,
+    ).resolve()
+    parser = _command_parser(command_data, command.name, details)
+    return _completion.choices(parser, options)
+
+
+def _console_script(**options):
+    """
+    A console script running the entry data's commands.
+
+    The script calls the commands directly:
+    the package, and the modules it already imported, are reused,
+    instead of running the package's ``__main__`` again.
+    """
+
+    def bind(entry_data):
+        return functools.partial(_main, entry_data, options)
+
+    return attrs.field(
+        init=False,
+        eq=False,
+        repr=False,
+        default=attrs.Factory(bind, takes_self=True),
+    )
+
+
+_DEFAULT_ONLY = object()
+
+
+@attrs.frozen(init=False)
 class EntryData:
     """
     Data for the entry point.
+
+    The console scripts are derived from the data.
+    Passing :code:`main_command` or :code:`sub_command`
+    is deprecated:
+    they are ignored.
     """
 
     prefix: str
     collector: api.Collector
     register: Callable
-    main_command: Callable[[], None]
-    sub_command: Callable[[], None]
+    index: Optional[Union[str, os.PathLike]] = None
+    trace: Optional[Union[str, os.PathLike]] = None
+    import_budget: Optional[api.ImportBudget] = None
+    socket: Optional[Union[str, os.PathLike]] = None
+    completion: Optional[Union[str, os.PathLike]] = None
+    main_command: Callable[[], None] = _console_script()
+    sub_command: Callable[[], None] = _console_script(IS_SUBCOMMAND=True)
+    server_command: Callable[[], None] = _console_script(GATHER_SERVE=True)
+    fork_server_command: Callable[[], None] = _console_script(GATHER_SERVE="fork")
+    batch_command: Callable[[], None] = _console_script(GATHER_BATCH=True)
+    complete_command: Callable[[], None] = _console_script(GATHER_COMPLETE=True)
+
+    def __init__(
+        self, prefix, collector, register, main_command=None, sub_command=None, **kwargs
+    ):
+        if main_command is not None or sub_command is not None:
+            warnings.warn(
+                "main_command and sub_command are derived from the entry data,"
+                " and ignored",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+        self.__attrs_init__(  # pylint: disable=no-member
+            prefix=prefix, collector=collector, register=register, **kwargs
+        )
 
     @classmethod
-    def create(cls, package_name, prefix=None):
+    def create(
+        cls,
+        package_name,
+        prefix=None,
+        *,
+        index=None,
+        discovery="venusian",
+        only=_DEFAULT_ONLY,
+        trace=None,
+        import_budget=None,
+        socket=None,
+        completion=None,
+    ):
         """
         Create a new instance from package_name and prefix
+
+        Passing an :code:`index` path,
+        or :code:`discovery="static"`,
+        lets the entry point import only the selected command's module.
+
+        By default,
+        only the package itself,
+        and the :code:`gather` entry points named after it,
+        are scanned for commands.
+        Pass an :code:`api.Only` to scan other entry points,
+        or :code:`None` to scan all of them.
+
+        Passing a :code:`trace` path
+        (or setting the :code:`GATHER_TRACE` environment variable)
+        saves a trace of collecting and dispatching
+        (see :code:`gather.api.tracing`).
+        Passing an :code:`import_budget`
+        (or setting the :code:`GATHER_IMPORT_BUDGET` environment variable,
+        see :code:`gather.api.ImportBudget.parse`)
+        warns, or fails, when a plugin distribution is too slow to import.
+
+        Passing a :code:`socket` path
+        (or setting the :code:`GATHER_SOCKET` environment variable)
+        sends commands to a server started with :code:`server_command`
+        (or :code:`fork_server_command`),
+        when it is running.
+
+        Passing a :code:`completion` path
+        saves the shell completion cache there,
+        instead of in the user's cache directory.
         """
         if prefix is None:
             prefix = package_name
-        collector = api.Collector()
+        if only is _DEFAULT_ONLY:
+            only = api.Only(packages=[package_name], entry_points=[package_name])
+        collector = api.Collector(discovery=discovery, only=only)
         register = commandslib.make_command_register(collector)
-        main_command = toolz.compose(
-            _noop,
-            functools.partial(
-                runpy.run_module,
-                package_name,
-                run_name="__main__",
-            ),
-        )
-        sub_command = functools.partial(
-            main_command, init_globals=dict(IS_SUBCOMMAND=True)
-        )
         return cls(
             prefix=prefix,
             collector=collector,
             register=register,
-            main_command=main_command,
-            sub_command=sub_command,
+            index=index,
+            trace=trace,
+            import_budget=import_budget,
+            socket=socket,
+            completion=completion,
         )
@@ -8,3 +8,35 @@ def weird_decorator(func):
     """Register function into WEIRD_COMMANDS"""
     WEIRD_COMMANDS.register()(func)
     return func
+
+
+HIDDEN_COMMANDS = [gather.Collector()]
+
+
+@HIDDEN_COMMANDS[0].register()
+def hidden():
+    """Plugin registered to a collector not reachable as a module attribute"""
+
+
+STATIC_HIDDEN_COMMANDS = [gather.Collector(discovery="static")]
+
+
+@STATIC_HIDDEN_COMMANDS[0].register()
+def static_hidden():
+    """Plugin that static discovery cannot find"""
+
+
+LIVE_COMMANDS = gather.Collector(
+    only=gather.api.Only(entry_points=["gather-live-plugins"])
+)
+
+
+_PRUNED_ONLY = gather.api.Only(entry_points=["gather-pruned-plugins"])
+
+PRUNED_COMMANDS = gather.Collector(only=_PRUNED_ONLY, exclude=["*.tests"])
+
+INCLUDED_COMMANDS = gather.Collector(
+    only=_PRUNED_ONLY, include=["gather_pruned_plugins.sub"]
+)
+
+DESCENDING_COMMANDS = gather.Collector(only=_PRUNED_ONLY, descend="indexed")
@@ -0,0 +1,22 @@
+"""Plugins that can be discovered without importing the module"""
+import functools
+
+import gather
+
+STATIC_COMMANDS = gather.Collector(discovery="static")
+
+
+@STATIC_COMMANDS.register()
+def static1():
+    """Plugin registered with name of function"""
+
+
+@STATIC_COMMANDS.register(name="static-two", transform=gather.Wrapper.glue(2))
+@functools.lru_cache
+def static2():
+    """Plugin registered with explicit name and transform"""
+
+
+@STATIC_COMMANDS.register(name=None)
+class Static3:
+    """Plugin class registered with the default name"""
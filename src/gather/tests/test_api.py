@@ -1,10 +1,25 @@
 """Test gather's API"""
+import collections
+import contextlib
+import importlib
+import json
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+import time
 import unittest
+from unittest import mock
+
+import attr
+import venusian
 
 import gather
-from gather import unique
+import gather.__main__
+from gather import unique, api, _entry_points, _index, _static
 
-from gather.tests import _helper
+from gather.tests import _helper, _static_plugins
 
 MAIN_COMMANDS = gather.Collector()
 
@@ -49,6 +64,29 @@ def fooish():
     """Plugin registered with a transformation"""
 
 
+ONLY_COMMANDS = gather.Collector(only=api.Only(packages=[__name__]))
+
+ELSEWHERE_COMMANDS = gather.Collector(only=api.Only(packages=[_helper.__name__]))
+
+ONLY_STATIC_COMMANDS = gather.Collector(
+    discovery="static", only=api.Only(packages=[__name__])
+)
+
+
+@ONLY_COMMANDS.register()
+@ELSEWHERE_COMMANDS.register()
+def only1():
+    """Plugin registered for collectors that only scan some packages"""
+
+
+UNPICKLABLE_COMMANDS = gather.Collector()
+
+
+@UNPICKLABLE_COMMANDS.register(transform=lambda func: lambda: func)
+def unpicklable1():
+    """Plugin whose transformed value cannot be pickled"""
+
+
 COLLIDING_COMMANDS = gather.Collector()
 
 NON_COLLIDING_COMMANDS = gather.Collector()
@@ -113,3 +151,869 @@ class CollectorTest(unittest.TestCase):
         """Without unique, it gets all the registered plugins for name"""
         with self.assertRaises(ValueError):
             unique(COLLIDING_COMMANDS.collect())
+
+
+class IndexTest(unittest.TestCase):
+
+    """Tests for collecting with an on-disk index"""
+
+    def setUp(self):
+        """Create a temporary index path"""
+        with contextlib.ExitStack() as stack:
+            tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.index = pathlib.Path(tmp_dir) / "cache" / "index.json"
+
+    def test_same_as_scanning(self):
+        """Collecting with an index gives the same results as scanning"""
+        for collector in [MAIN_COMMANDS, COLLIDING_COMMANDS, _helper.WEIRD_COMMANDS]:
+            self.assertEqual(collector.collect(index=self.index), collector.collect())
+        self.assertTrue(self.index.exists())
+
+    def test_reuses_index(self):
+        """An up-to-date index is used without walking the modules"""
+        MAIN_COMMANDS.collect(index=self.index)
+        with mock.patch.object(api, "_walk_modules", side_effect=AssertionError):
+            collected = unique(MAIN_COMMANDS.collect(index=self.index))
+        self.assertIs(collected["main1"], main1)
+
+    def test_stale_index(self):
+        """A stale or corrupt index is rebuilt"""
+        for content in [
+            "[]",
+            "not json",
+            json.dumps(dict(format=_index.FORMAT, fingerprint="")),
+        ]:
+            self.index.parent.mkdir(parents=True, exist_ok=True)
+            self.index.write_text(content)
+            collected = unique(OTHER_COMMANDS.collect(index=self.index))
+            self.assertIs(collected["baz"], main4)
+            rebuilt = json.loads(self.index.read_text())
+            self.assertNotEqual(rebuilt["fingerprint"], "")
+
+    def test_unknown_collector(self):
+        """Collectors that cannot be found by reference are still collected"""
+        collected = unique(_helper.HIDDEN_COMMANDS[0].collect(index=self.index))
+        self.assertIs(collected["hidden"], _helper.hidden)
+
+    def test_unimportable_module(self):
+        """Modules recorded in the index that fail to import are skipped"""
+        current = _index.fingerprint(api._entry_points())
+        location = _index.Location(
+            collector=(),
+            name="nothing",
+            module="gather.tests.cannot_be_imported",
+            attribute="nothing",
+        )
+        _index.save(self.index, current, [location])
+        self.assertEqual(MAIN_COMMANDS.collect(index=self.index), {})
+
+
+class LazyTest(unittest.TestCase):
+
+    """Tests for collecting lazily"""
+
+    def setUp(self):
+        """Create a temporary index path"""
+        with contextlib.ExitStack() as stack:
+            tmp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.index = pathlib.Path(tmp_dir) / "index.json"
+
+    def test_lazy_values(self):
+        """Lazy collection gives proxies that resolve to the registered plugins"""
+        collected = unique(MAIN_COMMANDS.collect(index=self.index, lazy=True))
+        self.assertEqual(set(collected), {"main1", "weird_name", "bar"})
+        proxy = collected["main1"]
+        self.assertIsInstance(proxy, api.LazyRegistration)
+        self.assertEqual(proxy._resolved, {})
+        self.assertEqual(proxy(5), ("main1", 5))
+        self.assertIs(proxy.resolve(), main1)
+
+    def test_lazy_transform(self):
+        """The transform is applied when the proxy is resolved"""
+        collected = unique(TRANSFORM_COMMANDS.collect(index=self.index, lazy=True))
+        res = collected["fooish"]
+        self.assertIs(res.original, fooish)
+        self.assertEqual(res.extra, 5)
+        with self.assertRaises(AttributeError):
+            res._private  # pylint: disable=pointless-statement
+
+    def test_lazy_unknown_collector(self):
+        """Collectors that cannot be found by reference are collected eagerly"""
+        collected = unique(
+            _helper.HIDDEN_COMMANDS[0].collect(index=self.index, lazy=True)
+        )
+        self.assertIs(collected["hidden"], _helper.hidden)
+
+    def test_lazy_needs_index(self):
+        """Lazy collection without an index is an error"""
+        with self.assertRaises(ValueError):
+            MAIN_COMMANDS.collect(lazy=True)
+
+
+class StaticDiscoveryTest(unittest.TestCase):
+
+    """Tests for collecting with static discovery"""
+
+    def test_static(self):
+        """Static discovery collects the same plugins as scanning"""
+        collected = unique(_static_plugins.STATIC_COMMANDS.collect())
+        self.assertIs(collected["static1"], _static_plugins.static1)
+        self.assertIs(collected["Static3"], _static_plugins.Static3)
+        self.assertIs(collected["static-two"].original, _static_plugins.static2)
+        self.assertEqual(collected["static-two"].extra, 2)
+
+    def test_static_lazy(self):
+        """Static discovery allows lazy collection without an index"""
+        collected = unique(_static_plugins.STATIC_COMMANDS.collect(lazy=True))
+        proxy = collected["static1"]
+        self.assertIsInstance(proxy, api.LazyRegistration)
+        self.assertIs(proxy.resolve(), _static_plugins.static1)
+
+    def test_static_fallback(self):
+        """Modules that cannot be analyzed are scanned"""
+        collector = _helper.STATIC_HIDDEN_COMMANDS[0]
+        collected = unique(collector.collect(lazy=True))
+        self.assertIs(collected["static_hidden"], _helper.static_hidden)
+
+    def test_static_index(self):
+        """Static discovery builds the index"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = pathlib.Path(tmp_dir) / "index.json"
+            collector = _static_plugins.STATIC_COMMANDS
+            self.assertEqual(collector.collect(index=index), collector.collect())
+
+
+class PrefetchTest(unittest.TestCase):
+
+    """Tests for collecting with concurrent prefetching"""
+
+    def test_same_as_serial(self):
+        """Prefetching gives the same results as collecting serially"""
+        for collector in [MAIN_COMMANDS, COLLIDING_COMMANDS, _helper.WEIRD_COMMANDS]:
+            serial = collector.collect()
+            gather.invalidate_cache()
+            self.assertEqual(collector.collect(workers=4), serial)
+
+    def test_same_with_index(self):
+        """Prefetching with an index gives the same results"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = pathlib.Path(tmp_dir) / "index.json"
+            self.assertEqual(
+                MAIN_COMMANDS.collect(index=index, workers=2),
+                MAIN_COMMANDS.collect(),
+            )
+
+    def test_compile_errors_ignored(self):
+        """Files that are not source, or do not compile, are skipped"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            broken = pathlib.Path(tmp_dir) / "broken.py"
+            broken.write_text("def (:")
+            api._compile(("broken", str(broken)))
+            api._compile(("compiled", str(pathlib.Path(tmp_dir) / "compiled.pyc")))
+            self.assertEqual(list(broken.parent.glob("__pycache__/*")), [])
+
+
+class CacheTest(unittest.TestCase):
+
+    """Tests for scanning once per process"""
+
+    def test_scanned_once(self):
+        """Collecting again, for any collector, does not scan again"""
+        gather.invalidate_cache()
+        MAIN_COMMANDS.collect()
+        with mock.patch.object(api, "_walk_modules", side_effect=AssertionError):
+            collected = unique(OTHER_COMMANDS.collect())
+        self.assertIs(collected["baz"], main4)
+
+    def test_invalidate(self):
+        """After invalidating the cache, collecting scans again"""
+        MAIN_COMMANDS.collect()
+        gather.invalidate_cache()
+        with mock.patch.object(
+            api, "_walk_modules", wraps=api._walk_modules
+        ) as walk_modules:
+            collected = unique(MAIN_COMMANDS.collect())
+        self.assertIs(collected["main1"], main1)
+        walk_modules.assert_called_once()
+
+    def test_fresh_copies(self):
+        """Changing the result of collecting does not change the cache"""
+        COLLIDING_COMMANDS.collect().pop("weird_name")
+        COLLIDING_COMMANDS.collect()["weird_name"].clear()
+        self.assertEqual(len(COLLIDING_COMMANDS.collect()["weird_name"]), 3)
+
+
+class OnlyTest(unittest.TestCase):
+
+    """Tests for restricting the scanned entry points"""
+
+    entry_points = [
+        _entry_points.EntryPoint(
+            name="top",
+            value="top",
+            dist=_entry_points.Distribution(name="Top_Dist", version="1"),
+        ),
+        _entry_points.EntryPoint(name="plugin", value="plugin.impl", dist=None),
+    ]
+
+    def test_nothing(self):
+        """Without criteria, nothing is scanned"""
+        self.assertEqual(api.Only().roots(self.entry_points), [])
+
+    def test_entry_point_name(self):
+        """Entry points can be selected by name"""
+        only = api.Only(entry_points=["plugin"])
+        self.assertEqual(only.roots(self.entry_points), ["plugin.impl"])
+
+    def test_distribution(self):
+        """Distributions are compared by their normalized names"""
+        only = api.Only(distributions=["top-dist"])
+        self.assertEqual(only.roots(self.entry_points), ["top"])
+
+    def test_packages(self):
+        """Packages select entry points inside them, or parts of entry points"""
+        only = api.Only(packages=["top.sub", "plugin", "top.sub"])
+        self.assertEqual(only.roots(self.entry_points), ["top.sub", "plugin.impl"])
+
+    def test_collect(self):
+        """Only modules under the selected packages are scanned"""
+        gather.invalidate_cache()
+        with mock.patch.object(api, "_walk_modules", wraps=api._walk_modules) as walk:
+            collected = unique(ONLY_COMMANDS.collect())
+        walk.assert_called_once_with([__name__], None)
+        self.assertIs(collected["only1"], only1)
+        self.assertEqual(unique(ELSEWHERE_COMMANDS.collect()), {})
+
+    def test_collect_static(self):
+        """Static discovery is restricted to the selected packages"""
+        with mock.patch.object(_static, "discover", return_value=([], [])) as find:
+            ONLY_STATIC_COMMANDS.collect()
+        [[roots, module_files]] = [call.args for call in find.call_args_list]
+        self.assertEqual(roots, [__name__])
+        self.assertEqual(
+            list(module_files(__name__)), list(_index.module_files(__name__))
+        )
+
+    def test_collect_index(self):
+        """With an index, registrations outside the selected packages are ignored"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = pathlib.Path(tmp_dir) / "index.json"
+            collected = unique(ONLY_COMMANDS.collect(index=index))
+            elsewhere = unique(ELSEWHERE_COMMANDS.collect(index=index))
+        self.assertIs(collected["only1"], only1)
+        self.assertEqual(elsewhere, {})
+
+
+class TracingTest(unittest.TestCase):
+
+    """Tests for tracing collection"""
+
+    def test_collect(self):
+        """Collecting records the phases, and the imported and scanned modules"""
+        gather.invalidate_cache()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "trace.json"
+            with api.tracing(path):
+                unique(MAIN_COMMANDS.collect())
+            content = json.loads(path.read_text())
+        summary = content["summary"]
+        for phase in ["collect", "entry_points", "import", "scan", "transform"]:
+            self.assertIn(phase, summary["phases"])
+        self.assertGreater(summary["modules"][__name__]["registrations"], 0)
+        self.assertIn("gather.tests.cannot_be_imported", summary["modules"])
+
+
+class ImportBudgetTest(unittest.TestCase):
+
+    """Tests for import budgets"""
+
+    costs = dict(
+        slow=dict(import_seconds=2.0, allocated=10),
+        big=dict(import_seconds=0.1, allocated=10**9),
+    )
+
+    def test_parse(self):
+        """Budgets are parsed from key=value pairs"""
+        budget = api.ImportBudget.parse("seconds=0.5, allocated=1e6,action=fail")
+        self.assertEqual(
+            budget, api.ImportBudget(seconds=0.5, allocated=10**6, action="fail")
+        )
+
+    def test_parse_unknown(self):
+        """Unknown keys are rejected"""
+        with self.assertRaises(ValueError):
+            api.ImportBudget.parse("minutes=1")
+
+    def test_over(self):
+        """Every measure over its limit is reported"""
+        budget = api.ImportBudget(seconds=1, allocated=1000)
+        self.assertEqual(
+            budget.over(self.costs),
+            [("big", "allocated", 10**9, 1000), ("slow", "import_seconds", 2.0, 1)],
+        )
+
+    def test_warn(self):
+        """By default, going over the budget warns"""
+        with self.assertWarns(api.ImportBudgetWarning):
+            api.ImportBudget(seconds=1).check(self.costs)
+
+    def test_fail(self):
+        """Going over a failing budget raises an exception"""
+        budget = api.ImportBudget(allocated=1000, action="fail")
+        with self.assertRaises(api.ImportBudgetExceeded) as caught:
+            budget.check(self.costs)
+        [(name, *_rest)] = caught.exception.args[0]
+        self.assertEqual(name, "big")
+
+    def test_within(self):
+        """Within the budget, nothing happens"""
+        api.ImportBudget(seconds=10, allocated=10**10).check(self.costs)
+
+    def test_tracing(self):
+        """Collecting is checked against the budget"""
+        gather.invalidate_cache()
+        budget = api.ImportBudget(seconds=0)
+        with self.assertWarns(api.ImportBudgetWarning) as caught:
+            with api.tracing(None, budget=budget) as tracer:
+                MAIN_COMMANDS.collect()
+        self.assertIn("importing gather cost", str(caught.warning))
+        self.assertIn(__name__, tracer.summary()["modules"])
+
+    def test_distribution_of(self):
+        """Modules are attributed to the innermost entry point's distribution"""
+        entry_points = [
+            _entry_points.EntryPoint(
+                name="a", value="top", dist=_entry_points.Distribution("top", "1")
+            ),
+            _entry_points.EntryPoint(name="b", value="top.inner", dist=None),
+        ]
+        with mock.patch.object(api, "_entry_points", return_value=entry_points):
+            found = [
+                api._distribution_of(name)
+                for name in ["top.mod", "top.inner.mod", "elsewhere"]
+            ]
+        self.assertEqual(found, ["top", "top.inner", None])
+
+
+class EntryPointsTest(unittest.TestCase):
+
+    """Tests for configuring the entry points lookup"""
+
+    def test_configure(self):
+        """The entry points' maximum age can be configured"""
+        self.addCleanup(gather.api.configure_entry_points, max_age=0)
+        gather.api.configure_entry_points(max_age=None)
+        self.assertIsNone(api._ENTRY_POINTS.max_age)
+
+    def test_save(self):
+        """The entry points can be saved"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "entry-points.json"
+            gather.api.save_entry_points(path)
+            content = json.loads(path.read_text())
+        self.assertIn(
+            "gather", [value for _name, value, _dist in content["entry_points"]]
+        )
+
+
+def _plugin_directory(test):
+    """Make a directory for plugin modules, on :code:`sys.path` during the test"""
+    tmp_dir = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp_dir.cleanup)
+    sys.path.insert(0, tmp_dir.name)
+    test.addCleanup(sys.path.remove, tmp_dir.name)
+    return pathlib.Path(tmp_dir.name)
+
+
+def _forget(package_name):
+    for module_name in list(sys.modules):
+        if module_name.startswith(package_name):
+            del sys.modules[module_name]
+
+
+def _patch_entry_point(test, name, value, **patterns):
+    entry_point = _entry_points.EntryPoint(
+        name=name, value=value, dist=None, **patterns
+    )
+    patcher = mock.patch.object(api, "_entry_points", return_value=[entry_point])
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def _write_module(path, source, version):
+    path.write_text(source)
+    # Make sure the change is seen, even within the clock's resolution
+    os.utime(path, ns=(0, time.time_ns() + version))
+
+
+_LIVE_PLUGIN = """\
+from gather.tests._helper import LIVE_COMMANDS
+
+
+@LIVE_COMMANDS.register()
+def {name}():
+    pass
+"""
+
+
+class IncrementalTest(unittest.TestCase):
+
+    """Tests for collecting again, rescanning what changed"""
+
+    def setUp(self):
+        """Create a plugin package, under an entry point"""
+        self.package = _plugin_directory(self) / "gather_live_plugins"
+        self.package.mkdir()
+        (self.package / "__init__.py").write_text("")
+        self._write("first", "one")
+        self.addCleanup(_forget, "gather_live_plugins")
+        _patch_entry_point(self, "gather-live-plugins", "gather_live_plugins")
+
+    def _write(self, module_name, *names):
+        _write_module(
+            self.package / f"{module_name}.py",
+            "".join(_LIVE_PLUGIN.format(name=name) for name in names),
+            len(names),
+        )
+
+    def test_collect(self):
+        """Collecting incrementally is the same as collecting"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        self.assertEqual(set(live.collected()), {"one"})
+        self.assertEqual(live.collected(), _helper.LIVE_COMMANDS.collect())
+
+    def test_unchanged(self):
+        """Without changes, nothing is imported again"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        with mock.patch.object(api, "_import", side_effect=AssertionError):
+            changes = live.refresh()
+        self.assertFalse(changes)
+        self.assertEqual(changes, api.Changes())
+
+    def test_changed(self):
+        """Changed modules are reloaded"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        [before] = live.collected()["one"]
+        self._write("first", "one", "two")
+        self._write("second", "three")
+        changes = live.refresh()
+        self.assertEqual(changes, api.Changes(added=["two", "three"], changed=["one"]))
+        [after] = live.collected()["one"]
+        self.assertIsNot(before, after)
+
+    def test_reloaded_table(self):
+        """Reloading a module starts its registration table again"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        module = sys.modules["gather_live_plugins.first"]
+        # As if the previous version registered in a class body
+        vars(module)[api._TABLE].complete = False
+        self._write("first", "one", "two")
+        live.refresh()
+        table = vars(module)[api._TABLE]
+        self.assertTrue(table.complete)
+        self.assertEqual(len(table.records), 2)
+
+    def test_removed(self):
+        """Registrations of removed modules are dropped"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        (self.package / "first.py").unlink()
+        changes = live.refresh()
+        self.assertEqual(changes, api.Changes(removed=["one"]))
+        self.assertNotIn("gather_live_plugins.first", sys.modules)
+        self.assertIsNone(api._signature(self.package / "first.py"))
+
+    def test_import_error(self):
+        """Modules that cannot be imported are tried again when they change"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        (self.package / "broken.py").write_text("import gather_no_such_module\n")
+        self.assertFalse(live.refresh())
+        self._write("broken", "fixed")
+        self.assertEqual(live.refresh(), api.Changes(added=["fixed"]))
+
+    def test_broken_edit(self):
+        """Modules that fail when reloaded keep their registrations"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        path = self.package / "first.py"
+        _write_module(path, "def one(:\n", 2)
+        self.assertFalse(live.refresh())
+        self.assertEqual(set(live.collected()), {"one"})
+        _write_module(path, "raise RuntimeError('half-edited')\n", 3)
+        self.assertFalse(live.refresh())
+        self._write("first", "one", "two", "three")
+        changes = live.refresh()
+        self.assertEqual(changes, api.Changes(added=["two", "three"], changed=["one"]))
+
+    def test_watch(self):
+        """Watching yields the changes"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        for inotify in [True, False]:
+            with self.subTest(inotify=inotify):
+                name = f"inotify_{inotify}".lower()
+                self._write(name, name)
+                changes = next(live.watch(interval=0.01, inotify=inotify))
+                self.assertEqual(changes, api.Changes(added=[name]))
+
+    def test_watch_quiet(self):
+        """Watching does not yield when nothing changed"""
+        live = _helper.LIVE_COMMANDS.incremental()
+        results = [api.Changes(), api.Changes(removed=["one"])]
+        with mock.patch.object(live, "refresh", side_effect=results):
+            changes = next(live.watch(interval=0.01, inotify=False))
+        self.assertEqual(changes, results[1])
+
+
+_PRUNED_PLUGIN = """\
+from gather.tests._helper import (
+    DESCENDING_COMMANDS,
+    INCLUDED_COMMANDS,
+    PRUNED_COMMANDS,
+)
+
+"""
+
+_PRUNED_REGISTRATION = """
+
+@DESCENDING_COMMANDS.register()
+@INCLUDED_COMMANDS.register()
+@PRUNED_COMMANDS.register()
+def {name}():
+    pass
+"""
+
+_IMPORTED = 'raise RuntimeError("should not be imported")\n'
+
+
+class PruneTest(unittest.TestCase):
+
+    """Tests for not scanning some modules"""
+
+    def setUp(self):
+        """Create a plugin package, with tests, under an entry point"""
+        self.root = _plugin_directory(self)
+        self.index = self.root / "index.json"
+        package = self.root / "gather_pruned_plugins"
+        for subpackage in ["", "sub", "tests"]:
+            (package / subpackage).mkdir(exist_ok=True)
+            (package / subpackage / "__init__.py").write_text("")
+        self._write("commands.py", "command")
+        self._write("sub/deep.py", "deep")
+        self._write("tests/test_commands.py", _IMPORTED)
+        (package / "broken.py").write_text("raise ImportError('missing')\n")
+        self.addCleanup(_forget, "gather_pruned_plugins")
+        self.addCleanup(gather.invalidate_cache)
+        gather.invalidate_cache()
+        self._entry_point()
+
+    def _entry_point(self, **patterns):
+        _patch_entry_point(
+            self, "gather-pruned-plugins", "gather_pruned_plugins", **patterns
+        )
+
+    def _write(self, path, *names):
+        content = "".join(
+            name if name == _IMPORTED else _PRUNED_REGISTRATION.format(name=name)
+            for name in names
+        )
+        _write_module(
+            self.root / "gather_pruned_plugins" / path,
+            _PRUNED_PLUGIN + content,
+            len(names),
+        )
+
+    def test_exclude(self):
+        """Excluded packages are not imported"""
+        expected = {"command", "deep"}
+        self.assertEqual(set(_helper.PRUNED_COMMANDS.collect(workers=2)), expected)
+        self.assertEqual(
+            set(_helper.PRUNED_COMMANDS.collect(index=self.index)), expected
+        )
+        live = _helper.PRUNED_COMMANDS.incremental()
+        self.assertEqual(set(live.collected()), expected)
+        self.assertNotIn("gather_pruned_plugins.tests", sys.modules)
+
+    def test_include(self):
+        """Only included modules are scanned"""
+        self.assertEqual(set(_helper.INCLUDED_COMMANDS.collect()), {"deep"})
+        self.assertNotIn("gather_pruned_plugins.commands", sys.modules)
+
+    def test_metadata(self):
+        """Distributions can exclude their own modules"""
+        self._entry_point(exclude=["gather_pruned_plugins.tests"])
+        collected = _helper.DESCENDING_COMMANDS.collect(index=self.index)
+        self.assertEqual(set(collected), {"command", "deep"})
+        self.assertNotIn("gather_pruned_plugins.tests", sys.modules)
+
+    def test_descend(self):
+        """Rebuilding an index only descends where registrations were"""
+        self._write("tests/test_commands.py")
+        collected = _helper.DESCENDING_COMMANDS.collect(index=self.index)
+        self.assertEqual(set(collected), {"command", "deep"})
+        _forget("gather_pruned_plugins")
+        self._write("tests/test_commands.py", _IMPORTED)
+        self._write("sub/deep.py", "deep", "deeper")
+        self._write("other.py", "other")
+        collected = _helper.DESCENDING_COMMANDS.collect(index=self.index)
+        self.assertEqual(set(collected), {"command", "deep", "deeper", "other"})
+        self.assertNotIn("gather_pruned_plugins.tests", sys.modules)
+
+    def test_descend_new_package(self):
+        """Rebuilding an index descends into packages it did not know about"""
+        self._write("tests/test_commands.py")
+        _helper.DESCENDING_COMMANDS.collect(index=self.index)
+        _forget("gather_pruned_plugins")
+        self._write("tests/test_commands.py", _IMPORTED)
+        fresh = self.root / "gather_pruned_plugins" / "fresh"
+        fresh.mkdir()
+        (fresh / "__init__.py").write_text("")
+        self._write("fresh/plugin.py", "fresh")
+        collected = _helper.DESCENDING_COMMANDS.collect(index=self.index)
+        self.assertEqual(set(collected), {"command", "deep", "fresh"})
+        self.assertNotIn("gather_pruned_plugins.tests", sys.modules)
+
+    def test_descend_requires_index(self):
+        """Indexed descent needs an index"""
+        with self.assertRaises(ValueError):
+            _helper.DESCENDING_COMMANDS.collect()
+
+
+class RegistryTest(unittest.TestCase):
+
+    """Tests for the compact registry"""
+
+    def test_same(self):
+        """A compact collection is equal to the default one"""
+        compact = MAIN_COMMANDS.collect(compact=True)
+        self.assertIsInstance(compact, api.Registry)
+        self.assertEqual(compact, MAIN_COMMANDS.collect())
+        self.assertEqual(list(compact), sorted(compact))
+        self.assertEqual(len(COLLIDING_COMMANDS.collect(compact=True)["weird_name"]), 3)
+
+    def test_lookup(self):
+        """Looking up names that are not registered fails"""
+        registry = api.Registry.from_mapping(dict(b={1}, d={2, 3}, e=set()))
+        self.assertEqual(registry["d"], {2, 3})
+        self.assertEqual(registry._values, (1, 2, 3))
+        for name in ["a", "c", "e", "z", 5]:
+            with self.subTest(name=name):
+                self.assertNotIn(name, registry)
+                with self.assertRaises(KeyError):
+                    registry[name]
+        self.assertEqual(
+            repr(registry), "Registry({'b': frozenset({1}), 'd': frozenset({2, 3})})"
+        )
+
+    def test_pairs(self):
+        """Registries group registrations by name"""
+        registry = api.Registry.from_pairs([("b", 1), ("a", 2), ("b", 3), ("b", 1)])
+        self.assertEqual(registry, dict(a={2}, b={1, 3}))
+        self.assertEqual(list(registry), ["a", "b"])
+
+    def test_immutable(self):
+        """Registries cannot be changed"""
+        registry = MAIN_COMMANDS.collect(compact=True)
+        with self.assertRaises(TypeError):
+            registry["main1"] = {None}
+        with self.assertRaises(attr.exceptions.FrozenInstanceError):
+            registry._names = ()
+
+    def test_unique(self):
+        """Unique views share the registry's values"""
+        registry = MAIN_COMMANDS.collect(compact=True)
+        view = unique(registry)
+        self.assertIs(view["main1"], main1)
+        self.assertEqual(view, unique(MAIN_COMMANDS.collect()))
+        self.assertEqual(len(view), len(registry))
+        self.assertNotIn("baz", view)
+        self.assertIn("'main1'", repr(view))
+        with self.assertRaises(ValueError):
+            unique(COLLIDING_COMMANDS.collect(compact=True))
+
+    def test_pickle(self):
+        """Registries can be pickled"""
+        registry = TRANSFORM_COMMANDS.collect(compact=True)
+        self.assertEqual(pickle.loads(pickle.dumps(registry)), registry)
+
+
+class PrecompiledTest(unittest.TestCase):
+
+    """Tests for loading a precompiled registry instead of scanning"""
+
+    def setUp(self):
+        """Build a registry"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name) / "registry.pickle"
+        gather.__main__.main(["gather", "build-index", os.fspath(self.path)])
+        self.scanned = MAIN_COMMANDS.collect()
+        patcher = mock.patch.dict(os.environ, GATHER_REGISTRY=os.fspath(self.path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _not_scanning(self):
+        return mock.patch.object(api, "_scan_roots", side_effect=AssertionError)
+
+    def test_same_as_scanning(self):
+        """Loading gives the same registrations, without scanning"""
+        with self._not_scanning():
+            collected = MAIN_COMMANDS.collect()
+            transformed = unique(TRANSFORM_COMMANDS.collect())
+        self.assertEqual(collected, self.scanned)
+        self.assertIs(unique(collected)["main1"], main1)
+        self.assertEqual(transformed["fooish"], gather.Wrapper(fooish, 5))
+
+    def test_lazy(self):
+        """Lazy values are unpickled when used"""
+        with self._not_scanning():
+            collected = unique(TRANSFORM_COMMANDS.collect(lazy=True))
+        value = collected["fooish"]
+        self.assertIsInstance(value, api.LazyRegistration)
+        with mock.patch.object(api, "_import", side_effect=AssertionError):
+            self.assertEqual(value.extra, 5)
+
+    def test_unpicklable(self):
+        """Modules whose values cannot be pickled are scanned"""
+        with self._not_scanning():
+            collected = unique(UNPICKLABLE_COMMANDS.collect())
+        self.assertIs(collected["unpicklable1"](), unpicklable1)
+
+    def test_unknown_collector(self):
+        """Modules with registrations for unknown collectors are scanned"""
+        with self._not_scanning():
+            collected = unique(_helper.HIDDEN_COMMANDS[0].collect(lazy=True))
+        self.assertIs(collected["hidden"], _helper.hidden)
+
+    def test_stale(self):
+        """A stale registry is ignored"""
+        with mock.patch.object(_index, "fingerprint", return_value="changed"):
+            with mock.patch.object(
+                api, "_scan_roots", wraps=api._scan_roots
+            ) as scan_roots:
+                collected = unique(MAIN_COMMANDS.collect())
+        scan_roots.assert_called_once()
+        self.assertIs(collected["main1"], main1)
+
+
+def _venusian_collect(collector, module):
+    registry = collections.defaultdict(set)
+    venusian.Scanner(registry=registry, tag=collector).scan(module)
+    return registry
+
+
+def _table_collect(collector, module):
+    registry = collections.defaultdict(set)
+    api._scan_module(venusian.Scanner(registry=registry, tag=collector), module)
+    return registry
+
+
+class TableTest(unittest.TestCase):
+
+    """Tests for reading the registrations recorded when decorating"""
+
+    def setUp(self):
+        """Make a directory for plugin modules"""
+        self.directory = _plugin_directory(self)
+
+    def _module(self, name, source, *, filename=None):
+        filename = filename or f"{name}.py"
+        (self.directory / filename).write_text(
+            "from gather.tests._helper import LIVE_COMMANDS\n\n" + source
+        )
+        self.addCleanup(sys.modules.pop, name, None)
+        return importlib.import_module(name)
+
+    def test_not_walked(self):
+        """Modules are not walked by venusian"""
+        gather.invalidate_cache()
+        with mock.patch.object(venusian.Scanner, "scan", side_effect=AssertionError):
+            collected = unique(MAIN_COMMANDS.collect())
+        self.assertIs(collected["main1"], main1)
+
+    def test_alias(self):
+        """Every attribute that is a registered object is collected"""
+        module = self._module(
+            "gather_table_alias",
+            "@LIVE_COMMANDS.register()\ndef original():\n    pass\n\nalias = original\n",
+        )
+        collected = _table_collect(_helper.LIVE_COMMANDS, module)
+        self.assertEqual(
+            collected,
+            {"original": {module.original}, "alias": {module.original}},
+        )
+
+    def test_class_scope(self):
+        """Registrations in class bodies are found by venusian"""
+        module = self._module(
+            "gather_table_class",
+            "class Holder:\n"
+            "    @LIVE_COMMANDS.register()\n"
+            "    def method(self):\n"
+            "        pass\n",
+        )
+        self.assertFalse(api._complete(module))
+        collected = _table_collect(_helper.LIVE_COMMANDS, module)
+        self.assertEqual(collected, {"Holder": {module.Holder}})
+        self.assertEqual(collected, _venusian_collect(_helper.LIVE_COMMANDS, module))
+        lazy = api.LazyRegistration(
+            collector=_helper.LIVE_COMMANDS,
+            name="Holder",
+            module=module.__name__,
+            attribute="Holder",
+        )
+        self.assertIs(lazy.resolve(), module.Holder)
+
+    def test_mixed(self):
+        """Scanning with venusian keeps the top-level registrations"""
+        module = self._module(
+            "gather_table_mixed",
+            "@LIVE_COMMANDS.register()\n"
+            "def top():\n"
+            "    pass\n\n"
+            "class Holder:\n"
+            "    @LIVE_COMMANDS.register(name='inner')\n"
+            "    def method(self):\n"
+            "        pass\n",
+        )
+        collected = _table_collect(_helper.LIVE_COMMANDS, module)
+        self.assertEqual(collected, {"top": {module.top}, "inner": {module.Holder}})
+        lazy = api.LazyRegistration(
+            collector=_helper.LIVE_COMMANDS,
+            name="top",
+            module=module.__name__,
+            attribute="top",
+        )
+        self.assertIs(lazy.resolve(), module.top)
+
+    def test_package(self):
+        """Scanning a package with venusian does not scan its submodules"""
+        package = self.directory / "gather_table_package"
+        package.mkdir()
+        (package / "sub.py").write_text(
+            "from gather.tests._helper import LIVE_COMMANDS\n\n"
+            "@LIVE_COMMANDS.register()\n"
+            "def sub():\n"
+            "    pass\n"
+        )
+        module = self._module(
+            "gather_table_package",
+            "class Holder:\n"
+            "    @LIVE_COMMANDS.register()\n"
+            "    def method(self):\n"
+            "        pass\n",
+            filename="gather_table_package/__init__.py",
+        )
+        self.addCleanup(sys.modules.pop, "gather_table_package.sub", None)
+        importlib.import_module("gather_table_package.sub")
+        collected = _table_collect(_helper.LIVE_COMMANDS, module)
+        self.assertEqual(set(collected), {"Holder"})
+
+    def test_reload(self):
+        """Objects replaced by reloading are not collected"""
+        module = self._module(
+            "gather_table_reload",
+            "@LIVE_COMMANDS.register()\ndef plugin():\n    pass\n",
+        )
+        module = importlib.reload(module)
+        [value] = _table_collect(_helper.LIVE_COMMANDS, module)["plugin"]
+        self.assertIs(value, module.plugin)
@@ -1,6 +1,7 @@
 """Test command dispatch"""
 
 import argparse
+import asyncio
 import contextlib
 import io
 import pathlib
@@ -20,6 +21,8 @@ from hamcrest import (
     string_contains_in_order,
     contains_string,
     calling,
+    equal_to,
+    instance_of,
     raises,
 )
 
@@ -79,6 +82,66 @@ def _write_safely(args):
     args.safe_run([sys.executable, "-c", code, safe])
 
 
+@MAYBE_DRY_REGISTER(
+    add_argument("--no-dry-run", action="store_true", default=False),
+    add_argument("--output-dir", required=True),
+    name="write-many",
+)
+def _write_many(args):
+    output_dir = pathlib.Path(args.output_dir)
+    code = "import pathlib, sys; pathlib.Path(sys.argv[1]).write_text('2')"
+    args.run_many(
+        [[sys.executable, "-c", code, output_dir / name] for name in "abc"],
+        max_workers=2,
+    )
+
+
+ASYNC_COMMANDS_COLLECTOR = gather.Collector()
+
+ASYNC_REGISTER = commands.make_command_register(ASYNC_COMMANDS_COLLECTOR)
+
+
+@ASYNC_REGISTER(
+    add_argument("--no-dry-run", action="store_true", default=False),
+    add_argument("--output-dir", required=True),
+    name="write-concurrently",
+)
+async def _write_concurrently(args):
+    output_dir = pathlib.Path(args.output_dir)
+    code = "import pathlib, sys; pathlib.Path(sys.argv[1]).write_text('2')"
+    results = await asyncio.gather(
+        args.async_run([sys.executable, "-c", code, output_dir / "unsafe.txt"]),
+        args.async_safe_run([sys.executable, "-c", code, output_dir / "safe.txt"]),
+    )
+    return [result.returncode for result in results]
+
+
+@ASYNC_REGISTER(name="async-plain")
+async def _async_plain(*, args, env, run):
+    return env["SHELL"]
+
+
+BATCH_COMMANDS_COLLECTOR = gather.Collector()
+
+BATCH_REGISTER = commands.make_command_register(BATCH_COMMANDS_COLLECTOR)
+
+RECORDED = []
+
+
+@BATCH_REGISTER(
+    add_argument("--code", type=int, default=0),
+    add_argument("--message"),
+    name="exit-with",
+)
+def _exit_with(args):
+    raise SystemExit(args.message or args.code)
+
+
+@BATCH_REGISTER(add_argument("--value"), name="record")
+def _record(args):
+    RECORDED.append(args.value)
+
+
 class CommandTest(unittest.TestCase):
 
     """Test command dispatch"""
@@ -117,6 +180,36 @@ class CommandTest(unittest.TestCase):
             ),
         )
 
+    def test_lazy_command(self):
+        """Lazily collected commands are only resolved when selected"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            collected = COMMANDS_COLLECTOR.collect(
+                index=pathlib.Path(tmp_dir) / "index.json", lazy=True
+            )
+        parser = commands.set_parser(collected=collected)
+        commands.run(
+            parser=parser,
+            argv=["command", "do-something"],
+            env=dict(SHELL="some-shell"),
+            sp_run=self.fake_run,
+        )
+        output = self.fake_stdout.getvalue()
+        assert_that(output, string_contains_in_order("do-something", "some-shell"))
+        [other] = collected["do-something-else"]
+        assert_that(other._resolved, equal_to({}))
+
+    def test_compact(self):
+        """Commands can be collected into a compact registry"""
+        parser = commands.set_parser(collected=COMMANDS_COLLECTOR.collect(compact=True))
+        commands.run(
+            parser=parser,
+            argv=["command", "do-something"],
+            env=dict(SHELL="some-shell"),
+            sp_run=self.fake_run,
+        )
+        output = self.fake_stdout.getvalue()
+        assert_that(output, string_contains_in_order("do-something", "some-shell"))
+
     def test_custom_parser(self):
         """Custom help message is printed out"""
         parser = commands.set_parser(
@@ -230,6 +323,26 @@ class CommandMaybeDryTest(unittest.TestCase):
                 raises(subprocess.CalledProcessError),
             )
 
+    def test_run_many(self):
+        """Running many processes respects dry runs"""
+        parser = commands.set_parser(collected=MAYBE_DRY_COMMANDS_COLLECTOR.collect())
+        for extra_args, expected in [([], []), (["--no-dry-run"], ["a", "b", "c"])]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                commands.run_maybe_dry(
+                    parser=parser,
+                    argv=[
+                        "command",
+                        "write-many",
+                        "--output-dir",
+                        tmp_dir,
+                        *extra_args,
+                    ],
+                    env={},
+                    sp_run=subprocess.run,
+                )
+                names = sorted(child.name for child in pathlib.Path(tmp_dir).iterdir())
+            assert_that(names, equal_to(expected))
+
     def test_with_subcommand(self):
         """Test running command as subcommand"""
         parser = commands.set_parser(collected=MAYBE_DRY_COMMANDS_COLLECTOR.collect())
@@ -282,3 +395,221 @@ class CommandMaybeDryTest(unittest.TestCase):
                 has_entry("safe.txt", "2"),
             ),
         )
+
+
+class AsyncCommandTest(unittest.TestCase):
+
+    """Test dispatching to async commands"""
+
+    def _write(self, *extra_args):
+        parser = commands.set_parser(collected=ASYNC_COMMANDS_COLLECTOR.collect())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = commands.run_maybe_dry(
+                parser=parser,
+                argv=[
+                    "command",
+                    "write-concurrently",
+                    "--output-dir",
+                    tmp_dir,
+                    *extra_args,
+                ],
+                env={},
+            )
+            contents = {
+                child.name: child.read_text()
+                for child in pathlib.Path(tmp_dir).iterdir()
+            }
+        return result, contents
+
+    def test_with_dry(self):
+        """Async commands run on an event loop, and respect dry runs"""
+        result, contents = self._write()
+        assert_that(result, equal_to([0, 0]))
+        assert_that(
+            contents,
+            all_of(
+                not_(has_key("unsafe.txt")),
+                has_entry("safe.txt", "2"),
+            ),
+        )
+
+    def test_with_no_dry(self):
+        """Async commands run everything when not a dry run"""
+        _result, contents = self._write("--no-dry-run")
+        assert_that(
+            contents,
+            all_of(
+                has_entry("unsafe.txt", "2"),
+                has_entry("safe.txt", "2"),
+            ),
+        )
+
+    def test_run(self):
+        """Async commands can be run with the environment and runner"""
+        parser = commands.set_parser(collected=ASYNC_COMMANDS_COLLECTOR.collect())
+        result = commands.run(
+            parser=parser,
+            argv=["command", "async-plain"],
+            env=dict(SHELL="some-shell"),
+        )
+        assert_that(result, equal_to("some-shell"))
+
+
+def _subparsers_action(parser):
+    [action] = [
+        action
+        for action in parser._actions
+        if isinstance(action, argparse._SubParsersAction)
+    ]
+    return action
+
+
+class LazySubParsersTest(unittest.TestCase):
+
+    """Test deferring sub-parser creation"""
+
+    def test_deferred(self):
+        """Only the selected sub-parser is created"""
+        parser = commands.set_parser(collected=COMMANDS_COLLECTOR.collect())
+        parser_map = _subparsers_action(parser)._name_parser_map
+        parser.parse_args(["do-something", "--value", "5"])
+        assert_that(
+            dict.__getitem__(parser_map, "do-something"),
+            instance_of(argparse.ArgumentParser),
+        )
+        assert_that(
+            dict.__getitem__(parser_map, "do-something-else"),
+            not_(instance_of(argparse.ArgumentParser)),
+        )
+
+    def test_same_help(self):
+        """Help is the same as with sub-parsers created up front"""
+        expected = argparse.ArgumentParser(prog="command")
+        subparsers = expected.add_subparsers()
+        subparsers.add_parser("do-something").add_argument(
+            "--value", default="default-value"
+        )
+        subparsers.add_parser("do-something-else").add_argument(
+            "--no-dry-run", action="store_true"
+        )
+        parser = commands.set_parser(
+            collected=COMMANDS_COLLECTOR.collect(),
+            parser=argparse.ArgumentParser(prog="command"),
+        )
+        assert_that(parser.format_help(), equal_to(expected.format_help()))
+        expected_map = _subparsers_action(expected)._name_parser_map
+        parser_map = _subparsers_action(parser)._name_parser_map
+        assert_that(
+            [subparser.format_help() for subparser in parser_map.values()],
+            equal_to([subparser.format_help() for subparser in expected_map.values()]),
+        )
+        assert_that(
+            [name for name, _subparser in parser_map.items()],
+            equal_to(list(expected_map)),
+        )
+        assert_that(parser_map.get("nothing"), equal_to(None))
+        assert_that(parser_map.get("do-something"), not_(equal_to(None)))
+
+    def test_add_lazy_parser(self):
+        """Deferred sub-parsers can have help, and cannot conflict"""
+        parser = argparse.ArgumentParser(prog="command")
+        subparsers = parser.add_subparsers(action=commands._LazySubParsersAction)
+        subparsers.add_lazy_parser("thing", lambda _parser: None, help="a thing")
+        assert_that(parser.format_help(), contains_string("a thing"))
+        assert_that(
+            calling(subparsers.add_lazy_parser).with_args(
+                "thing", lambda _parser: None
+            ),
+            raises(argparse.ArgumentError),
+        )
+        assert_that(parser.parse_args(["thing"]), equal_to(argparse.Namespace()))
+        subparsers.add_lazy_parser("other", lambda _parser: None, prog="custom")
+        assert_that(subparsers._name_parser_map["other"].prog, equal_to("custom"))
+
+
+class ExitCodeTest(unittest.TestCase):
+
+    """Tests for computing exit codes"""
+
+    def test_success(self):
+        """Returning exits with 0"""
+        assert_that(commands.exit_code(lambda: None), equal_to(0))
+
+    def test_system_exit(self):
+        """SystemExit codes are kept, None is success"""
+        for code, expected in [(None, 0), (0, 0), (3, 3)]:
+            with self.subTest(code=code):
+                assert_that(
+                    commands.exit_code(mock.Mock(side_effect=SystemExit(code))),
+                    equal_to(expected),
+                )
+
+    def test_message(self):
+        """A SystemExit message is printed, and exits with 1"""
+        with mock.patch("sys.stderr", new=io.StringIO()) as stderr:
+            code = commands.exit_code(mock.Mock(side_effect=SystemExit("bad")))
+        assert_that(code, equal_to(1))
+        assert_that(stderr.getvalue(), contains_string("bad"))
+
+    def test_exception(self):
+        """Other exceptions print a traceback, and exit with 1"""
+        with mock.patch("sys.stderr", new=io.StringIO()) as stderr:
+            code = commands.exit_code(mock.Mock(side_effect=RuntimeError("boom")))
+        assert_that(code, equal_to(1))
+        assert_that(stderr.getvalue(), contains_string("RuntimeError: boom"))
+
+
+class PrebuildTest(unittest.TestCase):
+
+    """Tests for creating the sub-parsers ahead of time"""
+
+    def test_prebuild(self):
+        """Every deferred sub-parser is created"""
+        parser = commands.set_parser(collected=COMMANDS_COLLECTOR.collect())
+        commands.prebuild(parser)
+        for value in dict.values(_subparsers_action(parser).choices):
+            assert_that(isinstance(value, argparse.ArgumentParser), equal_to(True))
+
+
+class BatchTest(unittest.TestCase):
+
+    """Test running a batch of command lines"""
+
+    lines = [
+        "# comment\n",
+        "exit-with --code 3\n",
+        "\n",
+        "record --value 'two words'\n",
+        "exit-with --message bad\n",
+        "nothing\n",
+    ]
+
+    def setUp(self):
+        """Collect the commands, and keep their output"""
+        self.parser = commands.set_parser(collected=BATCH_COMMANDS_COLLECTOR.collect())
+        RECORDED.clear()
+        stderr = mock.patch("sys.stderr", new=io.StringIO())
+        self.stderr = stderr.start()
+        self.addCleanup(stderr.stop)
+
+    def _run(self, **kwargs):
+        return [
+            (result.line_number, result.exit_code)
+            for result in commands.run_batch(
+                parser=self.parser, lines=self.lines, env={}, **kwargs
+            )
+        ]
+
+    def test_batch(self):
+        """Every line runs, and has its exit code"""
+        assert_that(self._run(), equal_to([(2, 3), (4, 0), (5, 1), (6, 2)]))
+        assert_that(RECORDED, equal_to(["two words"]))
+        assert_that(self.stderr.getvalue(), contains_string("bad"))
+
+    def test_workers(self):
+        """Lines can run concurrently, and are reported in order"""
+        assert_that(
+            self._run(workers=4, prefix="command"),
+            equal_to([(2, 3), (4, 0), (5, 1), (6, 2)]),
+        )
+        assert_that(RECORDED, equal_to(["two words"]))
@@ -0,0 +1,202 @@
+"""Test shell completion"""
+import argparse
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    contains_string,
+    empty,
+    equal_to,
+    none,
+)
+
+from .. import _completion
+
+COMMANDS = dict(
+    copy=_completion.Command(
+        name="copy",
+        module="plugin",
+        attribute="copy",
+        arguments=(
+            _completion.Argument(options=("-h", "--help"), takes_value=False),
+            _completion.Argument(options=("--target",), takes_value=True),
+            _completion.Argument(
+                options=(), takes_value=True, choices=("fast", "slow")
+            ),
+            _completion.Argument(options=(), takes_value=True, dynamic=True),
+        ),
+    ),
+    compare=_completion.Command(
+        name="compare", module="plugin", attribute="compare", arguments=()
+    ),
+)
+
+
+def _never(command, options):
+    raise AssertionError("resolved", command, options)
+
+
+def _dynamic(command, options):
+    return ["from-" + command.name]
+
+
+class CompleteTest(unittest.TestCase):
+
+    """Tests for completing words"""
+
+    def test_names(self):
+        """The first word completes to sub-command names"""
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "co"], _never),
+            contains_exactly("compare", "copy"),
+        )
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "cop"], _never),
+            contains_exactly("copy"),
+        )
+
+    def test_unknown(self):
+        """Unknown sub-commands complete to nothing"""
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "move", "--"], _never), empty()
+        )
+
+    def test_options(self):
+        """Options complete to option strings"""
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "copy", "--"], _never),
+            contains_exactly("--help", "--target"),
+        )
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "copy", "--help="], _never),
+            empty(),
+        )
+
+    def test_no_choices(self):
+        """Values without choices complete to nothing"""
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "copy", "--target", ""], _never),
+            empty(),
+        )
+
+    def test_positional(self):
+        """Positional arguments complete to their choices"""
+        assert_that(
+            _completion.complete(COMMANDS, ["prog", "copy", ""], _dynamic),
+            contains_exactly("fast", "slow", "from-copy"),
+        )
+
+
+class DescribeTest(unittest.TestCase):
+
+    """Tests for describing sub-commands"""
+
+    def test_describe(self):
+        """Plain choices are kept, others are dynamic"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--count", choices=range(3))
+        parser.add_argument("--path", choices=iter(["a"]))
+        parser.add_argument("name")
+        command = _completion.describe(
+            "copy", parser, module=__name__, attribute="_dynamic"
+        )
+        assert_that(
+            command,
+            equal_to(
+                _completion.Command(
+                    name="copy",
+                    module=__name__,
+                    attribute="_dynamic",
+                    arguments=(
+                        _completion.Argument(
+                            options=("-h", "--help"), takes_value=False
+                        ),
+                        _completion.Argument(
+                            options=("--count",),
+                            takes_value=True,
+                            choices=("0", "1", "2"),
+                        ),
+                        _completion.Argument(
+                            options=("--path",), takes_value=True, dynamic=True
+                        ),
+                        _completion.Argument(options=(), takes_value=True),
+                    ),
+                )
+            ),
+        )
+
+    def test_choices(self):
+        """Arguments without choices have none"""
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--count", choices=range(2))
+        assert_that(
+            _completion.choices(parser, ["--count"]), contains_exactly("0", "1")
+        )
+        assert_that(_completion.choices(parser, ["--help"]), empty())
+
+
+class CacheTest(unittest.TestCase):
+
+    """Tests for the completion cache"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name) / "sub" / "completion.json"
+
+    def _save(self, site="site", roots=("root",), fingerprint="root-files"):
+        _completion.save(
+            self.path,
+            COMMANDS.values(),
+            site=site,
+            roots=roots,
+            fingerprint=fingerprint,
+        )
+
+    def _load(self, site="site"):
+        return _completion.load(self.path, site, lambda roots: f"{roots[0]}-files")
+
+    def test_round_trip(self):
+        """Saved sub-commands are loaded back"""
+        self._save()
+        assert_that(self._load(), equal_to(COMMANDS))
+
+    def test_stale(self):
+        """Missing, broken or stale caches are not loaded"""
+        assert_that(self._load(), none())
+        self._save(fingerprint="old")
+        assert_that(self._load(), none())
+        self._save(roots=["other"])
+        assert_that(self._load(), none())
+        self._save()
+        assert_that(self._load(site="installed"), none())
+        self.path.write_text(json.dumps([]))
+        assert_that(self._load(), none())
+
+    def test_default_path(self):
+        """By default, the cache is in the user's cache directory"""
+        with mock.patch.dict(os.environ, XDG_CACHE_HOME="/cache"):
+            assert_that(
+                _completion.default_path("prog"),
+                equal_to(pathlib.Path("/cache/gather/prog-completion.json")),
+            )
+
+
+class ScriptTest(unittest.TestCase):
+
+    """Tests for the shell scripts"""
+
+    def test_zsh(self):
+        """Every console script gets a completion function"""
+        script = _completion.script(
+            "zsh", program="prog-complete", commands=["prog"], subcommands=["copy"]
+        )
+        assert_that(script, contains_string("compdef _gather_complete_prog prog\n"))
+        assert_that(script, contains_string("compdef _gather_complete_copy copy\n"))
+        assert_that(script, contains_string("prog-complete words --subcommand -- "))
@@ -1,14 +1,32 @@
 """Test entrypoint"""
+import functools
 import io
+import json
 import logging
+import os
+import pathlib
+import tempfile
 import unittest
 from unittest import mock
 
-from hamcrest import assert_that, calling, contains_string, equal_to, raises
+import attrs
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_exactly,
+    contains_inanyorder,
+    contains_string,
+    equal_to,
+    has_items,
+    has_key,
+    not_,
+    raises,
+)
 
-from .. import entry
+from .. import entry, _server
+from ..commands import add_argument
 
-ENTRY_DATA = entry.EntryData.create("test_dunder_main")
+ENTRY_DATA = entry.EntryData.create(__name__)
 
 
 @ENTRY_DATA.register(name="fake")
@@ -16,6 +34,48 @@ def _fake(args):
     print("hello")
 
 
+INDEXED_ENTRY_DATA = entry.EntryData.create(__name__)
+
+
+@INDEXED_ENTRY_DATA.register(name="fake")
+def _indexed_fake(args):
+    print("hello from the index")
+
+
+@INDEXED_ENTRY_DATA.register(name="other")
+def _other(args):
+    print("other")
+
+
+class _Colours:
+    """Choices that are only known when looked at"""
+
+    def __iter__(self):
+        return iter(["red", "green"])
+
+    def __contains__(self, value):
+        return value in list(self)
+
+
+COMPLETED_ENTRY_DATA = entry.EntryData.create(__name__)
+
+
+@COMPLETED_ENTRY_DATA.register(
+    add_argument("--level", choices=("low", "high")),
+    add_argument("--colour", choices=_Colours()),
+    add_argument("--verbose", action="store_true"),
+    name="paint",
+)
+def _paint(args):
+    print(args.level, args.colour)
+
+
+_repaint = COMPLETED_ENTRY_DATA.register(
+    add_argument("--colour", choices=_Colours()),
+    name="repaint",
+)(functools.partial(_paint))
+
+
 class DunderMainTest(unittest.TestCase):
 
     """Test dunder_main"""
@@ -52,9 +112,469 @@ class DunderMainTest(unittest.TestCase):
         )
         assert_that(fake_stdout.getvalue(), contains_string("hello"))
 
+    def test_trace(self):
+        """The GATHER_TRACE environment variable saves a trace"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "trace.json"
+            with mock.patch.dict("os.environ", GATHER_TRACE=str(path)):
+                entry.dunder_main(
+                    globals_dct=dict(__name__="__main__"),
+                    logger=logging.Logger("nonce"),
+                    command_data=ENTRY_DATA,
+                )
+            content = json.loads(path.read_text())
+        names = {event["name"] for event in content["traceEvents"]}
+        assert_that(names, has_items("set_parser", "parse_args", "fake"))
+
+    def test_trace_option(self):
+        """The entry data's trace path saves a trace"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "trace.json"
+            entry.dunder_main(
+                globals_dct=dict(__name__="__main__"),
+                logger=logging.Logger("nonce"),
+                command_data=attrs.evolve(ENTRY_DATA, trace=path),
+            )
+            content = json.loads(path.read_text())
+        assert_that(content["summary"]["phases"], has_key("command"))
+
+    def test_import_budget(self):
+        """The GATHER_IMPORT_BUDGET environment variable checks import costs"""
+        entry.api.invalidate_cache()
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        budget = "seconds=0,allocated=1e12,action=fail"
+        with mock.patch.dict("os.environ", GATHER_IMPORT_BUDGET=budget):
+            assert_that(
+                calling(entry.dunder_main).with_args(
+                    globals_dct=dict(__name__="__main__"),
+                    logger=logging.Logger("nonce"),
+                    command_data=ENTRY_DATA,
+                ),
+                raises(entry.api.ImportBudgetExceeded),
+            )
+
+    def test_import_budget_option(self):
+        """The entry data's import budget checks import costs"""
+        entry.api.invalidate_cache()
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        budget = entry.api.ImportBudget(seconds=0)
+        with self.assertWarns(entry.api.ImportBudgetWarning):
+            entry.dunder_main(
+                globals_dct=dict(__name__="__main__"),
+                logger=logging.Logger("nonce"),
+                command_data=attrs.evolve(ENTRY_DATA, import_budget=budget),
+            )
+
+    def test_forwarded(self):
+        """With a socket, commands are sent to the server"""
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        with mock.patch.object(_server, "forward", return_value=5) as forward:
+            assert_that(
+                calling(entry.dunder_main).with_args(
+                    globals_dct=dict(__name__="__main__", IS_SUBCOMMAND=True),
+                    logger=logging.Logger("nonce"),
+                    command_data=attrs.evolve(ENTRY_DATA, socket="server.sock"),
+                ),
+                raises(SystemExit, "5"),
+            )
+        [call] = forward.call_args_list
+        assert_that(call.args, contains_exactly("server.sock"))
+        assert_that(call.kwargs["is_subcommand"], equal_to(True))
+
+    def test_no_server(self):
+        """Without a running server, commands run locally"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        fake_stdout = mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            socket_path = str(pathlib.Path(tmp_dir) / "server.sock")
+            with mock.patch.dict("os.environ", GATHER_SOCKET=socket_path):
+                entry.dunder_main(
+                    globals_dct=dict(__name__="__main__"),
+                    logger=logging.Logger("nonce"),
+                    command_data=ENTRY_DATA,
+                )
+        assert_that(fake_stdout.getvalue(), contains_string("hello"))
+
+    def test_serve(self):
+        """The server command collects, builds the parser, and serves"""
+        with mock.patch.object(_server.Server, "serve") as serve:
+            entry.dunder_main(
+                globals_dct=dict(__name__="__main__", GATHER_SERVE=True),
+                logger=logging.Logger("nonce"),
+                command_data=attrs.evolve(ENTRY_DATA, socket="server.sock"),
+            )
+        serve.assert_called_once_with("server.sock")
+
+    def test_fork_server(self):
+        """The fork server command forks a child for each command"""
+        init = mock.patch.object(
+            _server.Server, "__init__", return_value=None, autospec=True
+        )
+        with init as fake_init, mock.patch.object(_server.Server, "serve"):
+            entry.dunder_main(
+                globals_dct=dict(__name__="__main__", GATHER_SERVE="fork"),
+                logger=logging.Logger("nonce"),
+                command_data=attrs.evolve(ENTRY_DATA, socket="server.sock"),
+            )
+        assert_that(fake_init.call_args.kwargs["fork"], equal_to(True))
+        ed = entry.EntryData.create("test_dunder_main")
+        assert_that(
+            ed.fork_server_command.args,
+            contains_exactly(ed, dict(GATHER_SERVE="fork")),
+        )
+
+    def test_serve_without_socket(self):
+        """The server needs a socket path"""
+        with mock.patch.dict("os.environ"):
+            os.environ.pop("GATHER_SOCKET", None)
+            assert_that(
+                calling(entry.dunder_main).with_args(
+                    globals_dct=dict(__name__="__main__", GATHER_SERVE=True),
+                    logger=logging.Logger("nonce"),
+                    command_data=ENTRY_DATA,
+                ),
+                raises(ValueError),
+            )
+
+    def test_server_command(self):
+        """The server command runs the package as a server"""
+        ed = entry.EntryData.create("test_dunder_main")
+        assert_that(
+            ed.server_command.args,
+            contains_exactly(ed, dict(GATHER_SERVE=True)),
+        )
+
+    def test_batch(self):
+        """The batch command runs every line of a file"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        fake_stdout = mock_output.start()
+        mock_error = mock.patch("sys.stderr", new=io.StringIO())
+        self.addCleanup(mock_error.stop)
+        fake_stderr = mock_error.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lines = pathlib.Path(tmp_dir) / "lines"
+            lines.write_text("fake\nfake\n")
+            with mock.patch("sys.argv", new=["batch", str(lines), "--workers", "2"]):
+                assert_that(
+                    calling(entry.dunder_main).with_args(
+                        globals_dct=dict(__name__="__main__", GATHER_BATCH=True),
+                        logger=logging.Logger("nonce"),
+                        command_data=ENTRY_DATA,
+                    ),
+                    raises(SystemExit, "^0$"),
+                )
+        assert_that(fake_stdout.getvalue(), equal_to("hello\nhello\n"))
+        assert_that(fake_stderr.getvalue(), equal_to("1\t0\tfake\n2\t0\tfake\n"))
+
+    def test_batch_not_forwarded(self):
+        """The batch command runs its lines itself, even with a server"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        fake_stdout = mock_output.start()
+        mock_error = mock.patch("sys.stderr", new=io.StringIO())
+        self.addCleanup(mock_error.stop)
+        mock_error.start()
+        forward = mock.patch.object(_server, "forward", return_value=3)
+        with forward as fake_forward, mock.patch("sys.argv", new=["batch"]), mock.patch(
+            "sys.stdin", new=io.StringIO("fake\n")
+        ):
+            assert_that(
+                calling(entry.dunder_main).with_args(
+                    globals_dct=dict(__name__="__main__", GATHER_BATCH=True),
+                    logger=logging.Logger("nonce"),
+                    command_data=attrs.evolve(ENTRY_DATA, socket="server.sock"),
+                ),
+                raises(SystemExit, "^0$"),
+            )
+        fake_forward.assert_not_called()
+        assert_that(fake_stdout.getvalue(), equal_to("hello\n"))
+
+    def test_batch_stdin(self):
+        """The batch command reads the standard input, and fails if a line fails"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        mock_output.start()
+        mock_error = mock.patch("sys.stderr", new=io.StringIO())
+        self.addCleanup(mock_error.stop)
+        fake_stderr = mock_error.start()
+        with mock.patch("sys.argv", new=["batch"]), mock.patch(
+            "sys.stdin", new=io.StringIO("fake\nunknown\n")
+        ):
+            assert_that(
+                calling(entry.dunder_main).with_args(
+                    globals_dct=dict(__name__="__main__", GATHER_BATCH=True),
+                    logger=logging.Logger("nonce"),
+                    command_data=ENTRY_DATA,
+                ),
+                raises(SystemExit, "^1$"),
+            )
+        assert_that(fake_stderr.getvalue(), contains_string("2\t2\tunknown\n"))
+        ed = entry.EntryData.create("test_dunder_main")
+        assert_that(
+            ed.batch_command.args,
+            contains_exactly(ed, dict(GATHER_BATCH=True)),
+        )
+
+    def test_console_scripts(self):
+        """Console scripts run the commands without running __main__ again"""
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        fake_stdout = mock_output.start()
+        root = logging.getLogger()
+        self.addCleanup(root.setLevel, root.level)
+        self.addCleanup(setattr, root, "handlers", list(root.handlers))
+        with mock.patch("runpy.run_module") as run_module:
+            with mock.patch("sys.argv", new=["/usr/bin/test-cli", "fake"]):
+                ENTRY_DATA.main_command()
+            with mock.patch("sys.argv", new=["/usr/bin/fake"]):
+                ENTRY_DATA.sub_command()
+        run_module.assert_not_called()
+        assert_that(fake_stdout.getvalue(), equal_to("hello\nhello\n"))
+
+    def test_console_scripts_evolve(self):
+        """Evolved entry data has console scripts running it"""
+        ed = attrs.evolve(ENTRY_DATA, socket="server.sock")
+        assert_that(ed.main_command.args, contains_exactly(ed, {}))
+        assert_that(ed, equal_to(attrs.evolve(ENTRY_DATA, socket="server.sock")))
+        assert_that(repr(ed), not_(contains_string("main_command")))
+
+    def test_console_scripts_deprecated(self):
+        """Console scripts passed to the constructor are ignored, with a warning"""
+        fields = (ENTRY_DATA.prefix, ENTRY_DATA.collector, ENTRY_DATA.register)
+        for args, kwargs in [
+            ((*fields, print, print), {}),
+            (fields, dict(main_command=print)),
+            (fields, dict(sub_command=print, socket="server.sock")),
+        ]:
+            with self.subTest(kwargs=kwargs):
+                with self.assertWarns(DeprecationWarning):
+                    ed = entry.EntryData(*args, **kwargs)
+                assert_that(ed.main_command.args, contains_exactly(ed, {}))
+                assert_that(ed.sub_command.args[0], equal_to(ed))
+
     def test_with_prefix(self):
         """
         An explicit prefix overrides the default
         """
         ed = entry.EntryData.create("test_dunder_main", prefix="thing")
         assert_that(ed.prefix, equal_to("thing"))
+
+    def test_default_only(self):
+        """By default, the package and the plugins that target it are scanned"""
+        ed = entry.EntryData.create("test_dunder_main")
+        assert_that(
+            ed.collector.only,
+            equal_to(
+                entry.api.Only(
+                    packages=["test_dunder_main"], entry_points=["test_dunder_main"]
+                )
+            ),
+        )
+
+    def test_scan_everything(self):
+        """Passing only=None scans every entry point"""
+        ed = entry.EntryData.create("test_dunder_main", only=None)
+        assert_that(ed.collector.only, equal_to(None))
+
+    def test_run_selected_command(self):
+        """
+        With an index, only the selected command's sub-parser is built
+        """
+        logger = logging.Logger("nonce")
+        mock_output = mock.patch("sys.stdout", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        fake_stdout = mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        set_parser = mock.patch.object(
+            entry.commandslib,
+            "set_parser",
+            wraps=entry.commandslib.set_parser,
+        )
+        self.addCleanup(set_parser.stop)
+        fake_set_parser = set_parser.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            command_data = attrs.evolve(
+                INDEXED_ENTRY_DATA, index=pathlib.Path(tmp_dir) / "index.json"
+            )
+            entry.dunder_main(
+                globals_dct=dict(__name__="__main__"),
+                logger=logger,
+                command_data=command_data,
+            )
+        assert_that(fake_stdout.getvalue(), contains_string("hello from the index"))
+        [call] = fake_set_parser.call_args_list
+        collected = call.kwargs["collected"]
+        assert_that(collected.keys(), contains_inanyorder("fake", "other"))
+        [other] = collected["other"]
+        assert_that(other._resolved, equal_to({}))
+
+    def test_usage_lists_commands(self):
+        """
+        With an index, errors in a selected command still list every command
+        """
+        mock_output = mock.patch("sys.stderr", new=io.StringIO())
+        self.addCleanup(mock_output.stop)
+        fake_stderr = mock_output.start()
+        mock_args = mock.patch("sys.argv", new=["test", "fake", "--no-such-option"])
+        self.addCleanup(mock_args.stop)
+        mock_args.start()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            command_data = attrs.evolve(
+                INDEXED_ENTRY_DATA, index=pathlib.Path(tmp_dir) / "index.json"
+            )
+            assert_that(
+                calling(entry.dunder_main).with_args(
+                    globals_dct=dict(__name__="__main__"),
+                    logger=logging.Logger("nonce"),
+                    command_data=command_data,
+                ),
+                raises(SystemExit),
+            )
+        assert_that(fake_stderr.getvalue(), contains_string("{fake,other}"))
+
+
+class CompleteTest(unittest.TestCase):
+
+    """Test the completion console script"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.entry_data = attrs.evolve(
+            COMPLETED_ENTRY_DATA,
+            completion=pathlib.Path(tmp_dir.name) / "completion.json",
+        )
+
+    def complete(self, *args):
+        """Run the completion script, and return its output"""
+        with mock.patch("sys.argv", new=["/bin/paint-complete", *args]), mock.patch(
+            "sys.stdout", new=io.StringIO()
+        ) as fake_stdout:
+            assert_that(
+                calling(self.entry_data.complete_command),
+                raises(SystemExit, "^0$"),
+            )
+        return fake_stdout.getvalue()
+
+    def test_script(self):
+        """The script completes the prefix, unless told otherwise"""
+        output = self.complete("script", "bash")
+        assert_that(
+            output,
+            contains_string(
+                "complete -o default -F _gather_complete_gather_tests_test_entry"
+                " gather.tests.test_entry\n"
+            ),
+        )
+        assert_that(output, contains_string("/bin/paint-complete words -- "))
+        output = self.complete("script", "fish", "--subcommand", "paint")
+        assert_that(
+            output, contains_string("/bin/paint-complete words --subcommand -- ")
+        )
+        assert_that(output, not_(contains_string("test_entry")))
+
+    def test_words(self):
+        """Sub-commands, options and choices are completed from the cache"""
+        assert_that(self.complete("words", "--", "prog", "pa"), equal_to("paint\n"))
+        with mock.patch.object(entry.api.Collector, "collect") as collect:
+            assert_that(
+                self.complete("words", "--", "prog", "paint", "--l"),
+                equal_to("--level\n"),
+            )
+            assert_that(
+                self.complete("words", "--", "prog", "paint", "--level", ""),
+                equal_to("low\nhigh\n"),
+            )
+            assert_that(
+                self.complete("words", "--", "prog", "paint", "--level=h"),
+                equal_to("--level=high\n"),
+            )
+        collect.assert_not_called()
+        assert_that(self.complete("words"), equal_to("paint\nrepaint\n"))
+
+    def test_cached_roots(self):
+        """Checking the cache does not look up the entry points"""
+        self.complete("words", "--", "prog", "")
+        with mock.patch.object(
+            entry.api, "_entry_points", side_effect=AssertionError
+        ), mock.patch.object(entry._index, "fingerprint", side_effect=AssertionError):
+            output = self.complete("words", "--", "prog", "pa")
+        assert_that(output, equal_to("paint\n"))
+
+    def test_dynamic(self):
+        """Dynamic choices are found by importing only the command's module"""
+        self.complete("words", "--", "prog", "")
+        resolve = mock.patch.object(
+            entry.api.LazyRegistration,
+            "resolve",
+            autospec=True,
+            side_effect=entry.api.LazyRegistration.resolve,
+        )
+        with resolve as fake_resolve:
+            output = self.complete("words", "--", "prog", "paint", "--colour", "g")
+        assert_that(output, equal_to("green\n"))
+        [[registration], _kwargs] = fake_resolve.call_args
+        assert_that(
+            registration,
+            equal_to(
+                entry.api.LazyRegistration(
+                    collector=None,
+                    name="paint",
+                    module=__name__,
+                    attribute="_paint",
+                )
+            ),
+        )
+
+    def test_unnamed(self):
+        """Registered objects without a name are found by their attribute"""
+        output = self.complete("words", "--", "prog", "repaint", "--colour", "r")
+        assert_that(output, equal_to("red\n"))
+
+    def test_default_cache(self):
+        """By default, the cache is in the user's cache directory"""
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.dict(
+            os.environ, XDG_CACHE_HOME=tmp_dir
+        ):
+            self.entry_data = COMPLETED_ENTRY_DATA
+            self.complete("words", "--", "prog", "")
+            assert_that(
+                os.listdir(os.path.join(tmp_dir, "gather")),
+                contains_exactly("gather.tests.test_entry-completion.json"),
+            )
+
+    def test_subcommand(self):
+        """Sub-command scripts complete their own options"""
+        output = self.complete("words", "--subcommand", "--", "/usr/bin/paint", "--v")
+        assert_that(output, equal_to("--verbose\n"))
@@ -0,0 +1,135 @@
+"""Test the entry points cache"""
+import os
+import pathlib
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from hamcrest import assert_that, equal_to, has_item, has_property, is_
+
+from .. import _entry_points
+
+
+class CacheTest(unittest.TestCase):
+
+    """Tests for caching the entry points"""
+
+    def setUp(self):
+        """Count the metadata lookups"""
+        patcher = mock.patch.object(
+            _entry_points, "_from_metadata", wraps=_entry_points._from_metadata
+        )
+        self.from_metadata = patcher.start()
+        self.addCleanup(patcher.stop)
+        environment = mock.patch.dict(os.environ)
+        environment.start()
+        self.addCleanup(environment.stop)
+        os.environ.pop(_entry_points.ENVIRONMENT_VARIABLE, None)
+
+    def test_lookup(self):
+        """The entry points include gather's own"""
+        entry_points = _entry_points.Cache().get()
+        assert_that(entry_points, has_item(has_property("value", "gather")))
+        [mine] = [
+            entry_point for entry_point in entry_points if entry_point.value == "gather"
+        ]
+        assert_that(mine.dist.name, equal_to("gather"))
+
+    def test_cached(self):
+        """Entry points are looked up again only when sys.path changes"""
+        cache = _entry_points.Cache()
+        first = cache.get()
+        assert_that(cache.get(), is_(first))
+        self.assertEqual(self.from_metadata.call_count, 1)
+        with mock.patch.object(_entry_points, "site_fingerprint", return_value=[]):
+            cache.get()
+        self.assertEqual(self.from_metadata.call_count, 2)
+
+    def test_max_age(self):
+        """Within max_age, sys.path is not checked"""
+        cache = _entry_points.Cache(max_age=None)
+        cache.get()
+        with mock.patch.object(
+            _entry_points, "site_fingerprint", side_effect=AssertionError
+        ):
+            cache.get()
+        cache.clear()
+        cache.get()
+        self.assertEqual(self.from_metadata.call_count, 2)
+
+    def test_precomputed(self):
+        """Saved entry points are used instead of the metadata"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "entry-points.json"
+            _entry_points.save(path)
+            expected = _entry_points.Cache().get()
+            os.environ[_entry_points.ENVIRONMENT_VARIABLE] = os.fspath(path)
+            self.from_metadata.reset_mock()
+            assert_that(_entry_points.Cache().get(), equal_to(expected))
+            self.assertEqual(self.from_metadata.call_count, 0)
+
+    def test_patterns(self):
+        """Distributions' include and exclude patterns are kept with entry points"""
+        dist = types.SimpleNamespace(name="dist", version="1")
+
+        def entry_point(value, dist):
+            return types.SimpleNamespace(name=value, value=value, dist=dist)
+
+        groups = {
+            "gather": [entry_point("plugin", dist), entry_point("other", None)],
+            "gather.include": [entry_point("plugin.commands", dist)],
+            "gather.exclude": [
+                entry_point("plugin.vendored", dist),
+                entry_point("plugin.tests", dist),
+            ],
+        }
+        with mock.patch(
+            "importlib.metadata.entry_points", side_effect=lambda group: groups[group]
+        ):
+            plugin, other = _entry_points.Cache().get()
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = pathlib.Path(tmp_dir) / "entry-points.json"
+                _entry_points.save(path)
+                os.environ[_entry_points.ENVIRONMENT_VARIABLE] = os.fspath(path)
+                assert_that(_entry_points.Cache().get(), equal_to((plugin, other)))
+        assert_that(plugin.include, equal_to(("plugin.commands",)))
+        assert_that(plugin.exclude, equal_to(("plugin.tests", "plugin.vendored")))
+        assert_that(other.include, equal_to(()))
+
+    def test_precomputed_stale(self):
+        """Stale or missing saved entry points are ignored"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "entry-points.json"
+            os.environ[_entry_points.ENVIRONMENT_VARIABLE] = os.fspath(path)
+            expected = _entry_points.Cache().get()
+            path.write_text('{"fingerprint": [], "entry_points": []}')
+            assert_that(_entry_points.Cache().get(), equal_to(expected))
+
+    def test_fingerprint_missing_path(self):
+        """Missing sys.path entries are part of the fingerprint"""
+        with mock.patch("sys.path", ["/script", "/no/such/path"]):
+            fingerprint = _entry_points.site_fingerprint()
+        assert_that(fingerprint, equal_to([["/no/such/path", None]]))
+
+    def test_fingerprint_directories(self):
+        """Only directories that hold distributions are fingerprinted"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = pathlib.Path(tmp_dir)
+            for name in ["script", "sources", "installed", "site"]:
+                (root / name).mkdir()
+            (root / "installed" / "plugin-1.dist-info").mkdir()
+            (root / "python.zip").write_bytes(b"")
+            path = [os.fspath(root / name) for name in ["script", "sources"]]
+            path += [os.fspath(root / "installed"), os.fspath(root / "site")]
+            path += [os.fspath(root / "python.zip"), ""]
+            with mock.patch("sys.path", path), mock.patch.object(
+                _entry_points, "_site_directories", return_value={path[3]}
+            ):
+                fingerprint = _entry_points.site_fingerprint()
+                (root / "script" / "entry-points.json").write_text("{}")
+                assert_that(_entry_points.site_fingerprint(), equal_to(fingerprint))
+        assert_that(
+            [directory for directory, _mtime in fingerprint],
+            equal_to(path[2:4]),
+        )
@@ -0,0 +1,75 @@
+"""Test the on-disk index"""
+import json
+import pathlib
+import tempfile
+import types
+import unittest
+
+from hamcrest import assert_that, equal_to, has_item, has_items, none, not_
+
+from .. import _index
+
+
+def _entry_point(value):
+    return types.SimpleNamespace(name="ignored", value=value, dist=None)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    """Tests for fingerprinting entry points"""
+
+    def test_stable(self):
+        """Fingerprinting the same entry points twice gives the same result"""
+        entry_points = [_entry_point("gather")]
+        assert_that(
+            _index.fingerprint(entry_points),
+            equal_to(_index.fingerprint(entry_points)),
+        )
+
+    def test_module(self):
+        """Entry points pointing at a plain module are fingerprinted"""
+        assert_that(
+            _index.fingerprint([_entry_point("gather.api")]),
+            not_(equal_to(_index.fingerprint([_entry_point("gather.entry")]))),
+        )
+
+    def test_missing(self):
+        """Entry points pointing at missing modules are fingerprinted"""
+        for value in ["no_such_module", "no_such_package.module", "sys"]:
+            assert_that(
+                _index.fingerprint([_entry_point(value)]),
+                equal_to(_index.fingerprint([_entry_point(value)])),
+            )
+
+
+class LoadTest(unittest.TestCase):
+
+    """Tests for loading the index"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name) / "index.json"
+        self.locations = [
+            _index.Location(collector=(), name="a", module="b", attribute="c")
+        ]
+
+    def test_stale(self):
+        """Stale indexes can be loaded, when asked to"""
+        _index.save(self.path, "old", self.locations)
+        assert_that(_index.load(self.path, "current"), none())
+        assert_that(_index.load(self.path, None), equal_to(self.locations))
+
+    def test_format(self):
+        """Indexes in another format are never loaded"""
+        self.path.write_text(json.dumps(dict(format=0, fingerprint="current")))
+        assert_that(_index.load(self.path, None), none())
+
+    def test_packages(self):
+        """The packages under the entry points are kept, even in stale indexes"""
+        assert_that(_index.load_packages(self.path), equal_to(frozenset()))
+        packages = _index.packages(["gather"])
+        assert_that(packages, has_items("gather", "gather.tests"))
+        assert_that(packages, not_(has_item("gather.api")))
+        _index.save(self.path, "old", self.locations, packages)
+        assert_that(_index.load_packages(self.path), equal_to(packages))
@@ -1,10 +1,52 @@
 """Test the __init__.py module"""
 
+import subprocess
+import sys
+import textwrap
 import unittest
-from hamcrest import assert_that, contains_string
+from hamcrest import assert_that, contains_string, empty, calling, raises
 
+import gather
 from .. import __version__
 
+# What importing gather to register commands may import:
+# everything else is imported when collecting or running needs it
+_ALLOWED = [
+    "__future__",
+    "argparse",
+    "ast",
+    "attr",
+    "attrs",
+    "bisect",
+    "collections",
+    "concurrent.futures",
+    "contextlib",
+    "fnmatch",
+    "functools",
+    "hashlib",
+    "importlib.machinery",
+    "importlib.util",
+    "json",
+    "logging",
+    "math",
+    "os",
+    "pathlib",
+    "pickle",
+    "pkgutil",
+    "re",
+    "shlex",
+    "site",
+    "sys",
+    "tempfile",
+    "threading",
+    "time",
+    "traceback",
+    "tracemalloc",
+    "types",
+    "typing",
+    "warnings",
+]
+
 
 class TestInit(unittest.TestCase):
     """Tests for the __init__.py module"""
@@ -12,3 +54,45 @@ class TestInit(unittest.TestCase):
     def test_version(self):
         """Version has a . in it"""
         assert_that(__version__, contains_string("."))
+
+    def test_no_attribute(self):
+        """Other missing attributes raise AttributeError"""
+        assert_that(
+            calling(getattr).with_args(gather, "no_such_attribute"),
+            raises(AttributeError),
+        )
+
+    def test_import_budget(self):
+        """Importing what plugins need does not import what running needs"""
+        code = textwrap.dedent(
+            """\
+            import importlib
+            import sys
+
+            for name in sys.argv[1:]:
+                importlib.import_module(name)
+            allowed = set(sys.modules)
+
+            import gather
+            from gather import entry
+            from gather.commands import add_argument, make_command_register
+
+            COMMANDS = gather.Collector()
+
+            @make_command_register(COMMANDS)(add_argument("--value"))
+            def command(args):
+                pass
+
+            print("\\n".join(sorted(set(sys.modules) - allowed)))
+            """
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code, *_ALLOWED],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        assert_that(
+            [name for name in output.split() if name.partition(".")[0] != "gather"],
+            empty(),
+        )
@@ -0,0 +1,47 @@
+"""Test the precompiled registry"""
+import pathlib
+import pickle
+import tempfile
+import unittest
+
+from hamcrest import assert_that, contains_exactly, equal_to, none
+
+from .. import _index, _precompiled
+
+_ENTRY = _precompiled.Entry(
+    location=_index.Location(
+        collector=("a.module:COMMANDS",), name="name", module="a.module", attribute="f"
+    ),
+    pickled=_precompiled.dumps(5),
+)
+
+
+class PrecompiledTest(unittest.TestCase):
+
+    """Tests for saving and loading the registry"""
+
+    def setUp(self):
+        """Make a place for the registry"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = pathlib.Path(tmp_dir.name) / "sub" / "registry.pickle"
+
+    def test_round_trip(self):
+        """A saved registry is loaded with the same fingerprint"""
+        _precompiled.save(self.path, "current", [_ENTRY])
+        assert_that(_precompiled.load(self.path, "current"), contains_exactly(_ENTRY))
+        assert_that(_precompiled.load(self.path, "other"), none())
+
+    def test_unreadable(self):
+        """Missing, corrupt, or unexpected registries are not loaded"""
+        assert_that(_precompiled.load(self.path, "current"), none())
+        self.path.parent.mkdir()
+        self.path.write_bytes(b"garbage")
+        assert_that(_precompiled.load(self.path, "current"), none())
+        self.path.write_bytes(pickle.dumps([]))
+        assert_that(_precompiled.load(self.path, "current"), none())
+
+    def test_dumps(self):
+        """Values that cannot be pickled, or unpickled, are not pickled"""
+        assert_that(pickle.loads(_precompiled.dumps(5)), equal_to(5))
+        assert_that(_precompiled.dumps(lambda: None), none())
@@ -0,0 +1,166 @@
+"""Test running subprocesses from async commands"""
+import asyncio
+import subprocess
+import sys
+import threading
+import unittest
+
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    contains_inanyorder,
+    contains_string,
+    empty,
+    equal_to,
+    has_item,
+    has_length,
+    has_properties,
+    none,
+)
+from commander_data.run import Runner
+
+from .. import _run
+
+
+def _python(code):
+    return [sys.executable, "-c", code]
+
+
+class AsyncRunnerTest(unittest.TestCase):
+
+    """Tests for the async runner"""
+
+    def test_dry_run(self):
+        """In a dry run, run only logs"""
+        runner = _run.AsyncRunner()
+        with self.assertLogs(_run.LOGGER) as logs:
+            result = asyncio.run(runner.run(_python("raise SystemExit(1)")))
+        assert_that(result, has_properties(returncode=0, stdout="", stderr=""))
+        [message] = logs.output
+        assert_that(message, contains_string("Dry run, not running"))
+
+    def test_run(self):
+        """Output is captured as text"""
+        runner = _run.AsyncRunner(no_dry_run=True)
+        code = "import sys; print(sys.stdin.read().upper())"
+        result = asyncio.run(runner.run(_python(code), input="hello"))
+        assert_that(result, has_properties(returncode=0, stdout="HELLO\n", stderr=""))
+
+    def test_create_subprocess_exec(self):
+        """Processes can be created by something other than asyncio"""
+        created = []
+
+        async def create_subprocess_exec(*cmdargs, **kwargs):
+            created.append(cmdargs)
+            return await asyncio.create_subprocess_exec(*cmdargs, **kwargs)
+
+        runner = _run.AsyncRunner(create_subprocess_exec, no_dry_run=True)
+        result = asyncio.run(runner.run(_python("print(1)")))
+        assert_that(result.stdout, equal_to("1\n"))
+        assert_that(created, contains_exactly(tuple(_python("print(1)"))))
+
+    def test_bytes(self):
+        """Output can be captured as bytes, or not at all"""
+        runner = _run.AsyncRunner()
+        result = asyncio.run(
+            runner.safe_run(_python("print(1)"), text=False, input=b"")
+        )
+        assert_that(result.stdout, equal_to(b"1\n"))
+        result = asyncio.run(
+            runner.safe_run(
+                _python("print(1)"), capture_output=False, stdout=subprocess.DEVNULL
+            )
+        )
+        assert_that(result.stdout, none())
+
+    def test_no_check(self):
+        """Without checking, failures are returned"""
+        runner = _run.AsyncRunner()
+        code = "raise SystemExit(3)"
+        result = asyncio.run(runner.safe_run(_python(code), check=False))
+        assert_that(result.returncode, equal_to(3))
+
+    def test_failure(self):
+        """Failures raise, with the output as notes"""
+        runner = _run.AsyncRunner()
+        code = "import sys; sys.stderr.write('oops'); raise SystemExit(3)"
+        with self.assertRaises(subprocess.CalledProcessError) as caught:
+            asyncio.run(runner.safe_run(_python(code)))
+        assert_that(
+            caught.exception.__notes__, contains_exactly("STDERR: oops", "STDOUT: ")
+        )
+
+
+def _fake_run(started, release):
+    def run(cmdargs, *, check, capture_output, text, delay=0):
+        [name] = cmdargs
+        started.append(name)
+        release.wait(delay)
+        if name == "fail":
+            raise subprocess.CalledProcessError(1, cmdargs, "", "failed")
+        return name.upper()
+
+    return run
+
+
+class RunManyTest(unittest.TestCase):
+
+    """Tests for running processes concurrently"""
+
+    def setUp(self):
+        """Set up a fake subprocess runner"""
+        self.started = []
+        self.release = threading.Event()
+        self.fake_run = _fake_run(self.started, self.release)
+
+    def test_ordered(self):
+        """Results and logs are in submission order"""
+        runner = Runner(orig_run=self.fake_run, no_dry_run=True)
+        names = ["slow", "fast", "faster"]
+        with self.assertLogs("commander_data.run") as logs:
+            results = _run.run_many(
+                runner.run, [[name] for name in names], max_workers=3, delay=0.01
+            )
+        assert_that(results, contains_exactly("SLOW", "FAST", "FASTER"))
+        assert_that(
+            logs.output,
+            contains_exactly(
+                *(f"INFO:commander_data.run:Running {[name]}" for name in names)
+            ),
+        )
+        assert_that(_run._RUNNER_LOGGER.filters, empty())
+
+    def test_bounded(self):
+        """No more than max_workers processes run at once"""
+        runner = Runner(orig_run=self.fake_run, no_dry_run=True)
+        thread = threading.Thread(
+            target=_run.run_many,
+            args=(runner.run, [["one"], ["two"], ["three"]]),
+            kwargs=dict(max_workers=2, delay=10),
+        )
+        thread.start()
+        for _ in range(1000):
+            if len(self.started) == 2:
+                break
+            threading.Event().wait(0.01)
+        threading.Event().wait(0.05)
+        assert_that(self.started, contains_inanyorder("one", "two"))
+        self.release.set()
+        thread.join()
+        assert_that(self.started, has_item("three"))
+
+    def test_dry_run(self):
+        """In a dry run, nothing is run"""
+        runner = Runner(orig_run=self.fake_run)
+        with self.assertLogs("commander_data.run") as logs:
+            results = _run.run_many(runner.run, [["one"], ["two"]])
+        assert_that(results, has_length(2))
+        assert_that(self.started, empty())
+        assert_that(logs.output[1], contains_string("Dry run, not running ['two']"))
+
+    def test_failure(self):
+        """The first failure is raised after all processes ran"""
+        runner = Runner(orig_run=self.fake_run, no_dry_run=True)
+        with self.assertRaises(subprocess.CalledProcessError):
+            _run.run_many(runner.safe_run, [["fail"], ["other"]], max_workers=1)
+        assert_that(self.started, contains_exactly("fail", "other"))
@@ -0,0 +1,200 @@
+"""Test the command server"""
+import contextlib
+import os
+import pathlib
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from hamcrest import assert_that, contains_string, equal_to, none
+
+import gather
+from .. import _server, commands
+
+COMMANDS = gather.Collector()
+
+REGISTER = commands.make_command_register(COMMANDS)
+
+
+@REGISTER(commands.add_argument("--code", type=int, default=0))
+def greet(args):
+    """Print where, and with which environment, the command runs"""
+    print("hello", os.getcwd(), args.env.get("GREETING"))
+    os.write(2, b"to stderr\n")
+    raise SystemExit(args.code)
+
+
+@REGISTER()
+def explode(args):
+    """Fail with an exception"""
+    raise RuntimeError("boom")
+
+
+@REGISTER()
+def pollute(args):
+    """Change the process, and report what it was before"""
+    print(sys.modules.get("polluted", "clean"))
+    sys.modules["polluted"] = "polluted"
+
+
+@REGISTER()
+def nested(args):
+    """Report whether nested gather commands would use the server"""
+    print(os.environ.get(_server.ENVIRONMENT_VARIABLE), args.env.get("GREETING"))
+
+
+@REGISTER()
+def die(args):
+    """Exit without reporting the exit code"""
+    os._exit(9)
+
+
+def _parser():
+    parser = commands.set_parser(collected=COMMANDS.collect())
+    commands.prebuild(parser)
+    return parser
+
+
+class ForwardTest(unittest.TestCase):
+
+    """Tests for sending commands to the server"""
+
+    def setUp(self):
+        """Start a server for a few requests"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = pathlib.Path(tmp_dir.name)
+        self.path = self.tmp_dir / "server.sock"
+        # The server's streams are on the standard file descriptors
+        for name, fd in [("stdout", 1), ("stderr", 2)]:
+            stream = open(fd, "w", closefd=False)
+            self.addCleanup(stream.close)
+            patcher = mock.patch(f"sys.{name}", new=stream)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    fork = False
+
+    def _serve(self, requests):
+        server = _server.Server(parser=_parser(), prefix="test", fork=self.fork)
+        thread = threading.Thread(
+            target=server.serve, args=(self.path,), kwargs=dict(requests=requests)
+        )
+        thread.start()
+        self.addCleanup(self._stop, thread)
+        for _ in range(1000):
+            if self.path.exists():
+                break
+            threading.Event().wait(0.01)
+
+    def _stop(self, thread):
+        # Clients that go away still count as requests
+        while thread.is_alive():
+            with contextlib.suppress(OSError), socket.socket(socket.AF_UNIX) as client:
+                client.connect(str(self.path))
+            thread.join(0.01)
+
+    def _forward(self, argv, **kwargs):
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        with open(os.devnull) as stdin:
+            code = _server.forward(
+                self.path,
+                argv=argv,
+                env={"GREETING": "howdy", _server.ENVIRONMENT_VARIABLE: str(self.path)},
+                cwd=str(self.tmp_dir),
+                fds=[stdin.fileno(), stdout_write, stderr_write],
+                **kwargs,
+            )
+        os.close(stdout_write)
+        os.close(stderr_write)
+        with open(stdout_read) as stdout, open(stderr_read) as stderr:
+            return code, stdout.read(), stderr.read()
+
+    def test_no_server(self):
+        """Without a server, nothing is sent"""
+        assert_that(self._forward(["test", "greet"])[0], none())
+
+    def test_not_listening(self):
+        """A socket nobody listens on is ignored"""
+        with socket.socket(socket.AF_UNIX) as unused:
+            unused.bind(str(self.path))
+            assert_that(self._forward(["test", "greet"])[0], none())
+
+    def test_other_user(self):
+        """A socket owned by another user is ignored"""
+        self.path.touch()
+        with mock.patch("os.getuid", return_value=os.getuid() + 1):
+            assert_that(self._forward(["test", "greet"])[0], none())
+
+    def test_run(self):
+        """Commands run with the client's streams, environment and directory"""
+        self._serve(requests=2)
+        cwd = os.getcwd()
+        code, stdout, stderr = self._forward(["test", "greet", "--code", "4"])
+        assert_that(code, equal_to(4))
+        assert_that(stdout, equal_to(f"hello {self.tmp_dir} howdy\n"))
+        assert_that(stderr, equal_to("to stderr\n"))
+        assert_that(os.environ.get("GREETING"), none())
+        assert_that(os.getcwd(), equal_to(cwd))
+        code, _stdout, _stderr = self._forward(["greet"], is_subcommand=True)
+        assert_that(code, equal_to(0))
+
+    def test_nested(self):
+        """Commands do not forward to the server running them"""
+        self._serve(requests=1)
+        code, stdout, _stderr = self._forward(["test", "nested"])
+        assert_that(code, equal_to(0))
+        assert_that(stdout, equal_to("None howdy\n"))
+
+    def test_exception(self):
+        """Exceptions are reported to the client, and the server goes on"""
+        self._serve(requests=2)
+        code, _stdout, stderr = self._forward(["test", "explode"])
+        assert_that(code, equal_to(1))
+        assert_that(stderr, contains_string("RuntimeError: boom"))
+        code, _stdout, _stderr = self._forward(["test", "greet"])
+        assert_that(code, equal_to(0))
+
+    def test_broken_client(self):
+        """Clients that go away do not stop the server"""
+        self._serve(requests=2)
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(str(self.path))
+            socket.send_fds(client, [b"G"], [0, 1, 2])
+            client.sendall(b"\0\0")
+        code, _stdout, _stderr = self._forward(["test", "greet"])
+        assert_that(code, equal_to(0))
+
+
+class ForkTest(ForwardTest):
+
+    """Tests for running each command in a forked child"""
+
+    fork = True
+
+    def test_isolated(self):
+        """Changes a command makes do not affect the next commands"""
+        self._serve(requests=2)
+        for _ in range(2):
+            code, stdout, _stderr = self._forward(["test", "pollute"])
+            assert_that(code, equal_to(0))
+            assert_that(stdout, equal_to("clean\n"))
+
+    def test_died(self):
+        """A child that dies without reporting fails"""
+        self._serve(requests=1)
+        code, _stdout, _stderr = self._forward(["test", "die"])
+        assert_that(code, equal_to(1))
+
+    def test_reap(self):
+        """Children that exited are waited for"""
+        server = _server.Server(parser=None, fork=True)
+        server._children.update([10, 20])
+        statuses = {10: (0, 0), 20: (20, 0)}
+        with mock.patch("os.waitpid", side_effect=lambda pid, _: statuses[pid]):
+            server._reap()
+        assert_that(server._children, equal_to({10}))
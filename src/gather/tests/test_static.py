@@ -0,0 +1,131 @@
+"""Test static discovery"""
+import os
+import pathlib
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from hamcrest import assert_that, calling, contains_exactly, equal_to, raises
+
+from .. import _index, _static
+
+
+def _analyze(source, module_name="pkg.mod", path="pkg/mod.py"):
+    return _static.analyze(module_name, path, textwrap.dedent(source).encode())
+
+
+class AnalyzeTest(unittest.TestCase):
+
+    """Tests for analyzing a module's source"""
+
+    def test_registrations(self):
+        """Decorated functions and classes are found, with their collectors"""
+        locations = _analyze(
+            """\
+            import attrs
+            import os.path
+            import some.module as alias
+            from gather import commands
+            from gather.commands import add_argument
+            from . import ENTRY_DATA
+            from ..other import THINGS as STUFF
+            LOCAL: object = object()
+            first, second = 1, 2
+
+            @ENTRY_DATA.register(add_argument("--value"), name="do-it")
+            def _do_it(args):
+                pass
+
+            @ENTRY_DATA.register(commands.add_argument("--value"))
+            def _do_more(args):
+                pass
+
+            @STUFF.register()
+            @attrs.frozen
+            class Thing:
+                pass
+
+            @alias.COLLECTOR.register(name=None)
+            async def coro():
+                pass
+
+            @LOCAL.register()
+            def local():
+                pass
+            """,
+            module_name="top.pkg.mod",
+            path="top/pkg/mod.py",
+        )
+        assert_that(
+            locations,
+            contains_exactly(
+                _index.Location(
+                    ("top.pkg:ENTRY_DATA",), "do-it", "top.pkg.mod", "_do_it"
+                ),
+                _index.Location(
+                    ("top.pkg:ENTRY_DATA",), "_do_more", "top.pkg.mod", "_do_more"
+                ),
+                _index.Location(("top.other:THINGS",), "Thing", "top.pkg.mod", "Thing"),
+                _index.Location(
+                    ("some.module:COLLECTOR",), "coro", "top.pkg.mod", "coro"
+                ),
+                _index.Location(
+                    ("top.pkg.mod:LOCAL",), "local", "top.pkg.mod", "local"
+                ),
+            ),
+        )
+
+    def test_package(self):
+        """Relative imports in a package are relative to the package itself"""
+        locations = _analyze(
+            """\
+            from . import COLLECTOR
+
+            @COLLECTOR.register()
+            def thing():
+                pass
+            """,
+            path="pkg/mod/__init__.py",
+        )
+        assert_that(locations[0].collector, equal_to(("pkg.mod:COLLECTOR",)))
+
+    def test_unresolved(self):
+        """Modules with registrations that are not understood are rejected"""
+        sources = [
+            "def (:",
+            "C.register()(func)",
+            "@some_decorator\ndef func(): pass",
+            "@COLLECTORS[0].register()\ndef func(): pass",
+            "@C.register()\ndef func(): pass",
+            "import c\n@c.C.register('name')\ndef func(): pass",
+            "import c\n@c.C.register(make('name'))\ndef func(): pass",
+            "import c\n@c.C.register(c[0]())\ndef func(): pass",
+            "import c\n@c.C.register(name=NAME)\ndef func(): pass",
+            "import c\n@c.C.register(**kwargs)\ndef func(): pass",
+            "import c\n@property\n@c.C.register()\ndef func(): pass",
+        ]
+        for source in sources:
+            assert_that(calling(_analyze).with_args(source), raises(ValueError), source)
+
+
+class DiscoverTest(unittest.TestCase):
+
+    """Tests for discovering registrations under entry points"""
+
+    def test_not_source(self):
+        """Modules without source are reported as unresolved"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            package = pathlib.Path(tmp_dir) / "gather_fake_package"
+            package.mkdir()
+            (package / "__init__.py").write_text("")
+            (package / "compiled.pyc").write_bytes(b"")
+            (package / "not-a-module.py").write_text("")
+            (package / "data").mkdir()
+            (package / "not-a-package").mkdir()
+            (package / "not-a-package" / "__init__.py").write_text("")
+            with mock.patch.object(sys, "path", [os.fspath(tmp_dir), *sys.path]):
+                locations, unresolved = _static.discover(["gather_fake_package"])
+        assert_that(locations, equal_to([]))
+        assert_that(unresolved, equal_to(["gather_fake_package.compiled"]))
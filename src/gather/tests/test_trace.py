@@ -0,0 +1,123 @@
+"""Test tracing"""
+import json
+import pathlib
+import tempfile
+import tracemalloc
+import unittest
+
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    equal_to,
+    has_entries,
+    has_key,
+    is_,
+    none,
+)
+
+from .. import _trace
+
+
+class TracerTest(unittest.TestCase):
+
+    """Tests for recording spans"""
+
+    def test_span(self):
+        """A span is recorded as a complete event"""
+        tracer = _trace.Tracer()
+        with tracer.span("import", "a.module", module="a.module") as args:
+            args["extra"] = 1
+        [event] = tracer.events
+        assert_that(
+            event,
+            has_entries(
+                name="a.module",
+                cat="import",
+                ph="X",
+                args=dict(module="a.module", extra=1, imports=0),
+            ),
+        )
+        assert_that(event["dur"] >= 0, is_(True))
+
+    def test_summary(self):
+        """Phases are totalled, and module spans are attributed to the modules"""
+        tracer = _trace.Tracer()
+        for category in ["import", "scan", "transform", "transform", "other"]:
+            with tracer.span(category, "mod", module="mod"):
+                pass
+        with tracer.span("collect", "None"):
+            pass
+        summary = tracer.summary()
+        assert_that(summary["phases"]["transform"]["count"], equal_to(2))
+        assert_that(summary["phases"], has_key("collect"))
+        assert_that(summary["modules"]["mod"], has_entries(imports=0, registrations=2))
+
+    def test_memory(self):
+        """When measuring memory, the allocated memory is recorded"""
+        with _trace.tracing(None, memory=True, always=True) as tracer:
+            with _trace.span("import", "mod", module="mod"):
+                allocated = [object() for _ in range(1000)]
+        assert_that(tracemalloc.is_tracing(), is_(False))
+        assert_that(len(allocated), equal_to(1000))
+        [event] = tracer.events
+        assert_that(event["args"]["allocated"] > 0, is_(True))
+        assert_that(
+            tracer.summary()["modules"]["mod"]["allocated"],
+            equal_to(event["args"]["allocated"]),
+        )
+
+    def test_distributions(self):
+        """Import costs are totalled by distribution"""
+        tracer = _trace.Tracer(
+            distribution_of=lambda name: None if name == "other" else "dist"
+        )
+        for module_name in ["pkg", "pkg.mod", "other"]:
+            with tracer.span("import", module_name, module=module_name):
+                pass
+        distributions = tracer.summary()["distributions"]
+        assert_that(list(distributions), contains_exactly("dist"))
+        assert_that(distributions["dist"], has_entries(modules=2, imports=0))
+
+    def test_not_tracing(self):
+        """Without a tracer, spans are not recorded"""
+        with _trace.tracing(None) as tracer:
+            with _trace.span("collect", "None") as args:
+                pass
+        assert_that(tracer, none())
+        assert_that(args, equal_to({}))
+
+
+class TracingTest(unittest.TestCase):
+
+    """Tests for saving traces"""
+
+    def test_saved(self):
+        """The trace is saved when the block exits, even with an exception"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = pathlib.Path(tmp_dir) / "sub" / "trace.json"
+            with self.assertRaises(SystemExit):
+                with _trace.tracing(path):
+                    with _trace.span("command", "fake"):
+                        raise SystemExit(1)
+            content = json.loads(path.read_text())
+        [event] = content["traceEvents"]
+        assert_that(event["name"], equal_to("fake"))
+        assert_that(content["summary"]["phases"], has_key("command"))
+
+    def test_nested(self):
+        """Nested tracing records in the inner trace, then the outer one"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            outer_path = pathlib.Path(tmp_dir) / "outer.json"
+            inner_path = pathlib.Path(tmp_dir) / "inner.json"
+            with _trace.tracing(outer_path) as outer:
+                with _trace.tracing(inner_path) as inner:
+                    with _trace.span("scan", "inner"):
+                        pass
+                with _trace.span("scan", "outer"):
+                    pass
+        assert_that(
+            [event["name"] for event in inner.events], contains_exactly("inner")
+        )
+        assert_that(
+            [event["name"] for event in outer.events], contains_exactly("outer")
+        )
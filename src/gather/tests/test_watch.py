@@ -0,0 +1,50 @@
+"""Test waiting for files to change"""
+import os
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+
+from hamcrest import assert_that, contains_exactly, is_
+
+from .. import _watch
+
+
+class WaitTest(unittest.TestCase):
+
+    """Tests for waiting for changes"""
+
+    def setUp(self):
+        """Create a directory to watch"""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = pathlib.Path(tmp_dir.name)
+
+    def test_change(self):
+        """A change in a watched directory ends the wait"""
+        if not _watch.inotify_available():  # pragma: no cover
+            self.skipTest("inotify is not available")
+        timer = threading.Timer(0.05, (self.directory / "new.py").write_text, ["x"])
+        timer.start()
+        self.addCleanup(timer.join)
+        start = time.monotonic()
+        assert_that(_watch.wait([os.fspath(self.directory)], 30), is_(True))
+        assert_that(time.monotonic() - start < 30, is_(True))
+
+    def test_timeout(self):
+        """Without changes, the wait times out"""
+        for inotify in [True, False]:
+            with self.subTest(inotify=inotify):
+                assert_that(
+                    _watch.wait([os.fspath(self.directory)], 0.01, inotify=inotify),
+                    is_(False),
+                )
+
+    def test_directories(self):
+        """The files' existing directories are watched"""
+        path = self.directory / "module.py"
+        directories = _watch.watched_directories(
+            [os.fspath(path)], [os.fspath(self.directory / "missing")]
+        )
+        assert_that(directories, contains_exactly(os.fspath(self.directory)))